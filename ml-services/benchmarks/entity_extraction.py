@@ -0,0 +1,151 @@
+"""
+قياس أداء استخراج الكيانات: تعبير واحد مُجمّع مقابل findall لكل نمط
+Entity Extraction Benchmark
+@version 3.0.0
+
+التشغيل من مجلد ml-services:
+    python -m benchmarks.entity_extraction --articles 10000
+"""
+
+import argparse
+import random
+import re
+import time
+from typing import Callable, Dict, List
+
+from nlp.nlp_service import NLPService
+from nlp.text_api import TextAnalyzer
+
+# الأنماط السابقة كما كانت (ذيول [أ-ي\s]+ غير محدودة)، للمقارنة فقط
+LEGACY_TEXT_PATTERNS = {
+    'person': [
+        r'(?:الدكتور|الأستاذ|المهندس|الطبيب)\s+([أ-ي\s]+)',
+        r'([أ-ي]+\s+[أ-ي]+)(?:\s+قال|أضاف|ذكر|أشار)',
+        r'(?:السيد|السيدة)\s+([أ-ي\s]+)',
+    ],
+    'organization': [
+        r'(?:شركة|مؤسسة|منظمة|جمعية|هيئة|وزارة|مجلس)\s+([أ-ي\s]+)',
+        r'(?:جامعة|معهد|مركز|مستشفى|مدرسة)\s+([أ-ي\s]+)',
+        r'(?:بنك|مصرف)\s+([أ-ي\s]+)',
+    ],
+    'location': [
+        r'(?:مدينة|محافظة|منطقة|إقليم|دولة|بلد)\s+([أ-ي\s]+)',
+        r'(?:في|إلى|من)\s+(الرياض|جدة|مكة|المدينة|الدمام|تبوك|أبها|حائل|الطائف)',
+        r'(?:شارع|طريق|حي)\s+([أ-ي\s]+)',
+    ],
+    'date': [
+        r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}',
+        r'\d{4}[/-]\d{1,2}[/-]\d{1,2}',
+        r'(?:يوم|أمس|اليوم|غداً|بعد غد)',
+        r'(?:الإثنين|الثلاثاء|الأربعاء|الخميس|الجمعة|السبت|الأحد)',
+    ],
+    'money': [
+        r'\d+(?:,\d{3})*\s*(?:ريال|دولار|يورو|دينار|درهم)',
+        r'(?:مليون|مليار|ألف)\s+(?:ريال|دولار|يورو)',
+    ],
+    'phone': [
+        r'(?:\+966|0096656)\d{8}',
+        r'05\d{8}',
+        r'\d{3}-\d{3}-\d{4}',
+    ],
+    'email': [
+        r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}',
+    ],
+    'url': [
+        r'https?://[^\s]+',
+        r'www\.[^\s]+',
+    ],
+}
+
+LEGACY_SERVICE_PATTERNS = {
+    'name': r'[أ-ي]+\s+[أ-ي]+(?:\s+[أ-ي]+)?',
+    'organization': r'(?:شركة|مؤسسة|منظمة|جمعية|جامعة|وزارة)\s+[أ-ي\s]+',
+    'location': r'(?:مدينة|محافظة|منطقة|دولة)\s+[أ-ي\s]+',
+    'date': r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}|\d{4}[/-]\d{1,2}[/-]\d{1,2}',
+}
+
+SENTENCES = [
+    'أعلنت شركة التقنية المتقدمة عن إطلاق منصة جديدة للتعليم الرقمي',
+    'وقال الدكتور خالد العمري إن المشروع يدعم التحول الرقمي في المنطقة',
+    'محمد الأحمد قال إن النتائج فاقت التوقعات خلال الربع الأول',
+    'وافتتحت وزارة الصحة مستشفى جديداً في مدينة تبوك بسعة ثلاثمائة سرير',
+    'بلغت الاستثمارات 250,000 ريال في المرحلة الأولى من المشروع',
+    'وصل الوفد إلى الرياض يوم الأربعاء الموافق 12/05/2024 لحضور المؤتمر',
+    'للتواصل يرجى الاتصال على 0551234567 أو مراسلة info@example.com',
+    'تفاصيل البرنامج متاحة على الموقع https://example.com/program',
+    'شارك طلاب جامعة الملك سعود في مسابقة البرمجة الوطنية',
+    'أشار التقرير إلى نمو قطاع التجارة الإلكترونية بنسبة كبيرة هذا العام',
+    'وأكد المهندس سعد الحربي أن العمل يسير وفق الجدول الزمني المحدد',
+    'تقع المنشأة الجديدة في حي النرجس شمال المدينة',
+    'وقد أسهمت المبادرة في رفع مستوى الوعي لدى الشباب بأهمية الابتكار',
+    'وتواصل الجهات المختصة متابعة تنفيذ الخطط التشغيلية بشكل دوري',
+]
+
+
+def generate_articles(count: int, words_per_article: int = 600, seed: int = 42) -> List[str]:
+    """مقالات بطول مقالات الأخبار الحقيقية (فقرات من جمل تحوي كيانات ونصاً عادياً)"""
+    rng = random.Random(seed)
+    articles = []
+    for _ in range(count):
+        sentences, words = [], 0
+        while words < words_per_article:
+            sentence = rng.choice(SENTENCES)
+            sentences.append(sentence + rng.choice(['.', '،', '.\n']))
+            words += len(sentence.split())
+        articles.append(' '.join(sentences))
+    return articles
+
+
+def legacy_extractor(patterns: Dict, flags: int) -> Callable[[str], Dict[str, List[str]]]:
+    """findall لكل نمط على حدة، كما في التنفيذ السابق"""
+    def extract(text: str) -> Dict[str, List[str]]:
+        entities = {}
+        for entity_type, type_patterns in patterns.items():
+            if isinstance(type_patterns, str):
+                type_patterns = [type_patterns]
+            found = []
+            for pattern in type_patterns:
+                found.extend(re.findall(pattern, text, flags))
+            entities[entity_type] = list({entity.strip() for entity in found if entity.strip()})
+        return entities
+    return extract
+
+
+def time_extractor(extract: Callable[[str], Dict], articles: List[str]) -> float:
+    start = time.perf_counter()
+    for article in articles:
+        extract(article)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--articles', type=int, default=10000)
+    parser.add_argument('--words', type=int, default=600)
+    args = parser.parse_args()
+
+    articles = generate_articles(args.articles, args.words)
+    average_chars = sum(len(article) for article in articles) / len(articles)
+    print(f"{len(articles)} articles, ~{args.words} words / {average_chars:.0f} chars each")
+
+    text_analyzer = TextAnalyzer()
+    nlp_service = NLPService()
+
+    cases = [
+        ('TextAnalyzer', legacy_extractor(LEGACY_TEXT_PATTERNS, re.IGNORECASE),
+         text_analyzer.entity_extractor.extract),
+        ('NLPService', legacy_extractor(LEGACY_SERVICE_PATTERNS, re.IGNORECASE),
+         nlp_service.entity_extractor.extract),
+    ]
+    for name, legacy, combined in cases:
+        legacy_seconds = time_extractor(legacy, articles)
+        combined_seconds = time_extractor(combined, articles)
+        print(
+            f"{name:<13} per-pattern findall: {legacy_seconds:7.2f}s  "
+            f"combined single pass: {combined_seconds:7.2f}s  "
+            f"speedup: {legacy_seconds / combined_seconds:5.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
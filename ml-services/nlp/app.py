@@ -4,17 +4,36 @@ AI Service for Recommendations and Analytics
 @version 3.0.0
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Dict, Optional, Any
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Dict, Iterable, Iterator, Optional, Any, Tuple, Union
 import uvicorn
 import json
 import logging
+import os
+import threading
+import time
 from datetime import datetime
 
-from .interest_model import UserInterestModel
+from .interest_model import EVENT_EPOCH_KEY, UserInterestModel, parse_timestamp
 from .recommendation_engine import RecommendationEngine
+from .event_batch import EventBatch, validate_event_data
+from .event_store import create_event_store
+from .interest_state import InterestStateStore
+from .article_catalog import ArticleCatalog
+from .vectorized_scoring import ArticleFeatures
+from .collaborative_model import create_collaborative_model
+from .article_embeddings import ArticleEmbeddingIndex, ArticleEncoder
+from .executor import ExecutorSaturated, Reservation, create_workload_executor
+from .response_cache import cache_key, create_response_cache
+from .serialization import FastJSONResponse, dumps, loads, project_fields
+from .lexicon import LexiconMatcher, LexiconMatches
+from .text_pipeline import TextAnalysisPipeline, TextStage
+from .batch_analysis import aiter_lines, create_batch_analyzer
+from .document_frequency import CORPUS_DOCUMENT_FREQUENCY
 
 # إعداد التسجيل
 logging.basicConfig(level=logging.INFO)
@@ -26,7 +45,8 @@ app = FastAPI(
     description="خدمات الذكاء الاصطناعي لنظام سبق",
     version="3.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse
 )
 
 # إعداد CORS
@@ -40,7 +60,85 @@ app.add_middleware(
 
 # تهيئة النماذج
 interest_model = UserInterestModel()
-recommendation_engine = RecommendationEngine()
+recommendation_engine = RecommendationEngine(interest_model)
+
+# نموذج التصفية التعاونية (يُحدَّث مع كل حدث جديد)
+collaborative_model = create_collaborative_model()
+recommendation_engine.collaborative_model = collaborative_model
+
+# مخزن أحداث المستخدمين (memory:// افتراضياً، أو redis:// أو sqlite:///)
+event_store = create_event_store()
+
+# حالات الاهتمام التراكمية (تُحدَّث مع كل حدث جديد)
+interest_state_store = InterestStateStore(interest_model, event_store=event_store)
+
+# كتالوج المقالات المتاحة للتوصية
+article_catalog = ArticleCatalog()
+
+# ذاكرة مؤقتة لنتائج التوصيات (memory:// افتراضياً، أو redis://، أو none لتعطيلها)
+response_cache = create_response_cache()
+
+# تضمينات المقالات للاسترجاع الدلالي (تُفعّل بتحديد ARTICLE_EMBEDDINGS_PATH)
+embedding_index = None
+if os.getenv('ARTICLE_EMBEDDINGS_PATH'):
+    embedding_index = ArticleEmbeddingIndex(
+        dim=int(os.getenv('ARTICLE_EMBEDDINGS_DIM', '768')),
+        path=os.getenv('ARTICLE_EMBEDDINGS_PATH'),
+        encoder=ArticleEncoder()
+    )
+    recommendation_engine.embedding_index = embedding_index
+
+# خط تحليل النصوص بالمراحل (يُنشأ عند أول طلب في كل عملية، لأن
+# NLPService يحمّل موارد nltk)
+text_pipeline: Optional[TextAnalysisPipeline] = None
+text_pipeline_lock = threading.Lock()
+
+def get_text_pipeline() -> TextAnalysisPipeline:
+    global text_pipeline
+    if text_pipeline is None:
+        with text_pipeline_lock:
+            if text_pipeline is None:
+                text_pipeline = TextAnalysisPipeline()
+    return text_pipeline
+
+# تحليل النصوص بالجملة (مجمّع عمليات بعدد أنوية المعالج، يُنشأ عند أول طلب)
+batch_text_analyzer = create_batch_analyzer()
+
+# منفّذ الأعمال الحسابية حتى لا تُحجب حلقة الأحداث (وفحص الصحة معها)
+workload_executor = create_workload_executor()
+
+@app.on_event("startup")
+def load_collaborative_model():
+    """بناء نموذج التصفية التعاونية من مخزن الأحداث (يُفقد مع إعادة التشغيل)"""
+    collaborative_model.load_event_store(event_store)
+
+@app.on_event("shutdown")
+def persist_interest_state():
+    """حفظ حالات الاهتمام عند إيقاف الخدمة (إن حُدد INTEREST_STATE_PATH)"""
+    interest_state_store.save()
+
+@app.on_event("shutdown")
+def shutdown_workload_executor():
+    workload_executor.shutdown()
+    batch_text_analyzer.shutdown()
+
+def service_busy(error: ExecutorSaturated) -> HTTPException:
+    """رد 503 عند امتلاء حد نقطة النهاية"""
+    logger.warning(str(error))
+    return HTTPException(
+        status_code=503,
+        detail="الخدمة مشغولة حالياً، يرجى المحاولة لاحقاً",
+        headers={"Retry-After": "1"}
+    )
+
+async def run_in_executor(endpoint: str, func, *args):
+    """
+    تنفيذ عمل حسابي في المنفّذ ضمن حدود نقطة النهاية
+    """
+    try:
+        return await workload_executor.run(endpoint, func, *args)
+    except ExecutorSaturated as e:
+        raise service_busy(e)
 
 # نماذج البيانات
 class AnalyticsEvent(BaseModel):
@@ -49,6 +147,11 @@ class AnalyticsEvent(BaseModel):
     timestamp: str
     user_id: Optional[str] = None
     article_id: Optional[str] = None
+    
+    @field_validator("event_data")
+    @classmethod
+    def check_event_data(cls, value: Dict[str, Any]) -> Dict[str, Any]:
+        return validate_event_data(value)
 
 class Article(BaseModel):
     id: str
@@ -60,20 +163,80 @@ class Article(BaseModel):
     comment_count: int = 0
     published_at: Optional[str] = None
     author: Optional[Dict[str, str]] = None
+    excerpt: Optional[str] = None
+
+def validate_published_since(value: Optional[str]) -> Optional[str]:
+    """رفض تاريخ published_since غير الصالح (422) بدل تجاهل الفلتر بصمت"""
+    if value and parse_timestamp(value) is None:
+        raise ValueError("published_since must be an ISO 8601 date")
+    return value
 
 class RecommendationRequest(BaseModel):
-    user_events: List[AnalyticsEvent]
-    articles: List[Article]
+    user_id: Optional[str] = None
+    user_events: Optional[List[AnalyticsEvent]] = None
+    # المقالات المرشحة: قائمة كاملة، أو الإشارة إلى الكتالوج بالمعرفات/الفلاتر
+    articles: Optional[List[Article]] = None
+    article_ids: Optional[List[str]] = None
+    category: Optional[str] = None
+    published_since: Optional[str] = None
+    top_n: int = Field(default=5, ge=1, le=20)
+    context: str = "homepage"
+    # حقول كل توصية في الرد (مثل id وrecommendation_score وrecommendation_reason)، None للمقال كاملاً
+    fields: Optional[List[str]] = None
+    
+    @field_validator("published_since")
+    @classmethod
+    def check_published_since(cls, value: Optional[str]) -> Optional[str]:
+        return validate_published_since(value)
+
+class BatchRecommendationRequest(BaseModel):
+    user_ids: List[str] = Field(..., min_length=1)
+    # مرشحات مشتركة لكل المستخدمين: قائمة كاملة أو فلاتر الكتالوج
+    articles: Optional[List[Article]] = None
+    article_ids: Optional[List[str]] = None
+    category: Optional[str] = None
+    published_since: Optional[str] = None
     top_n: int = Field(default=5, ge=1, le=20)
     context: str = "homepage"
+    fields: Optional[List[str]] = None
+    
+    @field_validator("published_since")
+    @classmethod
+    def check_published_since(cls, value: Optional[str]) -> Optional[str]:
+        return validate_published_since(value)
 
 class InterestAnalysisRequest(BaseModel):
-    user_events: List[AnalyticsEvent]
+    user_id: Optional[str] = None
+    user_events: Optional[List[AnalyticsEvent]] = None
+
+class CatalogUpsertRequest(BaseModel):
+    articles: List[Article] = Field(..., min_length=1)
+
+class CatalogDeleteRequest(BaseModel):
+    article_ids: List[str] = Field(..., min_length=1)
+
+class CorpusDocument(BaseModel):
+    id: str = Field(..., min_length=1)
+    text: str
+
+class CorpusDocumentsRequest(BaseModel):
+    documents: List[CorpusDocument] = Field(..., min_length=1)
+
+class EventIngestRequest(BaseModel):
+    user_id: str = Field(..., min_length=1)
+    events: List[AnalyticsEvent] = Field(..., min_length=1)
 
 class TextAnalysisRequest(BaseModel):
     text: str = Field(..., min_length=1, max_length=10000)
     analysis_type: str = Field(default="all")
 
+class TextAnalysisV2Request(BaseModel):
+    text: str = Field(..., min_length=1, max_length=10000)
+    stages: Optional[List[TextStage]] = Field(default=None, min_length=1)  # كل المراحل إن لم تُحدد
+    max_keywords: int = Field(default=10, ge=1, le=50)
+    max_tags: int = Field(default=5, ge=1, le=20)
+    summary_length: int = Field(default=150, ge=20, le=2000)
+
 class RecommendationResponse(BaseModel):
     recommendations: List[Dict[str, Any]]
     metrics: Dict[str, Any]
@@ -88,9 +251,16 @@ async def root():
         "version": "3.0.0",
         "status": "running",
         "endpoints": [
+            "/events",
+            "/catalog/articles",
+            "/corpus/documents",
             "/recommendations",
+            "/recommendations/fast",
+            "/recommendations/batch",
             "/interest-analysis", 
             "/text-analysis",
+            "/text-analysis/v2",
+            "/text-analysis/batch",
             "/user-profile",
             "/health"
         ]
@@ -109,6 +279,167 @@ async def health_check():
         "version": "3.0.0"
     }
 
+def resolve_user_events(
+    user_id: Optional[str],
+    user_events: Optional[List[AnalyticsEvent]],
+    stream: bool = False
+) -> Union[EventBatch, Iterable[Dict[str, Any]]]:
+    """
+    تحديد أحداث المستخدم: من جسم الطلب إن وُجدت، وإلا من مخزن الأحداث
+    
+    أحداث المخزن تُعاد بالتمثيل العمودي (EventBatch) الذي يقبله نموذج الاهتمام
+    ومحرك التوصيات مباشرة. stream=True يعيد أحداث الطلب مكرِّراً يُقرأ تدريجياً
+    لمن يمر عليها مرة واحدة فقط.
+    """
+    if user_events is not None:
+        events = (event.model_dump() for event in user_events)
+        return events if stream else list(events)
+    
+    if user_id:
+        return event_store.get_batch(user_id)
+    
+    raise HTTPException(status_code=400, detail="يجب تحديد user_id أو user_events")
+
+def resolve_interest_scores(
+    user_id: Optional[str],
+    inline_events: bool,
+    user_events: List[Dict[str, Any]]
+) -> Dict[str, float]:
+    """
+    درجات الاهتمام: من الحالة التراكمية للمستخدمين المخزنين، وإلا حساب كامل من الأحداث
+    """
+    if user_id and not inline_events:
+        interest_scores = interest_state_store.get_interest_scores(user_id)
+        if interest_scores is not None:
+            return interest_scores
+    
+    return interest_model.compute_interest_score(user_events)
+
+def resolve_user_profile(
+    user_id: Optional[str],
+    inline_events: bool,
+    user_events: Iterable[Dict[str, Any]],
+    include_statistics: bool = False,
+    now: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    ملف المستخدم لهذا الطلب: درجات الاهتمام (من الحالة التراكمية إن وُجدت) وأنماط
+    السلوك ومستوى التفاعل في مرور واحد على الأحداث، وتُمرر درجاته إلى المحرك
+    """
+    interest_scores = None
+    if user_id and not inline_events:
+        interest_scores = interest_state_store.get_interest_scores(user_id)
+    
+    return interest_model.get_user_profile(user_events, interest_scores, include_statistics, now)
+
+# استقبال أحداث المستخدم وتخزينها
+@app.post("/events")
+async def ingest_events(request: EventIngestRequest):
+    """
+    إضافة أحداث المستخدم إلى المخزن حتى تكتفي طلبات التوصية بإرسال user_id
+    """
+    try:
+        # يُحوَّل الطابع الزمني مرة واحدة هنا بدل كل حساب للاهتمامات
+        events = [
+            {
+                **event.model_dump(),
+                "user_id": event.user_id or request.user_id,
+                EVENT_EPOCH_KEY: parse_timestamp(event.timestamp)
+            }
+            for event in request.events
+        ]
+        total_events = event_store.append(request.user_id, events)
+        interest_state_store.apply_events(
+            request.user_id, events, version=event_store.version(request.user_id)
+        )
+        collaborative_model.add_events(request.user_id, events)
+        
+        return {
+            "user_id": request.user_id,
+            "accepted": len(events),
+            "total_events": total_events,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error ingesting events: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"خطأ في تخزين الأحداث: {str(e)}")
+
+# إضافة/تحديث مقالات الكتالوج
+@app.post("/catalog/articles")
+async def upsert_catalog_articles(request: CatalogUpsertRequest, background_tasks: BackgroundTasks):
+    """
+    إضافة المقالات إلى الكتالوج أو تحديثها (تُحسب مميزاتها مرة واحدة)
+    """
+    articles = [article.model_dump() for article in request.articles]
+    upserted = article_catalog.upsert(articles)
+    response_cache.invalidate_all()
+    
+    # ترميز المقالات الجديدة في الخلفية حتى لا يتأخر الرد
+    if embedding_index is not None:
+        background_tasks.add_task(encode_articles, articles)
+    
+    return {
+        "upserted": upserted,
+        "catalog": article_catalog.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+def encode_articles(articles: List[Dict]):
+    """إضافة تضمينات المقالات إلى الفهرس الدلالي"""
+    try:
+        embedding_index.add_articles(articles)
+        response_cache.invalidate_all()
+    except Exception as e:
+        logger.error(f"Error encoding articles: {str(e)}")
+
+# إضافة المقالات المنشورة إلى جدول تكرار المصطلحات (IDF للكلمات المفتاحية)
+@app.post("/corpus/documents")
+async def add_corpus_documents(request: CorpusDocumentsRequest):
+    """
+    إضافة نصوص المقالات المنشورة إلى جدول المدونة؛ المقالات المعروفة تُتجاوز
+    """
+    try:
+        # يُحدَّث جدول العملية الحالية، فلا تُضاف نقطة النهاية لمجمّع العمليات
+        added = await run_in_executor(
+            "corpus-documents", CORPUS_DOCUMENT_FREQUENCY.add_texts,
+            [document.text for document in request.documents],
+            [document.id for document in request.documents]
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating corpus document frequencies: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"خطأ في تحديث المدونة: {str(e)}")
+    
+    return {
+        "added": added,
+        "corpus": CORPUS_DOCUMENT_FREQUENCY.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+# حذف مقالات من الكتالوج
+@app.post("/catalog/articles/delete")
+async def delete_catalog_articles(request: CatalogDeleteRequest):
+    """
+    حذف المقالات من الكتالوج
+    """
+    deleted = article_catalog.delete(request.article_ids)
+    if deleted:
+        response_cache.invalidate_all()
+    
+    return {
+        "deleted": deleted,
+        "catalog": article_catalog.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+# حالة الكتالوج
+@app.get("/catalog")
+async def get_catalog_stats():
+    return article_catalog.stats()
+
 # خدمة التوصيات الرئيسية
 @app.post("/recommendations", response_model=RecommendationResponse)
 async def get_recommendations(request: RecommendationRequest):
@@ -116,36 +447,307 @@ async def get_recommendations(request: RecommendationRequest):
     توليد توصيات مخصصة للمستخدم
     """
     try:
-        logger.info(f"Processing recommendation request for {len(request.articles)} articles")
+        return await run_in_executor("recommendations", build_recommendations, request)
         
-        # تحويل البيانات للنماذج
-        user_events = [event.dict() for event in request.user_events]
-        articles = [article.dict() for article in request.articles]
-        
-        # توليد التوصيات
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in recommendations: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"خطأ في توليد التوصيات: {str(e)}")
+
+def recommendation_cache_key(
+    request: RecommendationRequest,
+    inline_events: bool,
+    articles: Optional[List[Dict[str, Any]]]
+) -> Optional[str]:
+    """
+    مفتاح النتيجة المخزنة: المستخدم وإصدار أحداثه والسياق والعدد والمرشحات وإصدار
+    الكتالوج وآخر مصفوفة منشورة لنموذج التصفية التعاونية
+    
+    إصدار الأحداث من مخزن الأحداث المشترك بين العمّال، فلا يعيد عامل نتيجة
+    قديمة بعد أحداث استقبلها عامل آخر. إصدار النموذج يتغير مع نشر المصفوفة
+    (مرة كل COLLABORATIVE_REFRESH_SECONDS على الأكثر) لا مع كل حدث.
+    
+    الطلبات التي ترسل أحداثها أو مقالاتها بنفسها لا تُخزن: لا إصدار لها، وترميز
+    القائمة كاملة وتجزئتها لكل طلب يكلف أكثر مما توفره إصابة نادرة.
+    """
+    if not request.user_id or inline_events or articles is not None:
+        return None
+    
+    return cache_key(
+        request.user_id, event_store.version(request.user_id),
+        collaborative_model.matrix_version(), request.context, request.top_n,
+        article_catalog.version, request.article_ids, request.category, request.published_since
+    )
+
+def project_recommendations(response: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """الإبقاء على الحقول المطلوبة فقط من كل توصية (الرد المخزن يبقى كاملاً)"""
+    if fields is None:
+        return response
+    return {**response, "recommendations": project_fields(response["recommendations"], fields)}
+
+def build_recommendations(
+    request: RecommendationRequest,
+    user_events: Optional[EventBatch] = None,
+    articles: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    حساب التوصيات (يعمل في المنفّذ)
+    
+    المسار السريع يمرر الأحداث (EventBatch) والمقالات (قواميس) محللة مباشرة من
+    جسم الطلب، وإلا تُؤخذ من نماذج الطلب.
+    """
+    inline_events = user_events is not None or request.user_events is not None
+    if articles is None and request.articles is not None:
+        articles = [article.model_dump() for article in request.articles]
+    
+    # الإصدارات تُقرأ قبل الحساب، فالنتيجة المحسوبة أثناء وصول أحداث جديدة لن تُستخدم
+    key = recommendation_cache_key(request, inline_events, articles)
+    if key is not None:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return project_recommendations(cached, request.fields)
+    
+    # وقت مرجعي واحد للطلب (تراجع الاهتمامات وحداثة المقالات)
+    now = time.time()
+    
+    # تحويل البيانات للنماذج
+    if user_events is None:
+        user_events = resolve_user_events(request.user_id, request.user_events)
+    user_profile = resolve_user_profile(request.user_id, inline_events, user_events, now=now)
+    interest_scores = user_profile["interest_scores"]
+    
+    # توليد التوصيات
+    if articles is not None:
+        logger.info(f"Processing recommendation request for {len(articles)} articles")
         recommendations = recommendation_engine.recommend_articles(
             user_events=user_events,
             articles=articles,
             top_n=request.top_n,
-            context=request.context
+            context=request.context,
+            user_interests=interest_scores,
+            now=now
         )
+    else:
+        logger.info(f"Processing recommendation request for {len(article_catalog)} catalog articles")
+        recommendations = recommendation_engine.recommend_from_catalog(
+            article_catalog,
+            user_interests=interest_scores,
+            user_events=user_events,
+            top_n=request.top_n,
+            context=request.context,
+            article_ids=request.article_ids,
+            category=request.category,
+            published_since=request.published_since,
+            now=now
+        )
+    
+    # حساب مقاييس الجودة
+    metrics = recommendation_engine.get_recommendation_metrics(recommendations)
+    
+    response = {
+        "recommendations": recommendations,
+        "metrics": metrics,
+        "user_profile": user_profile,
+        "timestamp": datetime.now().isoformat()
+    }
+    
+    if key is not None:
+        response_cache.set(key, response)
+    
+    return project_recommendations(response, request.fields)
+
+# المسار السريع للتوصيات (طلبات كبيرة)
+@app.post("/recommendations/fast", response_class=FastJSONResponse)
+async def get_recommendations_fast(raw_request: Request):
+    """
+    نفس /recommendations بنفس جسم الطلب، لكن يُحلل الجسم بـ orjson وتتحول
+    الأحداث مباشرة إلى EventBatch والمقالات إلى قواميس دون نموذج Pydantic لكل
+    عنصر، ويُرمَّز الرد دون إعادة التحقق منه
+    """
+    try:
+        request, user_events, articles = parse_fast_recommendation_request(await raw_request.body())
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=f"طلب غير صالح: {str(e)}")
+    
+    try:
+        return FastJSONResponse(await run_in_executor(
+            "recommendations", build_recommendations, request, user_events, articles
+        ))
         
-        # حساب مقاييس الجودة
-        metrics = recommendation_engine.get_recommendation_metrics(recommendations)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in recommendations: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"خطأ في توليد التوصيات: {str(e)}")
+
+# القيم الافتراضية لحقول المقال كما يضيفها نموذج Article
+ARTICLE_DEFAULTS = {
+    name: field.default for name, field in Article.model_fields.items() if not field.is_required()
+}
+
+def require_fields(items: Any, fields: Iterable[str], name: str) -> List[Dict[str, Any]]:
+    """التحقق من أن items قائمة كائنات تحتوي الحقول المطلوبة"""
+    if not isinstance(items, list):
+        raise ValueError(f"{name} must be a list")
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f"{name}[{index}] must be an object")
+        missing = [field for field in fields if field not in item]
+        if missing:
+            raise ValueError(f"{name}[{index}] is missing {', '.join(missing)}")
+    return items
+
+ARTICLE_STRING_FIELDS = ("id", "title", "published_at", "excerpt")
+ARTICLE_COUNT_FIELDS = ("view_count", "like_count", "comment_count")
+ARTICLE_OBJECT_FIELDS = ("category", "author")
+
+def validate_article(article: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """
+    التحقق من أنواع حقول المقال التي يقرؤها ArticleFeatures (ValueError إن لم تصح)
+    
+    نفس قيود نموذج Article حتى يرد المسار السريع بـ 422 كالمسار العادي بدل
+    خطأ داخلي عند بناء الميزات.
+    """
+    for field in ARTICLE_STRING_FIELDS:
+        value = article.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{name}.{field} must be a string")
+    for field in ARTICLE_COUNT_FIELDS:
+        value = article.get(field)
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise ValueError(f"{name}.{field} must be a number")
+    for field in ARTICLE_OBJECT_FIELDS:
+        value = article.get(field)
+        if value is None and field != "category":
+            continue
+        if not isinstance(value, dict) or not all(isinstance(v, str) for v in value.values()):
+            raise ValueError(f"{name}.{field} must be an object of strings")
+    tags = article.get("tags")
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError(f"{name}.tags must be a list of strings")
+    return article
+
+def parse_fast_recommendation_request(
+    body: bytes
+) -> Tuple[RecommendationRequest, Optional[EventBatch], Optional[List[Dict[str, Any]]]]:
+    """
+    تحليل جسم طلب التوصيات للمسار السريع
+    
+    الحقول البسيطة تُتحقق بنموذج RecommendationRequest، أما الأحداث والمقالات
+    فيُتحقق من حقولها المطلوبة وأنواع ما يُقرأ منها فقط.
+    """
+    payload = loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError("request body must be a JSON object")
+    
+    raw_events = payload.pop("user_events", None)
+    raw_articles = payload.pop("articles", None)
+    request = RecommendationRequest.model_validate(payload)
+    
+    user_events = None
+    if raw_events is not None:
+        raw_events = require_fields(raw_events, ("event_type", "event_data", "timestamp"), "user_events")
+        for index, event in enumerate(raw_events):
+            try:
+                validate_event_data(event["event_data"])
+            except ValueError as e:
+                raise ValueError(f"user_events[{index}]: {e}")
+        user_events = EventBatch.from_events(raw_events)
+    
+    articles = None
+    if raw_articles is not None:
+        articles = [
+            validate_article({**ARTICLE_DEFAULTS, **article}, f"articles[{index}]")
+            for index, article in enumerate(
+                require_fields(raw_articles, ("id", "title", "category"), "articles")
+            )
+        ]
+    
+    return request, user_events, articles
+
+class ReservedStreamingResponse(StreamingResponse):
+    """
+    رد متدفق يحرر مكان نقطة النهاية المحجوز عند إغلاقه
+
+    تحرير المكان في finally المولّد وحده لا يكفي: المولّد الذي لم يبدأ
+    استهلاكه (انقطاع العميل قبل الرد أو خطأ في إرسال الترويسات) لا يُنفَّذ
+    finally فيه. التحرير مرة واحدة مهما تعددت مساراته.
+    """
+
+    def __init__(self, content, reservation: Reservation, **kwargs):
+        super().__init__(content, **kwargs)
+        self.reservation = reservation
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.reservation.release()
+
+# توصيات مجمّعة لعدد كبير من المستخدمين
+@app.post("/recommendations/batch")
+async def get_batch_recommendations(request: BatchRecommendationRequest):
+    """
+    توصيات عدة مستخدمين على نفس المرشحات، تُرسل كسطور NDJSON (سطر لكل مستخدم)
+    """
+    try:
+        reservation = workload_executor.reserve("recommendations-batch")
+    except ExecutorSaturated as e:
+        raise service_busy(e)
+    
+    return ReservedStreamingResponse(
+        workload_executor.iterate(reservation, iter_batch_recommendations(request)),
+        reservation,
+        media_type="application/x-ndjson"
+    )
+
+def iter_batch_recommendations(request: BatchRecommendationRequest) -> Iterator[str]:
+    """
+    سطور NDJSON للتوصيات المجمّعة (يعمل في المنفّذ)
+    
+    مميزات المقالات تُحسب مرة واحدة، وتُقرأ أحداث المستخدمين وتُرسل النتائج
+    دفعة دفعة فلا تكبر الذاكرة مع عدد المستخدمين.
+    """
+    try:
+        if request.articles is not None:
+            features = ArticleFeatures([article.model_dump() for article in request.articles])
+        else:
+            features = article_catalog.select(
+                article_ids=request.article_ids,
+                category=request.category,
+                published_since=request.published_since
+            )
+        logger.info(
+            f"Processing batch recommendations for {len(request.user_ids)} users "
+            f"over {len(features)} articles"
+        )
         
-        # إنشاء ملف المستخدم
-        user_profile = interest_model.get_user_profile(user_events)
+        def stored_users():
+            for user_id in request.user_ids:
+                user_events = event_store.get_batch(user_id)
+                yield resolve_interest_scores(user_id, False, user_events), user_events
         
-        return RecommendationResponse(
-            recommendations=recommendations,
-            metrics=metrics,
-            user_profile=user_profile,
-            timestamp=datetime.now().isoformat()
+        results = recommendation_engine.recommend_batch(
+            features, stored_users(), top_n=request.top_n, context=request.context
         )
         
+        lines = []
+        for user_id, recommendations in zip(request.user_ids, results):
+            lines.append(dumps({
+                "user_id": user_id,
+                "recommendations": project_fields(recommendations, request.fields)
+            }) + b"\n")
+            if len(lines) >= recommendation_engine.batch_size:
+                yield b"".join(lines)
+                lines = []
+        if lines:
+            yield b"".join(lines)
+        
     except Exception as e:
-        logger.error(f"Error in recommendations: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"خطأ في توليد التوصيات: {str(e)}")
+        # بدأ إرسال الرد، فيُبلّغ عن الخطأ كسطر أخير
+        logger.error(f"Error in batch recommendations: {str(e)}")
+        yield dumps({"error": f"خطأ في توليد التوصيات: {str(e)}"}) + b"\n"
 
 # تحليل اهتمامات المستخدم
 @app.post("/interest-analysis")
@@ -154,25 +756,31 @@ async def analyze_user_interests(request: InterestAnalysisRequest):
     تحليل اهتمامات المستخدم بناءً على سلوكه
     """
     try:
-        user_events = [event.dict() for event in request.user_events]
-        
-        # حساب درجات الاهتمام
-        interest_scores = interest_model.compute_interest_score(user_events)
-        
-        # إنشاء ملف المستخدم الكامل
-        user_profile = interest_model.get_user_profile(user_events)
-        
-        return {
-            "interest_scores": interest_scores,
-            "user_profile": user_profile,
-            "total_events": len(user_events),
-            "timestamp": datetime.now().isoformat()
-        }
+        return await run_in_executor("interest-analysis", build_interest_analysis, request)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in interest analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ في تحليل الاهتمامات: {str(e)}")
 
+def build_interest_analysis(request: InterestAnalysisRequest) -> Dict[str, Any]:
+    """حساب تحليل الاهتمامات (يعمل في المنفّذ)"""
+    user_events = resolve_user_events(request.user_id, request.user_events, stream=True)
+    
+    # درجات الاهتمام وملف المستخدم الكامل (مرور واحد على الأحداث)
+    user_profile = resolve_user_profile(
+        request.user_id, request.user_events is not None, user_events, include_statistics=True
+    )
+    statistics = user_profile.pop("statistics")
+    
+    return {
+        "interest_scores": user_profile["interest_scores"],
+        "user_profile": user_profile,
+        "total_events": statistics["total_events"],
+        "timestamp": datetime.now().isoformat()
+    }
+
 # تحليل النصوص
 @app.post("/text-analysis")
 async def analyze_text(request: TextAnalysisRequest):
@@ -180,42 +788,136 @@ async def analyze_text(request: TextAnalysisRequest):
     تحليل النصوص العربية (تحليل المشاعر، استخراج الكلمات المفتاحية، إلخ)
     """
     try:
-        text = request.text
-        analysis_type = request.analysis_type
-        
-        results = {}
-        
-        if analysis_type in ["all", "keywords"]:
-            # استخراج الكلمات المفتاحية (مثال مبسط)
-            keywords = extract_keywords(text)
-            results["keywords"] = keywords
-        
-        if analysis_type in ["all", "sentiment"]:
-            # تحليل المشاعر (مثال مبسط)
-            sentiment = analyze_sentiment(text)
-            results["sentiment"] = sentiment
-        
-        if analysis_type in ["all", "categories"]:
-            # تصنيف النص (مثال مبسط)
-            category = classify_text(text)
-            results["category"] = category
-        
-        if analysis_type in ["all", "summary"]:
-            # تلخيص النص (مثال مبسط)
-            summary = summarize_text(text)
-            results["summary"] = summary
-        
-        return {
-            "analysis": results,
-            "text_length": len(text),
-            "analysis_type": analysis_type,
-            "timestamp": datetime.now().isoformat()
-        }
+        # تُمرَّر القيم البسيطة فقط حتى يصلح التنفيذ في مجمّع العمليات
+        return await run_in_executor(
+            "text-analysis", run_text_analysis, request.text, request.analysis_type
+        )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in text analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ في تحليل النص: {str(e)}")
 
+def run_text_analysis(text: str, analysis_type: str) -> Dict[str, Any]:
+    """تحليل النص (يعمل في المنفّذ)"""
+    results = {}
+    
+    # مطابقة واحدة لقوائم الكلمات تكفي المشاعر والتصنيف معاً
+    matches = None
+    if analysis_type in ["all", "sentiment", "categories"]:
+        matches = text_lexicon.match_substrings(text)
+    
+    if analysis_type in ["all", "keywords"]:
+        # استخراج الكلمات المفتاحية (مثال مبسط)
+        keywords = extract_keywords(text)
+        results["keywords"] = keywords
+    
+    if analysis_type in ["all", "sentiment"]:
+        # تحليل المشاعر (مثال مبسط)
+        sentiment = analyze_sentiment(text, matches)
+        results["sentiment"] = sentiment
+    
+    if analysis_type in ["all", "categories"]:
+        # تصنيف النص (مثال مبسط)
+        category = classify_text(text, matches)
+        results["category"] = category
+    
+    if analysis_type in ["all", "summary"]:
+        # تلخيص النص (مثال مبسط)
+        summary = summarize_text(text)
+        results["summary"] = summary
+    
+    return {
+        "analysis": results,
+        "text_length": len(text),
+        "analysis_type": analysis_type,
+        "timestamp": datetime.now().isoformat()
+    }
+
+# تحليل النصوص بالمراحل (TextAnalyzer وNLPService)
+@app.post("/text-analysis/v2")
+async def analyze_text_v2(request: TextAnalysisV2Request):
+    """
+    تشغيل التحليلات المطلوبة كمراحل على تقطيع واحد للنص، مع زمن كل مرحلة
+    """
+    try:
+        return await run_in_executor(
+            "text-analysis-v2", run_text_analysis_v2, request.text, request.stages,
+            request.max_keywords, request.max_tags, request.summary_length
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in staged text analysis: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"خطأ في تحليل النص: {str(e)}")
+
+def run_text_analysis_v2(
+    text: str,
+    stages: Optional[List[str]],
+    max_keywords: int,
+    max_tags: int,
+    summary_length: int
+) -> Dict[str, Any]:
+    """تحليل النص بالمراحل (يعمل في المنفّذ)"""
+    result = get_text_pipeline().run(
+        text, stages, max_keywords=max_keywords, max_tags=max_tags, summary_length=summary_length
+    )
+    result["timestamp"] = datetime.now().isoformat()
+    return result
+
+# تحليل النصوص بالجملة
+@app.post("/text-analysis/batch")
+async def analyze_text_batch(request: Request):
+    """
+    تحليل أرشيف نصوص: جسم الطلب سطور JSONL ({"id": ..., "text": ...})، والرد
+    سطر NDJSON لكل سطر بنفس الترتيب، والمدخلات تُقرأ بقدر ما يُستهلك من الرد.
+    الرد بدأ قبل قراءة السطور، فالسطر أو النص الأطول من حدود المحلل يُعاد
+    خطأً في مكانه بـ status 413 والسطر غير الصالح بـ 422.
+    """
+    try:
+        reservation = workload_executor.reserve("text-analysis-batch")
+    except ExecutorSaturated as e:
+        raise service_busy(e)
+    
+    return DuplexStreamingResponse(
+        stream_batch_text_analysis(reservation, request),
+        reservation,
+        media_type="application/x-ndjson"
+    )
+
+class DuplexStreamingResponse(ReservedStreamingResponse):
+    """
+    رد متدفق يقرأ مولّده جسم الطلب أثناء الإرسال
+
+    StreamingResponse ينتظر انقطاع العميل بـ receive في مهمة موازية فيستهلك
+    رسائل جسم الطلب قبل المولّد؛ هنا يُكتفى بالإرسال، وانقطاع العميل يظهر
+    للمولّد كخطأ في قراءة الطلب.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        finally:
+            self.reservation.release()
+
+async def stream_batch_text_analysis(reservation: Reservation, request: Request):
+    """نتائج التحليل بالجملة دفعة دفعة، مع تحرير مكان نقطة النهاية عند الانتهاء"""
+    try:
+        async for block in batch_text_analyzer.aiter_results(
+            aiter_lines(request.stream(), batch_text_analyzer.max_line_bytes)
+        ):
+            yield block
+    except ClientDisconnect:
+        logger.info("Client disconnected during batch text analysis")
+    except Exception as e:
+        # بدأ إرسال الرد، فيُبلّغ عن الخطأ كسطر أخير
+        logger.error(f"Error in batch text analysis: {str(e)}")
+        yield dumps({"error": f"خطأ في تحليل النصوص: {str(e)}"}) + b"\n"
+    finally:
+        reservation.release()
+
 # ملف المستخدم الشامل
 @app.post("/user-profile")
 async def get_user_profile(request: InterestAnalysisRequest):
@@ -223,30 +925,26 @@ async def get_user_profile(request: InterestAnalysisRequest):
     إنشاء ملف شامل للمستخدم
     """
     try:
-        user_events = [event.dict() for event in request.user_events]
-        
-        # إنشاء ملف المستخدم
-        profile = interest_model.get_user_profile(user_events)
-        
-        # إضافة إحصائيات إضافية
-        profile["statistics"] = {
-            "total_events": len(user_events),
-            "unique_articles": len(set(
-                event.get("article_id") for event in user_events
-                if event.get("article_id")
-            )),
-            "event_types": list(set(
-                event.get("event_type") for event in user_events
-            )),
-            "analysis_date": datetime.now().isoformat()
-        }
-        
-        return profile
+        return await run_in_executor("user-profile", build_user_profile, request)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating user profile: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ في إنشاء ملف المستخدم: {str(e)}")
 
+def build_user_profile(request: InterestAnalysisRequest) -> Dict[str, Any]:
+    """حساب ملف المستخدم الشامل (يعمل في المنفّذ)"""
+    user_events = resolve_user_events(request.user_id, request.user_events, stream=True)
+    
+    # إنشاء ملف المستخدم مع إحصائياته في مرور واحد على الأحداث
+    profile = resolve_user_profile(
+        request.user_id, request.user_events is not None, user_events, include_statistics=True
+    )
+    profile["statistics"]["analysis_date"] = datetime.now().isoformat()
+    
+    return profile
+
 # إحصائيات النظام
 @app.get("/system-stats")
 async def get_system_stats():
@@ -265,8 +963,16 @@ async def get_system_stats():
             "recommendation_engine": {
                 "status": "loaded",
                 "algorithm_weights": recommendation_engine.algorithm_weights
-            }
+            },
+            "event_store": event_store.stats(),
+            "interest_state": interest_state_store.stats(),
+            "collaborative_model": collaborative_model.stats(),
+            "article_catalog": article_catalog.stats(),
+            "document_frequency": CORPUS_DOCUMENT_FREQUENCY.stats(),
+            "embedding_index": embedding_index.stats() if embedding_index is not None else None
         },
+        "executor": workload_executor.stats(),
+        "response_cache": response_cache.stats(),
         "capabilities": [
             "user_interest_analysis",
             "content_recommendations",
@@ -288,14 +994,28 @@ def extract_keywords(text: str) -> List[str]:
     keywords = [word for word in words if len(word) > 3 and word not in stop_words]
     return keywords[:10]  # أفضل 10 كلمات
 
-def analyze_sentiment(text: str) -> Dict[str, Any]:
-    """تحليل المشاعر (مثال مبسط)"""
-    # في التطبيق الحقيقي، نحتاج لنموذج مدرب على النصوص العربية
-    positive_words = ['جيد', 'ممتاز', 'رائع', 'مفيد', 'إيجابي']
-    negative_words = ['سيء', 'ضعيف', 'مشكلة', 'خطأ', 'سلبي']
+# قوائم كلمات المشاعر والتصنيفات مُجمّعة مرة واحدة (مثال مبسط)
+# في التطبيق الحقيقي، نحتاج لنموذج مدرب على النصوص العربية
+TEXT_CATEGORIES = {
+    'تقنية': ['تقنية', 'ذكاء', 'اصطناعي', 'برمجة', 'حاسوب'],
+    'رياضة': ['كرة', 'رياضة', 'فريق', 'لاعب', 'مباراة'],
+    'أخبار': ['خبر', 'حدث', 'جديد', 'عاجل', 'تطور'],
+    'اقتصاد': ['اقتصاد', 'مال', 'استثمار', 'سوق', 'أسهم']
+}
+
+text_lexicon = LexiconMatcher({
+    ('sentiment', 'positive'): ['جيد', 'ممتاز', 'رائع', 'مفيد', 'إيجابي'],
+    ('sentiment', 'negative'): ['سيء', 'ضعيف', 'مشكلة', 'خطأ', 'سلبي'],
+    **{('category', category): keywords for category, keywords in TEXT_CATEGORIES.items()}
+})
+
+def analyze_sentiment(text: str, matches: Optional[LexiconMatches] = None) -> Dict[str, Any]:
+    """تحليل المشاعر (matches: مطابقة text_lexicon للنص إن حُسبت مسبقاً)"""
+    if matches is None:
+        matches = text_lexicon.match_substrings(text)
     
-    positive_count = sum(1 for word in positive_words if word in text)
-    negative_count = sum(1 for word in negative_words if word in text)
+    positive_count = matches.count(('sentiment', 'positive'))
+    negative_count = matches.count(('sentiment', 'negative'))
     
     if positive_count > negative_count:
         sentiment = 'positive'
@@ -314,19 +1034,15 @@ def analyze_sentiment(text: str) -> Dict[str, Any]:
         'negative_indicators': negative_count
     }
 
-def classify_text(text: str) -> Dict[str, Any]:
-    """تصنيف النص (مثال مبسط)"""
+def classify_text(text: str, matches: Optional[LexiconMatches] = None) -> Dict[str, Any]:
+    """تصنيف النص (matches: مطابقة text_lexicon للنص إن حُسبت مسبقاً)"""
     # في التطبيق الحقيقي، نحتاج لنموذج تصنيف مدرب
-    categories = {
-        'تقنية': ['تقنية', 'ذكاء', 'اصطناعي', 'برمجة', 'حاسوب'],
-        'رياضة': ['كرة', 'رياضة', 'فريق', 'لاعب', 'مباراة'],
-        'أخبار': ['خبر', 'حدث', 'جديد', 'عاجل', 'تطور'],
-        'اقتصاد': ['اقتصاد', 'مال', 'استثمار', 'سوق', 'أسهم']
-    }
+    if matches is None:
+        matches = text_lexicon.match_substrings(text)
     
     scores = {}
-    for category, keywords in categories.items():
-        score = sum(1 for keyword in keywords if keyword in text.lower())
+    for category in TEXT_CATEGORIES:
+        score = matches.count(('category', category))
         if score > 0:
             scores[category] = score
     
@@ -0,0 +1,365 @@
+"""
+كتالوج المقالات مع المميزات المحسوبة مسبقاً
+Server-side Article Catalog
+@version 3.0.0
+"""
+
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .vectorized_scoring import ArticleFeatures, parse_published_epoch
+
+logger = logging.getLogger(__name__)
+
+
+class InvertedIndex:
+    """
+    فهرس معكوس من التصنيف/الوسم/الكاتب إلى مواقع المقالات
+
+    يتكون من مقاطع بصيغة CSR: مواقع مقالات المصطلح t في المقطع هي
+    rows[offsets[t]:offsets[t + 1]]. المقالات المضافة لاحقاً تُفهرس في مقطع
+    جديد (extend) فلا يُعاد بناء المقاطع السابقة.
+    """
+
+    def __init__(self, features: ArticleFeatures, start: int = 0):
+        self.vocabulary = features.vocabulary
+        self.segments = [self._build(features, start)]
+
+    @staticmethod
+    def _build(features: ArticleFeatures, start: int):
+        n = len(features)
+        positions = np.arange(start, start + n, dtype=np.int32)
+        tag_width = features.tag_ids.shape[1] if n else 0
+
+        term_column = np.concatenate([
+            features.category_ids, features.author_ids, features.tag_ids.ravel()
+        ])
+        row_column = np.concatenate([
+            positions, positions, np.repeat(positions, tag_width)
+        ])
+
+        valid = term_column >= 0
+        term_column, row_column = term_column[valid], row_column[valid]
+
+        # ترتيب حسب المصطلح ثم الموقع وإزالة التكرار (وسم مكرر في نفس المقال)
+        order = np.lexsort((row_column, term_column))
+        term_column, row_column = term_column[order], row_column[order]
+        if term_column.size:
+            keep = np.ones(term_column.size, dtype=bool)
+            keep[1:] = (np.diff(term_column) != 0) | (np.diff(row_column) != 0)
+            term_column, row_column = term_column[keep], row_column[keep]
+
+        offsets = np.zeros(features.n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_column, minlength=features.n_terms), out=offsets[1:])
+        return row_column, offsets
+
+    @property
+    def n_terms(self) -> int:
+        return max(offsets.size - 1 for _, offsets in self.segments)
+
+    def extend(self, features: ArticleFeatures, start: int) -> 'InvertedIndex':
+        """فهرس جديد يضم مقالات features في المواقع بدءاً من start (الفهرس الحالي لا يتغير)"""
+        extended = InvertedIndex.__new__(InvertedIndex)
+        extended.vocabulary = self.vocabulary
+        extended.segments = self.segments + [self._build(features, start)]
+        return extended
+
+    def postings(self, term: str) -> np.ndarray:
+        """مواقع المقالات المرتبطة بالمصطلح"""
+        term_id = self.vocabulary.get(term)
+        parts = [
+            rows[offsets[term_id]:offsets[term_id + 1]]
+            for rows, offsets in self.segments
+            if term_id is not None and term_id < offsets.size - 1
+        ]
+        if not parts:
+            return self.segments[0][0][:0]
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+class ArticleCatalog:
+    """
+    كتالوج المقالات المتاحة للتوصية
+
+    تُستقبل المقالات مرة واحدة (إضافة/تحديث/حذف)، ويُحدَّث تمثيلها العمودي
+    (الشعبية، تاريخ النشر كـ epoch، معرفات الوسوم والتصنيفات) تدريجياً: المقالات
+    الجديدة أو المحدّثة تُحلل وحدها وتُلحق بالمصفوفات وبمقطع جديد في الفهرس
+    المعكوس، ومواقعها السابقة والمحذوفة تُعلَّم كمحذوفة. يُضغط التمثيل عندما
+    تتجاوز المواقع المحذوفة compact_ratio منه، ويُدمج الفهرس عند تجاوز مقاطعه
+    max_index_segments.
+    """
+
+    def __init__(self, compact_ratio: float = 0.25, max_index_segments: int = 8):
+        self.compact_ratio = compact_ratio
+        self.max_index_segments = max_index_segments
+        self._articles: Dict[str, Dict] = {}
+        # تواريخ النشر محوّلة إلى epoch مرة واحدة عند الإضافة
+        self._published_epochs: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._features = ArticleFeatures([])
+        # موقع كل مقال حي في المصفوفات
+        self._index: Dict[str, int] = {}
+        # المواقع الحية (None إذا لم يُحذف شيء منذ آخر ضغط)
+        self._live: Optional[np.ndarray] = None
+        self._inverted_index = InvertedIndex(self._features)
+        # المقالات المضافة/المحدّثة/المحذوفة منذ آخر تحديث للتمثيل
+        self._dirty: Dict[str, None] = {}
+        self._features_version = 0
+
+        # يزداد مع كل تعديل (يُستخدم لإبطال النتائج المحسوبة مسبقاً)
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._articles)
+
+    def __contains__(self, article_id: str) -> bool:
+        return article_id in self._articles
+
+    def get(self, article_id: str) -> Optional[Dict]:
+        return self._articles.get(article_id)
+
+    def upsert(self, articles: Iterable[Dict]) -> int:
+        """إضافة مقالات جديدة أو تحديث الموجودة"""
+        count = 0
+        with self._lock:
+            for article in articles:
+                self._articles[article['id']] = article
+                self._published_epochs[article['id']] = parse_published_epoch(article.get('published_at'))
+                self._dirty[article['id']] = None
+                count += 1
+            if count:
+                self.version += 1
+        return count
+
+    def delete(self, article_ids: Iterable[str]) -> int:
+        """حذف مقالات من الكتالوج"""
+        count = 0
+        with self._lock:
+            for article_id in article_ids:
+                if self._articles.pop(article_id, None) is not None:
+                    del self._published_epochs[article_id]
+                    self._dirty[article_id] = None
+                    count += 1
+            if count:
+                self.version += 1
+        return count
+
+    def _snapshot(self):
+        """التمثيل العمودي والمواقع الحية وفهرس المعرفات والفهرس المعكوس لإصدار الكتالوج الحالي"""
+        with self._lock:
+            if self._features_version != self.version:
+                self._apply_changes()
+                self._features_version = self.version
+            return self._features, self._live, self._index, self._inverted_index
+
+    def _apply_changes(self) -> None:
+        """تطبيق التعديلات المعلقة: إلحاق المقالات الجديدة وتعليم المواقع القديمة كمحذوفة"""
+        features = self._features
+        index = self._index
+
+        # تُنشأ مصفوفات جديدة ولا تُعدَّل التي بيد الطلبات الجارية؛ قاموس المواقع
+        # يُعدَّل في مكانه، لذا يتحقق القراء من أن الموقع ضمن لقطتهم وحي فيها
+        stale = [index.pop(article_id) for article_id in self._dirty if article_id in index]
+        appended = [article_id for article_id in self._dirty if article_id in self._articles]
+        self._dirty = {}
+
+        start = len(features)
+        if appended:
+            delta = ArticleFeatures(
+                [self._articles[article_id] for article_id in appended],
+                np.fromiter(
+                    (self._published_epochs[article_id] for article_id in appended),
+                    dtype=np.float64, count=len(appended)
+                )
+            )
+            features = ArticleFeatures.concat(features, delta)
+            for offset, article_id in enumerate(appended):
+                index[article_id] = start + offset
+
+        live = self._live
+        if stale or (live is not None and appended):
+            if live is None:
+                live = np.ones(len(features), dtype=bool)
+            else:
+                live = np.concatenate([live, np.ones(len(appended), dtype=bool)])
+            live[stale] = False
+
+        if live is not None and len(features) - len(index) > self.compact_ratio * len(features):
+            features = features.take(np.flatnonzero(live))
+            self._index = {article_id: i for i, article_id in enumerate(features.ids)}
+            self._live = None
+            self._inverted_index = InvertedIndex(features)
+            logger.info(f"Compacted catalog features to {len(features)} articles (version {self.version})")
+        else:
+            self._live = live
+            if len(self._inverted_index.segments) >= self.max_index_segments:
+                self._inverted_index = InvertedIndex(features)
+            elif appended:
+                self._inverted_index = self._inverted_index.extend(delta, start)
+
+        self._features = features
+
+    def features(self) -> ArticleFeatures:
+        """التمثيل العمودي لكل مقالات الكتالوج الحية (يُحدَّث عند تغير الإصدار فقط)"""
+        features, live, _, _ = self._snapshot()
+        return features if live is None else features.take(np.flatnonzero(live))
+
+    def inverted_index(self) -> InvertedIndex:
+        """الفهرس المعكوس لإصدار الكتالوج الحالي (قد يشير إلى مواقع محذوفة)"""
+        return self._snapshot()[3]
+
+    def select(
+        self,
+        article_ids: Optional[List[str]] = None,
+        category: Optional[str] = None,
+        published_since: Optional[str] = None,
+        user_interests: Optional[Dict[str, float]] = None,
+        candidate_budget: Optional[int] = None,
+        interest_limit: int = 20,
+        backfill_ratio: float = 0.2,
+        seed_article_ids: Optional[Iterable[str]] = None,
+        now: Optional[float] = None
+    ) -> ArticleFeatures:
+        """
+        اختيار المرشحين من الكتالوج
+
+        Args:
+            article_ids: معرفات محددة (تُتجاهل المعرفات غير الموجودة)
+            category: اسم التصنيف
+            published_since: تاريخ ISO؛ تُستبعد المقالات الأقدم أو بلا تاريخ نشر
+            user_interests: درجات اهتمام المستخدم لتوليد المرشحين من الفهرس المعكوس
+            candidate_budget: الحد الأقصى للمرشحين (None لتقييم كل المقالات المطابقة)
+            interest_limit: عدد أقوى الاهتمامات المستخدمة في توليد المرشحين
+            backfill_ratio: نسبة الميزانية المحجوزة لأكثر المقالات شعبية وحداثة
+            seed_article_ids: مقالات تُضاف أولاً بترتيب أولويتها (مثل التي تفاعل معها
+                المستخدم)، وتُحسب من ميزانية الاهتمامات فلا تتجاوزها
+            now: الوقت المرجعي للطلب (لحداثة المقالات عند ترتيب المرشحين)
+
+        Raises:
+            ValueError: إذا كان published_since تاريخاً غير صالح
+        """
+        features, live, index, inverted_index = self._snapshot()
+
+        if article_ids is None and category is None and published_since is None:
+            indices = None if live is None else np.flatnonzero(live)
+        else:
+            if article_ids is not None:
+                positions = (index.get(article_id, -1) for article_id in article_ids)
+                indices = np.array(
+                    [position for position in positions if self._is_live(position, features, live)],
+                    dtype=np.intp
+                )
+            else:
+                indices = np.arange(len(features), dtype=np.intp) if live is None else np.flatnonzero(live)
+
+            mask = np.ones(indices.size, dtype=bool)
+
+            if category is not None:
+                category_id = features.vocabulary.get(category, -1)
+                mask &= features.category_ids[indices] == category_id
+
+            if published_since:
+                since = parse_published_epoch(published_since)
+                if np.isnan(since):
+                    raise ValueError(f"Invalid published_since date: {published_since}")
+                mask &= features.published_epoch[indices] >= since
+
+            indices = indices[mask]
+
+        available = len(features) if indices is None else indices.size
+        if user_interests is None or candidate_budget is None or available <= candidate_budget:
+            return features if indices is None else features.take(indices)
+
+        allowed = None
+        if indices is not None:
+            allowed = np.zeros(len(features), dtype=bool)
+            allowed[indices] = True
+
+        candidates = self._generate_candidates(
+            features, live, index, inverted_index, allowed, user_interests,
+            candidate_budget, interest_limit, backfill_ratio, seed_article_ids, now
+        )
+        return features.take(candidates)
+
+    def _generate_candidates(
+        self,
+        features: ArticleFeatures,
+        live: Optional[np.ndarray],
+        index: Dict[str, int],
+        inverted_index: InvertedIndex,
+        allowed: Optional[np.ndarray],
+        user_interests: Dict[str, float],
+        candidate_budget: int,
+        interest_limit: int,
+        backfill_ratio: float,
+        seed_article_ids: Optional[Iterable[str]],
+        now: Optional[float] = None
+    ) -> np.ndarray:
+        """
+        توليد المرشحين من البذور وأقوى الاهتمامات ثم إكمالها بالأكثر شعبية وحداثة
+
+        البذور تُؤخذ بترتيبها حتى تمتلئ ميزانية الاهتمامات، فيبقى عدد المرشحين
+        ضمن candidate_budget مهما طال سجل الأحداث. من كل قائمة مواقع (بترتيب
+        الإضافة) تُؤخذ المقالات الأعلى في الشعبية والحداثة عند وقت الطلب، لا
+        أقدمها إضافة.
+        """
+        selected = np.zeros(len(features), dtype=bool)
+        if allowed is None:
+            allowed = np.ones(len(features), dtype=bool) if live is None else live
+
+        prior = features.popularity * (1 + features.freshness(now))
+
+        def add(rows: np.ndarray, limit: int) -> None:
+            rows = rows[allowed[rows] & ~selected[rows]]
+            if rows.size > limit:
+                rows = rows[np.argpartition(-prior[rows], limit - 1)[:limit]]
+            selected[rows] = True
+
+        interest_budget = candidate_budget - int(candidate_budget * backfill_ratio)
+
+        seeded = 0
+        for article_id in seed_article_ids or ():
+            if seeded >= interest_budget:
+                break
+            position = index.get(article_id, -1)
+            if self._is_live(position, features, live) and allowed[position] and not selected[position]:
+                selected[position] = True
+                seeded += 1
+
+        top_interests = sorted(
+            (item for item in user_interests.items() if item[0]),
+            key=lambda item: item[1], reverse=True
+        )[:interest_limit]
+
+        for term, _ in top_interests:
+            remaining = interest_budget - int(selected.sum())
+            if remaining <= 0:
+                break
+            add(inverted_index.postings(term), remaining)
+
+        # إكمال الميزانية بأفضل المقالات حسب الشعبية والحداثة
+        remaining = candidate_budget - int(selected.sum())
+        if remaining > 0:
+            add(np.flatnonzero(allowed & ~selected), remaining)
+
+        # الحفاظ على الترتيب الأصلي حتى يبقى كسر التعادل مطابقاً
+        return np.flatnonzero(selected)
+
+    @staticmethod
+    def _is_live(position: int, features: ArticleFeatures, live: Optional[np.ndarray]) -> bool:
+        """هل الموقع (من قاموس المواقع) مقال حي في هذه اللقطة"""
+        return 0 <= position < len(features) and (live is None or bool(live[position]))
+
+    def stats(self) -> Dict:
+        return {
+            'articles': len(self._articles),
+            'version': self.version,
+            'features_built_for_version': self._features_version,
+            'feature_rows': len(self._features),
+            'tombstones': len(self._features) - len(self._index),
+            'indexed_terms': self._inverted_index.n_terms,
+            'index_segments': len(self._inverted_index.segments),
+        }
@@ -0,0 +1,357 @@
+"""
+تضمينات المقالات والبحث التقريبي عن الأقرب دلالياً
+Article Embeddings with Approximate Nearest-Neighbour Retrieval
+@version 3.0.0
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def article_text(article: Dict, lead_chars: int = 300) -> str:
+    """نص المقال المستخدم للتضمين: العنوان ثم المقدمة"""
+    lead = (
+        article.get('lead') or article.get('excerpt') or
+        article.get('summary') or article.get('content') or ''
+    )
+    return f"{article.get('title', '')}. {lead[:lead_chars]}".strip()
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """تطبيع الصفوف لطول 1 (حتى يكون الضرب الداخلي تشابه جيب التمام)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class ArticleEncoder:
+    """
+    ترميز نصوص المقالات بنموذج AraBERT (متوسط تضمينات الرموز)
+
+    يُحمّل النموذج عند أول استخدام، ويمكن تمرير tokenizer/model المحمّلين
+    مسبقاً في ArabicTextAnalyzer لتجنب تحميلهما مرتين.
+    """
+
+    def __init__(self, tokenizer=None, model=None,
+                 model_name: str = "aubmindlab/bert-base-arabert",
+                 max_length: int = 128, batch_size: int = 32):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.model_name = model_name
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_text_analyzer(cls, analyzer, **kwargs) -> 'ArticleEncoder':
+        return cls(tokenizer=analyzer.tokenizer, model=analyzer.model, **kwargs)
+
+    def _ensure_model(self):
+        if self.tokenizer is None or self.model is None:
+            from transformers import AutoTokenizer, AutoModel
+
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self.model = AutoModel.from_pretrained(self.model_name)
+        self.model.eval()
+
+    @property
+    def dim(self) -> int:
+        self._ensure_model()
+        return int(self.model.config.hidden_size)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """ترميز النصوص إلى متجهات مطبّعة"""
+        import torch
+
+        self._ensure_model()
+        outputs = []
+
+        with torch.inference_mode():
+            for start in range(0, len(texts), self.batch_size):
+                batch = self.tokenizer(
+                    texts[start:start + self.batch_size],
+                    padding=True, truncation=True,
+                    max_length=self.max_length, return_tensors='pt'
+                )
+                hidden = self.model(**batch).last_hidden_state
+                mask = batch['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+                outputs.append(pooled.cpu().numpy())
+
+        if not outputs:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return normalize_rows(np.vstack(outputs))
+
+
+class EmbeddingStore:
+    """
+    مصفوفة تضمينات مدمجة (float16) مع ربط معرفات المقالات بالصفوف
+
+    مع تحديد المسار تُحفظ المصفوفة في ملف خام وتُقرأ عبر memory-map،
+    فلا تُحمّل كاملة في ذاكرة كل عامل. في الذاكرة تُحفظ الصفوف في مصفوفة
+    تتضاعف سعتها عند امتلائها، فلا تُنسخ المصفوفة كلها مع كل إضافة.
+    """
+
+    def __init__(self, dim: int, path: Optional[str] = None):
+        self.dim = dim
+        self.path = path
+        self.ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self._vectors = np.zeros((0, dim), dtype=np.float16)
+
+        if path:
+            os.makedirs(path, exist_ok=True)
+            ids_file = os.path.join(path, 'ids.json')
+            if os.path.exists(ids_file):
+                with open(ids_file, 'r', encoding='utf-8') as f:
+                    self.ids = json.load(f)
+                self.positions = {article_id: i for i, article_id in enumerate(self.ids)}
+            self._remap()
+
+    @property
+    def _matrix_file(self) -> str:
+        return os.path.join(self.path, 'embeddings.f16')
+
+    def _remap(self) -> None:
+        if not self.ids or not os.path.exists(self._matrix_file):
+            self._vectors = np.zeros((0, self.dim), dtype=np.float16)
+            return
+        self._vectors = np.memmap(
+            self._matrix_file, dtype=np.float16, mode='r', shape=(len(self.ids), self.dim)
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:len(self.ids)]
+
+    def _reserve(self, rows: int) -> None:
+        """توسيع سعة المصفوفة في الذاكرة إلى rows صفاً على الأقل (بالمضاعفة)"""
+        capacity = len(self._vectors)
+        if rows <= capacity:
+            return
+        grown = np.zeros((max(rows, 2 * capacity, 16), self.dim), dtype=np.float16)
+        grown[:capacity] = self._vectors
+        self._vectors = grown
+
+    def add(self, article_ids: List[str], vectors: np.ndarray) -> np.ndarray:
+        """إضافة تضمينات أو تحديثها؛ تُرجع مواقع الصفوف"""
+        vectors = np.asarray(vectors, dtype=np.float16)
+        positions = np.empty(len(article_ids), dtype=np.int64)
+
+        new_rows = []
+        updates = []
+        for i, article_id in enumerate(article_ids):
+            position = self.positions.get(article_id)
+            if position is None:
+                position = len(self.ids)
+                self.positions[article_id] = position
+                self.ids.append(article_id)
+                new_rows.append(i)
+            else:
+                updates.append((position, i))
+            positions[i] = position
+
+        if self.path:
+            if updates:
+                writable = np.memmap(self._matrix_file, dtype=np.float16, mode='r+',
+                                     shape=(len(self.ids) - len(new_rows), self.dim))
+                for position, i in updates:
+                    writable[position] = vectors[i]
+                writable.flush()
+                del writable
+            if new_rows:
+                with open(self._matrix_file, 'ab') as f:
+                    f.write(np.ascontiguousarray(vectors[new_rows]).tobytes())
+            with open(os.path.join(self.path, 'ids.json'), 'w', encoding='utf-8') as f:
+                json.dump(self.ids, f, ensure_ascii=False)
+            self._remap()
+        else:
+            start = len(self.ids) - len(new_rows)
+            self._reserve(len(self.ids))
+            for position, i in updates:
+                self._vectors[position] = vectors[i]
+            self._vectors[start:len(self.ids)] = vectors[new_rows]
+
+        return positions
+
+
+class IVFIndex:
+    """
+    فهرس IVF للبحث التقريبي (CPU فقط)
+
+    تُجمّع المتجهات حول nlist مركزاً (k-means كروي)، ويُبحث فقط في أقرب
+    nprobe قوائم للاستعلام. تُحفظ قائمة كل موقع حتى يُنقل المقال المحدّث من
+    قائمته القديمة بدل أن يظهر في قائمتين.
+    """
+
+    def __init__(self, nlist: int = 64, nprobe: int = 8, iterations: int = 10, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[np.ndarray] = []
+        # رقم قائمة كل موقع (-1 لغير المفهرس)
+        self.assignments = np.zeros(0, dtype=np.int32)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray, sample_size: int = 20000) -> None:
+        rng = np.random.default_rng(self.seed)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) > sample_size:
+            vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+        nlist = min(self.nlist, len(vectors))
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = vectors[assignment == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = normalize_rows(centroids)
+
+        self.centroids = centroids
+        self.lists = [np.zeros(0, dtype=np.int64) for _ in range(nlist)]
+        self.assignments = np.zeros(0, dtype=np.int32)
+
+    def add(self, positions: np.ndarray, vectors: np.ndarray) -> None:
+        """إضافة المواقع لأقرب قائمة (الموقع المكرر يُعتمد آخر متجه له)"""
+        positions = np.asarray(positions, dtype=np.int64)
+        _, last = np.unique(positions[::-1], return_index=True)
+        keep = np.sort(positions.size - 1 - last)
+        positions = positions[keep]
+        vectors = np.asarray(vectors, dtype=np.float32)[keep]
+        assignment = np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+        size = int(positions.max()) + 1 if positions.size else 0
+        if size > self.assignments.size:
+            grown = np.full(max(size, 2 * self.assignments.size), -1, dtype=np.int32)
+            grown[:self.assignments.size] = self.assignments
+            self.assignments = grown
+
+        # المقالات المحدّثة التي تغيرت قائمتها تُحذف من القديمة
+        previous = self.assignments[positions]
+        moved = (previous >= 0) & (previous != assignment)
+        for c in np.unique(previous[moved]):
+            self.lists[c] = np.setdiff1d(
+                self.lists[c], positions[moved & (previous == c)], assume_unique=True
+            )
+        self.assignments[positions] = assignment
+
+        for c in np.unique(assignment):
+            members = positions[assignment == c]
+            current = self.lists[c]
+            self.lists[c] = np.union1d(current, members)
+
+    def probe(self, query: np.ndarray) -> np.ndarray:
+        """مواقع المرشحين في أقرب القوائم للاستعلام"""
+        nprobe = min(self.nprobe, len(self.lists))
+        nearest = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.lists[c] for c in nearest])
+
+
+class ArticleEmbeddingIndex:
+    """تضمينات المقالات + فهرس IVF لاسترجاع المقالات المشابهة دلالياً"""
+
+    def __init__(self, dim: int = 768, path: Optional[str] = None,
+                 encoder: Optional[ArticleEncoder] = None,
+                 nlist: int = 64, nprobe: int = 8):
+        self.encoder = encoder
+        self.store = EmbeddingStore(dim, path)
+        self.index = IVFIndex(nlist=nlist, nprobe=nprobe)
+        self._lock = threading.Lock()
+
+        # يُدرّب الفهرس عند توفر عدد كافٍ من المقالات؛ قبلها يكون البحث شاملاً
+        self.min_train_size = nlist * 40
+        if len(self.store) >= self.min_train_size:
+            self._train()
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def _train(self) -> None:
+        vectors = self.store.vectors
+        self.index.train(vectors)
+        self.index.add(np.arange(len(vectors)), vectors)
+        logger.info(f"Trained IVF index on {len(vectors)} article embeddings")
+
+    def add_articles(self, articles: List[Dict]) -> int:
+        """ترميز المقالات (العنوان + المقدمة) مرة واحدة وإضافتها للفهرس"""
+        if self.encoder is None or not articles:
+            return 0
+        vectors = self.encoder.encode([article_text(article) for article in articles])
+        self.add([article['id'] for article in articles], vectors)
+        return len(articles)
+
+    def add(self, article_ids: List[str], vectors: np.ndarray) -> None:
+        """إضافة متجهات جاهزة"""
+        vectors = normalize_rows(vectors)
+        with self._lock:
+            positions = self.store.add(article_ids, vectors)
+            if self.index.is_trained:
+                self.index.add(positions, vectors)
+            elif len(self.store) >= self.min_train_size:
+                self._train()
+
+    def search(self, query: np.ndarray, k: int = 50,
+               exclude: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        """أقرب k مقالات للاستعلام"""
+        if not len(self.store):
+            return []
+
+        query = normalize_rows(query.reshape(1, -1))[0]
+        vectors = self.store.vectors
+
+        if self.index.is_trained:
+            candidates = self.index.probe(query)
+        else:
+            candidates = np.arange(len(vectors))
+
+        excluded = {self.store.positions[a] for a in exclude if a in self.store.positions}
+        if excluded:
+            candidates = candidates[~np.isin(candidates, list(excluded))]
+        if not candidates.size:
+            return []
+
+        scores = vectors[candidates].astype(np.float32) @ query
+        k = min(k, candidates.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [(self.store.ids[candidates[i]], float(scores[i])) for i in top]
+
+    def similar_to_articles(self, article_ids: List[str], k: int = 50) -> Dict[str, float]:
+        """المقالات الأقرب دلالياً لمجموعة مقالات (مثل آخر ما قرأه المستخدم)"""
+        positions = [self.store.positions[a] for a in article_ids if a in self.store.positions]
+        if not positions:
+            return {}
+
+        query = self.store.vectors[positions].astype(np.float32).mean(axis=0)
+        return {
+            article_id: max(score, 0.0)
+            for article_id, score in self.search(query, k, exclude=article_ids)
+        }
+
+    def stats(self) -> Dict:
+        return {
+            'articles': len(self.store),
+            'dim': self.store.dim,
+            'path': self.store.path,
+            'ivf_trained': self.index.is_trained,
+            'nlist': len(self.index.lists),
+            'nprobe': self.index.nprobe,
+        }
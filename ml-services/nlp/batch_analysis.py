@@ -0,0 +1,280 @@
+"""
+تحليل النصوص بالجملة عبر مجمّع عمليات
+Batch Text Analysis over a Process Pool
+@version 3.0.0
+
+المدخلات سطور JSONL، كل سطر كائن فيه text (وid اختياري)، والمخرجات سطر
+JSONL لكل سطر مدخل وبنفس الترتيب. السطر الأطول من max_line_bytes أو النص
+الأطول من max_text_length يُعاد خطأً في مكانه (status 413). التشغيل دون الخدمة من مجلد ml-services:
+    python -m nlp.batch_analysis articles.jsonl -o analysis.jsonl
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .serialization import dumps, loads
+from .text_api import TextAnalyzer
+
+logger = logging.getLogger(__name__)
+
+
+class OversizedLine:
+    """سطر تجاوز الحد فأُسقط محتواه دون الاحتفاظ به، ويُعاد مكانه خطأ"""
+
+    __slots__ = ('size',)
+
+    def __init__(self, size: int):
+        self.size = size
+
+
+Line = Union[str, bytes, OversizedLine]
+
+# دفعة من السطور مع رقم أول سطر فيها (للإبلاغ عن الأخطاء)
+Chunk = Tuple[int, List[Line]]
+
+# محلل واحد لكل عملية عاملة، يُنشأ عند أول دفعة
+_worker_analyzer: Optional[TextAnalyzer] = None
+
+
+def _get_worker_analyzer() -> TextAnalyzer:
+    global _worker_analyzer
+    if _worker_analyzer is None:
+        _worker_analyzer = TextAnalyzer()
+    return _worker_analyzer
+
+
+def analyze_record(analyzer: TextAnalyzer, text: str, max_keywords: int = 10) -> Dict[str, Any]:
+    """كل تحليلات TextAnalyzer لنص واحد على مستند ومطابقة واحدة"""
+    document = analyzer.analyze_document(text)
+    result = analyzer.analyze_content(document)
+    result['entities'] = analyzer.extract_entities(document)
+    result['keywords'] = analyzer.extract_keywords(document, max_keywords)
+    result['quality'] = analyzer.analyze_text_quality(document)
+    return result
+
+
+def _line_size(line: Line) -> int:
+    if isinstance(line, OversizedLine):
+        return line.size
+    return len(line.encode('utf-8')) if isinstance(line, str) else len(line)
+
+
+def analyze_chunk(chunk: Chunk, max_keywords: int = 10, max_line_bytes: Optional[int] = None,
+                  max_text_length: Optional[int] = None) -> bytes:
+    """
+    تحليل دفعة سطور JSONL (يعمل في العملية العاملة)
+
+    يعيد سطور JSONL للدفعة مُرمَّزة معاً، سطراً لكل سطر غير فارغ. السطر
+    غير الصالح يُعاد كخطأ في مكانه (status 422، أو 413 لتجاوز الحدود) ولا
+    يوقف بقية الدفعة.
+    """
+    first_line, lines = chunk
+    analyzer = _get_worker_analyzer()
+    output = []
+
+    for line_number, line in enumerate(lines, first_line):
+        if max_line_bytes is not None and _line_size(line) > max_line_bytes:
+            result = {'line': line_number, 'status': 413, 'error': f"line exceeds {max_line_bytes} bytes"}
+            output.append(dumps(result) + b'\n')
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = loads(line)
+            if not isinstance(record, dict) or not isinstance(record.get('text'), str):
+                raise ValueError("expected an object with a 'text' string")
+            if max_text_length is not None and len(record['text']) > max_text_length:
+                result = {
+                    'id': record.get('id', line_number), 'status': 413,
+                    'error': f"text exceeds {max_text_length} characters"
+                }
+            else:
+                result = {
+                    'id': record.get('id', line_number),
+                    'analysis': analyze_record(analyzer, record['text'], max_keywords)
+                }
+        except Exception as e:
+            result = {'line': line_number, 'status': 422, 'error': str(e)}
+        output.append(dumps(result) + b'\n')
+
+    return b''.join(output)
+
+
+def chunk_lines(lines: Iterable[Line], chunk_size: int) -> Iterator[Chunk]:
+    """تقسيم السطور إلى دفعات من chunk_size سطراً (الترقيم يبدأ من 1)"""
+    chunk: List[Line] = []
+    first_line = 1
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield first_line, chunk
+            first_line += len(chunk)
+            chunk = []
+    if chunk:
+        yield first_line, chunk
+
+
+async def achunk_lines(lines: AsyncIterable[Line], chunk_size: int) -> AsyncIterator[Chunk]:
+    """مثل chunk_lines لمصدر غير متزامن"""
+    chunk: List[Line] = []
+    first_line = 1
+    async for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield first_line, chunk
+            first_line += len(chunk)
+            chunk = []
+    if chunk:
+        yield first_line, chunk
+
+
+async def aiter_lines(blocks: AsyncIterable[bytes],
+                      max_line_bytes: Optional[int] = None) -> AsyncIterator[Line]:
+    """
+    تقسيم جسم طلب متدفق (كتل بايتات) إلى سطور
+
+    السطر الذي يتجاوز max_line_bytes لا يُجمَّع: يُسقط ما وصل منه حتى نهايته
+    ويُعاد مكانه OversizedLine، فلا تكبر الذاكرة مع جسم بلا فواصل أسطر.
+    """
+    remainder = b''
+    skipped = 0  # بايتات سطر متجاوز أُسقطت (0 إن لم يكن السطر الحالي متجاوزاً)
+    async for block in blocks:
+        lines = (remainder + block).split(b'\n')
+        remainder = lines.pop()
+        for line in lines:
+            if skipped:
+                yield OversizedLine(skipped + len(line))
+                skipped = 0
+            elif max_line_bytes is not None and len(line) > max_line_bytes:
+                yield OversizedLine(len(line))
+            else:
+                yield line
+        if max_line_bytes is not None and (skipped or len(remainder) > max_line_bytes):
+            skipped += len(remainder)
+            remainder = b''
+    if skipped:
+        yield OversizedLine(skipped)
+    elif remainder:
+        yield remainder
+
+
+class BatchTextAnalyzer:
+    """
+    يوزع دفعات السطور على مجمّع عمليات ويعيد نتائجها بترتيب الإدخال
+
+    لا يبقى قيد التنفيذ أكثر من max_pending دفعة: لا تُقرأ دفعة جديدة من
+    المدخلات حتى تُسلَّم أقدم نتيجة، فيتبع استهلاك المدخلات سرعة مستهلك
+    المخرجات ولا تكبر الذاكرة مع حجم الأرشيف.
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: int = 64,
+                 max_pending: Optional[int] = None, max_keywords: int = 10,
+                 executor: Optional[Executor] = None, max_line_bytes: Optional[int] = 1 << 20,
+                 max_text_length: Optional[int] = 100000):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.chunk_size = max(1, chunk_size)
+        self.max_pending = max(1, max_pending or 2 * self.workers)
+        self.max_keywords = max_keywords
+        self.max_line_bytes = max_line_bytes
+        self.max_text_length = max_text_length
+        self._executor = executor
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _submit(self, chunk: Chunk):
+        return self.executor.submit(
+            analyze_chunk, chunk, self.max_keywords, self.max_line_bytes, self.max_text_length
+        )
+
+    def iter_results(self, lines: Iterable[Line]) -> Iterator[bytes]:
+        """نتائج JSONL مرتبة لكل دفعة من مصدر متزامن (للتشغيل دون الخدمة)"""
+        pending = deque()
+        try:
+            for chunk in chunk_lines(lines, self.chunk_size):
+                if len(pending) >= self.max_pending:
+                    yield pending.popleft().result()
+                pending.append(self._submit(chunk))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def aiter_results(self, lines: AsyncIterable[Line]) -> AsyncIterator[bytes]:
+        """نتائج JSONL مرتبة لكل دفعة من مصدر غير متزامن (جسم طلب متدفق)"""
+        pending = deque()
+        try:
+            async for chunk in achunk_lines(lines, self.chunk_size):
+                if len(pending) >= self.max_pending:
+                    yield await pending.popleft()
+                pending.append(asyncio.wrap_future(self._submit(chunk)))
+            while pending:
+                yield await pending.popleft()
+        finally:
+            # انقطع العميل: لا داعي لإكمال الدفعات التي لم تبدأ
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def create_batch_analyzer() -> BatchTextAnalyzer:
+    """
+    إنشاء المحلل من متغيرات البيئة:
+        BATCH_ANALYSIS_WORKERS: عدد العمليات (افتراضياً عدد أنوية المعالج)
+        BATCH_ANALYSIS_CHUNK_SIZE: عدد السطور في الدفعة الواحدة
+        BATCH_ANALYSIS_MAX_PENDING: الدفعات قيد التنفيذ (افتراضياً ضعف عدد العمليات)
+        BATCH_ANALYSIS_MAX_LINE_BYTES: أقصى طول للسطر بالبايت (افتراضياً 1 ميغابايت)
+        BATCH_ANALYSIS_MAX_TEXT_LENGTH: أقصى طول للنص بالأحرف (افتراضياً 100000)
+    """
+    return BatchTextAnalyzer(
+        workers=int(os.getenv('BATCH_ANALYSIS_WORKERS', '0')) or None,
+        chunk_size=int(os.getenv('BATCH_ANALYSIS_CHUNK_SIZE', '64')),
+        max_pending=int(os.getenv('BATCH_ANALYSIS_MAX_PENDING', '0')) or None,
+        max_line_bytes=int(os.getenv('BATCH_ANALYSIS_MAX_LINE_BYTES', str(1 << 20))),
+        max_text_length=int(os.getenv('BATCH_ANALYSIS_MAX_TEXT_LENGTH', '100000'))
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', nargs='?', default='-', help="ملف JSONL (- للإدخال القياسي)")
+    parser.add_argument('-o', '--output', default='-', help="ملف النتائج (- للإخراج القياسي)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=64)
+    parser.add_argument('--max-keywords', type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    analyzer = BatchTextAnalyzer(
+        workers=args.workers, chunk_size=args.chunk_size, max_keywords=args.max_keywords
+    )
+
+    source = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    target = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    try:
+        for block in analyzer.iter_results(source):
+            target.write(block)
+    finally:
+        analyzer.shutdown()
+        if source is not sys.stdin.buffer:
+            source.close()
+        if target is not sys.stdout.buffer:
+            target.close()
+
+
+if __name__ == '__main__':
+    main()
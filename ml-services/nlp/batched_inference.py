@@ -0,0 +1,177 @@
+"""
+الاستدلال المجمّع لنماذج المحولات
+Micro-batched Transformer Inference
+@version 3.0.0
+"""
+
+import contextlib
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+NEUTRAL_SENTIMENT = 0.5
+
+
+def positive_score(result) -> float:
+    """درجة الإيجابية من مخرجات sentiment-analysis لنص واحد"""
+    if isinstance(result, list):
+        # return_all_scores: قائمة بدرجات كل التصنيفات
+        return next((r['score'] for r in result if r['label'] == 'POSITIVE'), NEUTRAL_SENTIMENT)
+    if isinstance(result, dict):
+        return result['score'] if result['label'] == 'POSITIVE' else 1 - result['score']
+    return NEUTRAL_SENTIMENT
+
+
+def inference_mode():
+    """torch.inference_mode إن توفرت المكتبة"""
+    try:
+        import torch
+    except ImportError:
+        return contextlib.nullcontext()
+    return torch.inference_mode()
+
+
+def _start(future: Future) -> bool:
+    """تعليم الطلب كقيد التنفيذ؛ False إذا أُلغي أو اكتمل مسبقاً"""
+    try:
+        return future.set_running_or_notify_cancel()
+    except RuntimeError:
+        return False
+
+
+class SentimentBatcher:
+    """
+    تجميع طلبات تحليل المشاعر في دفعات
+
+    score_many يمرر النصوص للنموذج في دفعات مرتبة حسب طول الرموز (فيقل
+    الحشو داخل كل دفعة)، وscore يجمع الطلبات المتزامنة من عدة خيوط في
+    دفعة واحدة خلال max_wait_ms على الأكثر.
+    """
+
+    def __init__(self, sentiment_pipeline=None, batch_size: int = 32,
+                 max_wait_ms: float = 10.0, max_chars: int = 512):
+        self.sentiment_pipeline = sentiment_pipeline
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_chars = max_chars
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+        self.batches = 0
+        self.texts = 0
+
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        tokenizer = getattr(self.sentiment_pipeline, 'tokenizer', None)
+        if tokenizer is None:
+            return [len(text) for text in texts]
+        try:
+            encoded = tokenizer(texts, add_special_tokens=True, truncation=True)
+            return [len(ids) for ids in encoded['input_ids']]
+        except Exception:
+            return [len(text) for text in texts]
+
+    def score_many(self, texts: List[str]) -> List[float]:
+        """درجات الإيجابية لقائمة نصوص (0.5 للنصوص الفارغة أو عند الخطأ)"""
+        scores = [NEUTRAL_SENTIMENT] * len(texts)
+        if self.sentiment_pipeline is None:
+            return scores
+
+        pending = [i for i, text in enumerate(texts) if text and text.strip()]
+        if not pending:
+            return scores
+
+        truncated = [texts[i][:self.max_chars] for i in pending]
+        lengths = self._token_lengths(truncated)
+        order = sorted(range(len(pending)), key=lengths.__getitem__)
+
+        with inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                bucket = order[start:start + self.batch_size]
+                batch = [truncated[j] for j in bucket]
+                try:
+                    results = self.sentiment_pipeline(batch, batch_size=len(batch), truncation=True)
+                except Exception as e:
+                    logger.warning(f"خطأ في تحليل المشاعر: {e}")
+                    continue
+
+                for j, result in zip(bucket, results):
+                    scores[pending[j]] = positive_score(result)
+
+                self.batches += 1
+                self.texts += len(batch)
+
+        return scores
+
+    def submit(self, text: str) -> Future:
+        """إضافة نص إلى الدفعة التالية"""
+        future: Future = Future()
+        self._queue.put((text, future))
+        self._ensure_worker()
+        return future
+
+    def score(self, text: str) -> float:
+        """درجة الإيجابية لنص واحد (يُجمّع مع الطلبات المتزامنة)"""
+        if self.sentiment_pipeline is None or not text.strip():
+            return NEUTRAL_SENTIMENT
+        return self.submit(text).result()
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name='sentiment-batcher', daemon=True
+                )
+                self._worker.start()
+
+    def _run(self) -> None:
+        # أي خطأ في دفعة لا يُنهي الخيط، وإلا انتظرت استدعاءات score التالية للأبد
+        while True:
+            try:
+                self._run_batch()
+            except Exception as e:
+                logger.error(f"خطأ في خيط تجميع المشاعر: {e}")
+
+    def _run_batch(self) -> None:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        # الطلبات الملغاة (أو المكتملة) قبل بدء الدفعة لا تُحسب
+        batch = [(text, future) for text, future in batch if _start(future)]
+        if not batch:
+            return
+
+        try:
+            scores = self.score_many([text for text, _ in batch])
+        except Exception as e:
+            logger.warning(f"خطأ في تحليل المشاعر: {e}")
+            scores = [NEUTRAL_SENTIMENT] * len(batch)
+
+        for (_, future), score in zip(batch, scores):
+            if not future.done():
+                future.set_result(score)
+
+    def stats(self) -> Dict:
+        return {
+            'batch_size': self.batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'batches': self.batches,
+            'texts': self.texts,
+        }
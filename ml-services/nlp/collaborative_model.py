@@ -0,0 +1,363 @@
+"""
+نموذج التصفية التعاونية (تشابه المقالات بالتفاعل المشترك)
+Item-Item Co-engagement Collaborative Filtering
+@version 3.0.0
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+from scipy import sparse
+
+from .event_batch import EventBatch, interacted_article_ids
+from .event_store import EventStore
+
+logger = logging.getLogger(__name__)
+
+
+class ItemCooccurrenceModel:
+    """
+    نموذج تشابه المقالات المبني على التفاعل المشترك بين المستخدمين
+
+    عدّادات التفاعل المشترك تُحدَّث تدريجياً مع كل حدث جديد، وتُطرح عند خروج
+    مقال من نافذة المستخدم (أحدث max_items_per_user مقالاً). مصفوفة الجيران
+    (أفضل K جار لكل مقال بتشابه جيب التمام) تُبنى خارج مسار الطلبات:
+    - تُحفظ عدّادات الجيران بصيغة CSR، ويُعاد اختيار جيران الصفوف التي تغيرت
+      عدّاداتها فقط (المقال والمقالات التي تشاركه نافذة المستخدم)، وتُنسخ بقية
+      الصفوف كما هي
+    - التشابه يُحسب من العدّادات بمقامات عدد المستخدمين الحالية لكل المدخلات
+      بعملية مصفوفية واحدة، فلا يُعاد حساب صفوف الجيران عند تغير مقام مقال
+    الطلبات تقرأ آخر مصفوفة منشورة (snapshot_version)؛ مع refresh_interval
+    موجب تُحدَّث في خيط خلفي مرة كل refresh_interval ثانية على الأكثر، ومع
+    الصفر تُحدَّث عند الاستعلام كما كان.
+    """
+
+    def __init__(self, top_k: int = 50, max_items_per_user: int = 200, refresh_interval: float = 0.0):
+        self.top_k = top_k
+        self.max_items_per_user = max_items_per_user
+        self.refresh_interval = refresh_interval
+
+        self.items: List[str] = []
+        self.item_ids: Dict[str, int] = {}
+        self.item_users: List[int] = []
+
+        # المقالات التي تفاعل معها كل مستخدم (الأحدث فقط)
+        self._user_items: Dict[str, OrderedDict] = {}
+        # عدد المستخدمين المشتركين لكل زوج مقالات (في نوافذهم الحالية)
+        self._pair_counts: Dict[int, Dict[int, int]] = defaultdict(dict)
+
+        # الصفوف التي تغيرت عدّاداتها منذ آخر نشر
+        self._dirty_items = set()
+        # عدّادات أفضل K جار لكل صف، ومصفوفة التشابه المنشورة منها
+        self._counts: Optional[sparse.csr_matrix] = None
+        self._matrix: Optional[sparse.csr_matrix] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+        self._refresh_requested = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+        # version يتغير مع كل تحديث للعدّادات، وsnapshot_version مع كل نشر للمصفوفة
+        self.version = 0
+        self.snapshot_version = 0
+
+    def _intern(self, article_id: str) -> int:
+        item = self.item_ids.get(article_id)
+        if item is None:
+            item = len(self.items)
+            self.item_ids[article_id] = item
+            self.items.append(article_id)
+            self.item_users.append(0)
+        return item
+
+    def _add_pair(self, item: int, other: int, delta: int) -> None:
+        count = self._pair_counts[item].get(other, 0) + delta
+        if count > 0:
+            self._pair_counts[item][other] = count
+            self._pair_counts[other][item] = count
+        else:
+            self._pair_counts[item].pop(other, None)
+            self._pair_counts[other].pop(item, None)
+        self._dirty_items.add(other)
+
+    def add_events(self, user_id: str, events: Union[EventBatch, Iterable[Dict]]) -> None:
+        """تحديث عدّادات التفاعل المشترك بأحداث مستخدم واحد (قواميس أو EventBatch)"""
+        with self._lock:
+            user_items = self._user_items.setdefault(user_id, OrderedDict())
+            changed = False
+
+            for article_id in interacted_article_ids(events):
+                if not article_id:
+                    continue
+
+                item = self._intern(article_id)
+                if item in user_items:
+                    user_items.move_to_end(item)
+                    continue
+
+                for other in user_items:
+                    self._add_pair(item, other, 1)
+                self.item_users[item] += 1
+                self._dirty_items.add(item)
+                user_items[item] = None
+                changed = True
+
+                if len(user_items) > self.max_items_per_user:
+                    # المقال الأقدم يخرج من النافذة: تُطرح أزواجه مع بقية المقالات
+                    evicted, _ = user_items.popitem(last=False)
+                    for other in user_items:
+                        self._add_pair(evicted, other, -1)
+                    self.item_users[evicted] -= 1
+                    self._dirty_items.add(evicted)
+
+            if changed:
+                self.version += 1
+
+        if changed and self.refresh_interval > 0:
+            self._request_refresh()
+
+    def load_event_store(self, event_store: EventStore) -> int:
+        """
+        بناء العدّادات من أحداث كل المستخدمين في المخزن (بعد إعادة تشغيل الخدمة)
+
+        Returns:
+            عدد المستخدمين المقروءين
+        """
+        users = 0
+        for user_id in event_store.user_ids():
+            self.add_events(user_id, event_store.get_batch(user_id))
+            users += 1
+        self.refresh()
+        logger.info(f"Loaded co-engagement counts for {users} users ({len(self.items)} items)")
+        return users
+
+    def _neighbors(self, item: int, pairs: Dict[int, int], item_users: np.ndarray) -> tuple:
+        """أفضل K جار للمقال بتشابه جيب التمام (المعرفات وعدّاداتها)"""
+        if not pairs:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+
+        columns = np.fromiter(pairs.keys(), dtype=np.int32, count=len(pairs))
+        counts = np.fromiter(pairs.values(), dtype=np.float32, count=len(pairs))
+
+        if columns.size > self.top_k:
+            # مقام الصف نفسه ثابت فيه، فالترتيب بالعدّاد على جذر مقام الجار
+            similarity = counts / np.sqrt(item_users[columns])
+            keep = np.argpartition(-similarity, self.top_k - 1)[:self.top_k]
+            columns, counts = columns[keep], counts[keep]
+
+        return columns, counts
+
+    def similarity_matrix(self) -> sparse.csr_matrix:
+        """
+        آخر مصفوفة جيران منشورة (مقالات × مقالات)
+
+        تُبنى هنا فقط عند أول استدعاء أو مع refresh_interval صفر؛ وإلا يُطلب
+        تحديثها من الخيط الخلفي وتُعاد المنشورة حالياً.
+        """
+        matrix = self._matrix
+        if matrix is None or (self._dirty_items and self.refresh_interval <= 0):
+            return self.refresh()
+        if self._dirty_items:
+            self._request_refresh()
+        return matrix
+
+    def matrix_version(self) -> int:
+        """إصدار المصفوفة التي سيقرؤها الاستعلام التالي (مفتاح الذاكرة المؤقتة)"""
+        self.similarity_matrix()
+        return self.snapshot_version
+
+    def refresh(self) -> sparse.csr_matrix:
+        """إعادة اختيار جيران الصفوف المتغيرة ونشر مصفوفة تشابه جديدة"""
+        with self._refresh_lock:
+            with self._lock:
+                if self._matrix is not None and not self._dirty_items:
+                    return self._matrix
+                dirty, self._dirty_items = self._dirty_items, set()
+                n = len(self.items)
+                item_users = np.asarray(self.item_users, dtype=np.float64)
+                # نسخ أزواج الصفوف المتغيرة فقط، ويُختار جيرانها خارج القفل
+                pairs = {item: dict(self._pair_counts.get(item, ())) for item in dirty}
+
+            rows = {item: self._neighbors(item, item_pairs, item_users) for item, item_pairs in pairs.items()}
+            counts = self._patch(self._counts, rows, n)
+
+            # التشابه لكل المدخلات من العدّادات ومقامات المقالات الحالية
+            entry_rows = np.repeat(np.arange(n), np.diff(counts.indptr))
+            denominators = np.sqrt(item_users[entry_rows] * item_users[counts.indices])
+            data = np.divide(
+                counts.data, denominators, out=np.zeros(counts.nnz, dtype=np.float64), where=denominators > 0
+            ).astype(np.float32)
+
+            # مصفوفات جديدة، فالمصفوفة السابقة بيد الطلبات الجارية لا تتغير
+            self._counts = counts
+            self._matrix = sparse.csr_matrix((data, counts.indices, counts.indptr), shape=(n, n))
+            self.snapshot_version += 1
+            logger.info(f"Updated {len(rows)} rows of item similarity matrix: {n} items, {self._matrix.nnz} neighbours")
+            return self._matrix
+
+    @staticmethod
+    def _patch(previous: Optional[sparse.csr_matrix], rows: Dict[int, tuple], n: int) -> sparse.csr_matrix:
+        """مصفوفة جديدة بالصفوف المحدّثة، مع نسخ بقية صفوف السابقة كما هي"""
+        if previous is None:
+            previous = sparse.csr_matrix((0, 0), dtype=np.float32)
+        old_n = previous.shape[0]
+        old_lengths = np.diff(previous.indptr)
+
+        dirty = np.zeros(n, dtype=bool)
+        dirty[list(rows)] = True
+        lengths = np.zeros(n, dtype=np.int64)
+        lengths[:old_n] = old_lengths
+        for item, (columns, _) in rows.items():
+            lengths[item] = columns.size
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        indices = np.empty(indptr[-1], dtype=np.int32)
+        data = np.empty(indptr[-1], dtype=np.float32)
+
+        # نسخ صفوف المصفوفة السابقة غير المتأثرة إلى مواقعها الجديدة دفعة واحدة
+        entry_rows = np.repeat(np.arange(old_n), old_lengths)
+        kept = np.flatnonzero(~dirty[entry_rows])
+        kept_rows = entry_rows[kept]
+        target = indptr[kept_rows] + (kept - previous.indptr[kept_rows])
+        indices[target] = previous.indices[kept]
+        data[target] = previous.data[kept]
+
+        for item, (columns, values) in rows.items():
+            indices[indptr[item]:indptr[item + 1]] = columns
+            data[indptr[item]:indptr[item + 1]] = values
+
+        return sparse.csr_matrix((data, indices, indptr), shape=(n, n))
+
+    def _request_refresh(self) -> None:
+        self._refresh_requested.set()
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name='collaborative-refresh', daemon=True
+                )
+                self._worker.start()
+
+    def _run(self) -> None:
+        # التحديثات المطلوبة خلال الانتظار تُجمع في تحديث واحد
+        while True:
+            self._refresh_requested.wait()
+            self._refresh_requested.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing item similarity matrix: {e}")
+            time.sleep(self.refresh_interval)
+
+    def _interaction_counts(self, user_events: Iterable[Dict], n_items: int) -> Dict[int, float]:
+        counts: Dict[int, float] = {}
+        for article_id in interacted_article_ids(user_events):
+            item = self.item_ids.get(article_id)
+            if item is not None and item < n_items:
+                counts[item] = counts.get(item, 0.0) + 1.0
+        return counts
+
+    def user_vector(self, user_events: Iterable[Dict], n_items: int) -> Optional[sparse.csr_matrix]:
+        """متجه تفاعلات المستخدم على أول n_items من مقالات النموذج"""
+        counts = self._interaction_counts(user_events, n_items)
+        if not counts:
+            return None
+
+        columns = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        return sparse.csr_matrix(
+            (values, (np.zeros(len(counts), dtype=np.int32), columns)),
+            shape=(1, n_items)
+        )
+
+    def candidate_items(self, article_ids: List[str]) -> np.ndarray:
+        """مواقع المقالات المرشحة في مصفوفة النموذج (-1 لغير المعروفة)"""
+        return np.fromiter(
+            (self.item_ids.get(article_id, -1) for article_id in article_ids),
+            dtype=np.int64, count=len(article_ids)
+        )
+
+    def score(self, user_events: List[Dict], article_ids: List[str]) -> np.ndarray:
+        """
+        درجة التصفية التعاونية لكل مقال مرشح بين 0 و 1
+
+        مجموع تشابه المقال مع المقالات التي تفاعل معها المستخدم، مطبّعاً على أعلى درجة.
+        """
+        scores = np.zeros(len(article_ids), dtype=np.float64)
+
+        matrix = self.similarity_matrix()
+        user_vector = self.user_vector(user_events, matrix.shape[0])
+        if user_vector is None:
+            return scores
+
+        item_scores = (user_vector @ matrix).toarray().ravel()
+        items = self.candidate_items(article_ids)
+        known = (items >= 0) & (items < matrix.shape[0])
+        scores[known] = item_scores[items[known]]
+
+        max_score = scores.max() if scores.size else 0.0
+        if max_score > 0:
+            scores /= max_score
+        return scores
+
+    def score_batch(self, events_per_user: List[List[Dict]], article_ids: List[str]) -> np.ndarray:
+        """
+        درجات التصفية التعاونية لعدة مستخدمين (صف لكل مستخدم) بضرب مصفوفي واحد
+
+        مطابقة لاستدعاء score لكل مستخدم، مع حصر الضرب في أعمدة المقالات المرشحة.
+        """
+        scores = np.zeros((len(events_per_user), len(article_ids)), dtype=np.float64)
+
+        matrix = self.similarity_matrix()
+        n_items = matrix.shape[0]
+        rows, columns, values = [], [], []
+        for row, user_events in enumerate(events_per_user):
+            for item, count in self._interaction_counts(user_events, n_items).items():
+                rows.append(row)
+                columns.append(item)
+                values.append(count)
+
+        if not values or not article_ids:
+            return scores
+
+        users = sparse.csr_matrix(
+            (np.array(values, dtype=np.float32), (rows, columns)),
+            shape=(len(events_per_user), n_items)
+        )
+        items = self.candidate_items(article_ids)
+        known = (items >= 0) & (items < n_items)
+        scores[:, known] = (users @ matrix[:, items[known]]).toarray()
+
+        max_scores = scores.max(axis=1, keepdims=True)
+        np.divide(scores, max_scores, out=scores, where=max_scores > 0)
+        return scores
+
+    def stats(self) -> Dict:
+        return {
+            'items': len(self.items),
+            'users': len(self._user_items),
+            'pairs': sum(len(pairs) for pairs in self._pair_counts.values()) // 2,
+            'top_k': self.top_k,
+            'version': self.version,
+            'snapshot_version': self.snapshot_version,
+            'pending_rows': len(self._dirty_items),
+        }
+
+
+def create_collaborative_model() -> ItemCooccurrenceModel:
+    """
+    إنشاء النموذج من متغيرات البيئة:
+        COLLABORATIVE_REFRESH_SECONDS: أقل فاصل بين تحديثات مصفوفة الجيران في
+        الخيط الخلفي (0 للتحديث عند الاستعلام)
+    """
+    return ItemCooccurrenceModel(
+        refresh_interval=float(os.getenv('COLLABORATIVE_REFRESH_SECONDS', '30'))
+    )
@@ -0,0 +1,278 @@
+"""
+تكرار المصطلحات في وثائق المدونة لحساب IDF
+Corpus Document Frequency Table
+@version 3.0.0
+
+البناء من أرشيف JSONL (سطر لكل مقال فيه id وtext) من مجلد ml-services:
+    python -m nlp.document_frequency articles.jsonl --path data/document_frequency
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .text_normalization import TEXT_NORMALIZER, ArabicNormalizer
+from .vocabulary import Vocabulary
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentFrequency:
+    """
+    عدد المقالات التي يظهر فيها كل مصطلح، كمصفوفة uint32 مفهرسة بمعرف المصطلح
+
+    للمصطلحات مفردات خاصة (لا VOCABULARY المشتركة حتى لا تكبر متجهات
+    الاهتمامات بكلمات المدونة)، فيكون IDF أي مصطلح بحثاً في قاموس وقراءة
+    خانة. مع تحديد المسار تُحفظ المصطلحات والمصفوفة في ملفات تُلحق بها
+    الإضافات، وتُقرأ المصفوفة عبر memory-map. يكتب عملية واحدة فقط في المسار،
+    وتكتب meta.json (بالاستبدال الذري) بعد المصطلحات والتكرارات؛ العمليات
+    الأخرى (كعمّال المجمّعات) تلاحظ تغيره عند القراءة فتقرأ المصطلحات الجديدة
+    وتعيد ربط المصفوفة. المقالات ذات المعرف تُحسب مرة واحدة؛ إعادة نشر مقال
+    لا تغيّر الجدول.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.vocabulary = Vocabulary()
+        self.document_count = 0
+        self._articles = set()
+        self._counts = np.zeros(0, dtype=np.uint32)
+        self._lock = threading.Lock()
+        # موضع نهاية المصطلحات المقروءة من terms.txt، وبصمة meta.json المقروءة
+        self._terms_offset = 0
+        self._meta_stamp = None
+
+        if path:
+            os.makedirs(path, exist_ok=True)
+            if os.path.exists(self._articles_file):
+                with open(self._articles_file, 'r', encoding='utf-8') as f:
+                    self._articles = {line.rstrip('\n') for line in f}
+            self._read_updates()
+            self._map_counts()
+
+    @property
+    def _terms_file(self) -> str:
+        return os.path.join(self.path, 'terms.txt')
+
+    @property
+    def _counts_file(self) -> str:
+        return os.path.join(self.path, 'document_frequency.u32')
+
+    @property
+    def _articles_file(self) -> str:
+        return os.path.join(self.path, 'articles.txt')
+
+    @property
+    def _meta_file(self) -> str:
+        return os.path.join(self.path, 'meta.json')
+
+    def _stat_meta(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self._meta_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read_updates(self) -> None:
+        """قراءة عدد الوثائق والمصطلحات التي أُلحقت بعد آخر قراءة"""
+        self._meta_stamp = self._stat_meta()
+        if self._meta_stamp is not None:
+            with open(self._meta_file, 'r', encoding='utf-8') as f:
+                self.document_count = json.load(f)['document_count']
+        if os.path.exists(self._terms_file):
+            with open(self._terms_file, 'rb') as f:
+                f.seek(self._terms_offset)
+                appended = f.read()
+            # سطر غير مكتمل (كتابة جارية) يُقرأ في المرة التالية
+            complete = appended[:appended.rfind(b'\n') + 1]
+            for term in complete.decode('utf-8').splitlines():
+                self.vocabulary.intern(term)
+            self._terms_offset += len(complete)
+
+    def refresh(self) -> bool:
+        """
+        إعادة القراءة إن كتبت عملية أخرى في المسار (تغيرت meta.json)
+
+        فحص واحد لـ stat في الحالة المعتادة؛ تُرجع True إذا تغير الجدول.
+        """
+        if not self.path or self._stat_meta() == self._meta_stamp:
+            return False
+        with self._lock:
+            if self._stat_meta() == self._meta_stamp:
+                return False
+            self._read_updates()
+            self._map_counts()
+        return True
+
+    def _map_counts(self) -> None:
+        """ربط ملف التكرارات للقراءة فقط بما كُتب منه (المصطلحات الأخرى صفر)"""
+        stored = os.path.getsize(self._counts_file) // 4 if os.path.exists(self._counts_file) else 0
+        size = min(len(self.vocabulary), stored)
+        if not size:
+            self._counts = np.zeros(0, dtype=np.uint32)
+            return
+        self._counts = np.memmap(self._counts_file, dtype=np.uint32, mode='r', shape=(size,))
+
+    def _remap(self) -> None:
+        """ربط ملف التكرارات بطول المفردات الحالي (المصطلحات الجديدة تبدأ بصفر)"""
+        size = len(self.vocabulary)
+        stored = os.path.getsize(self._counts_file) // 4 if os.path.exists(self._counts_file) else 0
+        if stored < size:
+            with open(self._counts_file, 'ab') as f:
+                f.write(bytes(4 * (size - stored)))
+        if not size:
+            self._counts = np.zeros(0, dtype=np.uint32)
+            return
+        self._counts = np.memmap(self._counts_file, dtype=np.uint32, mode='r+', shape=(size,))
+
+    def __len__(self) -> int:
+        return len(self.vocabulary)
+
+    def frequency(self, term: str) -> int:
+        """عدد المقالات التي ظهر فيها المصطلح"""
+        self.refresh()
+        term_id = self.vocabulary.get(term)
+        counts = self._counts
+        if term_id is None or term_id >= len(counts):
+            return 0
+        return int(counts[term_id])
+
+    def idf(self, term: str) -> float:
+        return float(self.idf_many([term])[0])
+
+    def idf_many(self, terms: Iterable[str]) -> np.ndarray:
+        """
+        IDF ممهّد لكل مصطلح: log((1 + N) / (1 + df)) + 1
+
+        مدونة فارغة تعطي 1 لكل المصطلحات فيصبح الترتيب بالتكرار وحده.
+        """
+        self.refresh()
+        counts = self._counts
+        get = self.vocabulary.get
+        term_ids = np.fromiter((get(term, -1) for term in terms), dtype=np.int64)
+        known = (term_ids >= 0) & (term_ids < len(counts))
+
+        frequencies = np.zeros(len(term_ids), dtype=np.float64)
+        frequencies[known] = counts[term_ids[known]]
+        return np.log((1.0 + self.document_count) / (1.0 + frequencies)) + 1.0
+
+    def add_documents(self, documents: Iterable[Iterable[str]],
+                      article_ids: Optional[Iterable[str]] = None) -> int:
+        """
+        إضافة وثائق (مصطلحات كل وثيقة) إلى الجدول؛ تُرجع عدد الوثائق المضافة
+
+        المقالات المعروفة مسبقاً (بالمعرف) تُتجاوز. التحديث يُكتب مرة واحدة
+        لكل استدعاء، لذا تُمرَّر الوثائق دفعات.
+        """
+        article_ids = itertools.repeat(None) if article_ids is None else article_ids
+
+        with self._lock:
+            previous_size = len(self.vocabulary)
+            term_ids: List[int] = []
+            new_articles: List[str] = []
+            added = 0
+
+            for article_id, terms in zip(article_ids, documents):
+                if article_id is not None:
+                    article_id = str(article_id)
+                    if article_id in self._articles:
+                        continue
+                    self._articles.add(article_id)
+                    new_articles.append(article_id)
+                term_ids.extend(self.vocabulary.intern(term) for term in set(terms))
+                added += 1
+
+            if not added:
+                return 0
+
+            size = len(self.vocabulary)
+            delta = np.bincount(np.asarray(term_ids, dtype=np.int64), minlength=size).astype(np.uint32)
+
+            if self.path:
+                if size > previous_size:
+                    with open(self._terms_file, 'ab') as f:
+                        f.write(''.join(
+                            f'{term}\n' for term in self.vocabulary.terms(range(previous_size, size))
+                        ).encode('utf-8'))
+                        self._terms_offset = f.tell()
+                # ربط للكتابة (قد يكون مربوطاً للقراءة فقط بعد refresh)
+                self._remap()
+                if size:
+                    self._counts += delta
+                    self._counts.flush()
+                if new_articles:
+                    with open(self._articles_file, 'a', encoding='utf-8') as f:
+                        f.writelines(f'{article_id}\n' for article_id in new_articles)
+                self.document_count += added
+                # بعد كتابة التكرارات: القارئ الذي يرى العدد الجديد يجد كل ما يخصه
+                tmp_path = f"{self._meta_file}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'document_count': self.document_count}, f)
+                os.replace(tmp_path, self._meta_file)
+                self._meta_stamp = self._stat_meta()
+            else:
+                counts = np.zeros(size, dtype=np.uint32)
+                counts[:len(self._counts)] = self._counts
+                counts += delta
+                self._counts = counts
+                self.document_count += added
+
+            return added
+
+    def add_texts(self, texts: Iterable[str], article_ids: Optional[Iterable[str]] = None,
+                  normalizer: ArabicNormalizer = TEXT_NORMALIZER) -> int:
+        """إضافة نصوص بعد تطبيعها بنفس تقطيع تحليل النصوص"""
+        return self.add_documents((normalizer.analyze(text).words for text in texts), article_ids)
+
+    def stats(self) -> Dict:
+        self.refresh()
+        return {
+            'documents': self.document_count,
+            'terms': len(self.vocabulary),
+            'persistent': bool(self.path)
+        }
+
+
+def create_document_frequency() -> DocumentFrequency:
+    """
+    إنشاء الجدول من متغيرات البيئة:
+        DOCUMENT_FREQUENCY_PATH: مجلد الحفظ (في الذاكرة فقط إن لم يُحدد)
+    """
+    return DocumentFrequency(path=os.getenv('DOCUMENT_FREQUENCY_PATH') or None)
+
+
+# جدول المدونة المشترك في العملية (يستخدمه TextAnalyzer وNLPService)
+CORPUS_DOCUMENT_FREQUENCY = create_document_frequency()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help="ملف JSONL للمقالات")
+    parser.add_argument('--path', required=True, help="مجلد حفظ الجدول")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    table = DocumentFrequency(args.path)
+
+    with open(args.input, 'r', encoding='utf-8') as f:
+        records = (json.loads(line) for line in f if line.strip())
+        while True:
+            batch = list(itertools.islice(records, args.batch_size))
+            if not batch:
+                break
+            table.add_texts(
+                (record['text'] for record in batch),
+                [record.get('id') for record in batch]
+            )
+            logger.info(f"Indexed {table.document_count} documents, {len(table)} terms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+استخراج الكيانات بتعبير نمطي واحد مُجمّع
+Combined Single-pass Entity Extraction
+@version 3.0.0
+"""
+
+import re
+from typing import Dict, List, Tuple, Union
+
+# حرف عربي (نفس النطاق المستخدم في أنماط الخدمات)
+ARABIC_LETTER = '[أ-ي]'
+
+# بداية كلمة عربية، وبداية رمز لاتيني/رقمي (أرقام، بريد، روابط)
+ARABIC_WORD_START = rf'(?<!{ARABIC_LETTER})(?={ARABIC_LETTER})'
+ASCII_TOKEN_START = r'(?<![0-9A-Za-z._%+-])(?=[0-9A-Za-z._%+-])'
+
+# السوابق المتصلة الاختيارية: و/ف ثم حرف الجر أو أداة التعريف
+# (وشركة، بالمدينة، للشركة، والدكتور)
+PROCLITICS = '(?:[وف]?(?:[بك]?ال|لل|[بلك])?)'
+
+# بداية كلمة مفتاحية بعد سوابقها؛ السوابق لا تدخل في قيمة الكيان
+ARABIC_KEYWORD_START = ARABIC_WORD_START + PROCLITICS
+
+# المرتكزات التي يجمع المستخرج الأنماط تحتها (الأطول أولاً)، فيُختبر كل مرتكز
+# مرة واحدة لكل موضع بدل تكراره في كل نمط
+ANCHORS = (ASCII_TOKEN_START, ARABIC_KEYWORD_START, ARABIC_WORD_START)
+
+
+def arabic_words(max_words: int) -> str:
+    """
+    نمط من كلمة عربية واحدة حتى max_words كلمات
+
+    بديل محدود الطول عن [أ-ي\\s]+ الذي يبتلع بقية الفقرة ويتراجع حرفاً حرفاً
+    على المقالات الطويلة؛ الحروف والمسافات فئتان منفصلتان فلا تراجع متداخل.
+    """
+    return rf'{ARABIC_LETTER}+(?:\s+{ARABIC_LETTER}+){{0,{max_words - 1}}}'
+
+
+class EntityExtractor:
+    """
+    يجمع أنماط كل أنواع الكيانات في تعبير واحد بمجموعات مسماة
+
+    كل نمط يصبح بديلاً (?P<النوع_الترتيب>...) فيُمسح النص مرة واحدة ويحدد
+    lastgroup نوع الكيان. الأنماط التي تبدأ بأحد ANCHORS تُجمع تحت مرتكزها.
+    إن احتوى النمط مجموعة التقاط فقيمتها هي الكيان، وإلا مطابقته بعد المرتكز.
+    المطابقات لا تتداخل: عند نفس الموضع يفوز أول نمط بترتيب الأنواع، لذا
+    تُقدَّم الأنماط الأكثر تحديداً.
+    """
+
+    def __init__(self, patterns: Dict[str, Union[str, List[str]]], flags: int = 0):
+        self.entity_types = list(patterns)
+
+        branches: Dict[str, List[str]] = {}
+        inner_groups: Dict[str, Tuple[str, int]] = {}
+        for entity_type, type_patterns in patterns.items():
+            if isinstance(type_patterns, str):
+                type_patterns = [type_patterns]
+            for position, pattern in enumerate(type_patterns):
+                name = f'{entity_type}_{position}'
+                anchor = next((anchor for anchor in ANCHORS if pattern.startswith(anchor)), '')
+                branches.setdefault(anchor, []).append(f'(?P<{name}>{pattern[len(anchor):]})')
+                inner_groups[name] = (entity_type, re.compile(pattern, flags).groups)
+
+        self.regex = re.compile(
+            '|'.join(f'{anchor}(?:{"|".join(alternatives)})' for anchor, alternatives in branches.items()),
+            flags
+        )
+
+        # اسم البديل -> (نوع الكيان، رقم مجموعة القيمة)
+        self._groups: Dict[str, Tuple[str, int]] = {}
+        for name, (entity_type, groups) in inner_groups.items():
+            index = self.regex.groupindex[name]
+            self._groups[name] = (entity_type, index + 1 if groups else index)
+
+    def extract(self, text: str) -> Dict[str, List[str]]:
+        """الكيانات لكل نوع، بلا تكرار وبترتيب أول ظهور"""
+        found: Dict[str, Dict[str, None]] = {entity_type: {} for entity_type in self.entity_types}
+        groups = self._groups
+
+        for match in self.regex.finditer(text):
+            entity_type, value_group = groups[match.lastgroup]
+            value = match.group(value_group)
+            if value and not value.isspace():
+                found[entity_type][value.strip()] = None
+
+        return {entity_type: list(values) for entity_type, values in found.items()}
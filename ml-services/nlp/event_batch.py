@@ -0,0 +1,298 @@
+"""
+تمثيل عمودي مضغوط لأحداث المستخدم
+Columnar Event Batches and Ingestion Buffers
+@version 3.0.0
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from .vocabulary import Vocabulary
+
+SECONDS_PER_DAY = 86400.0
+
+# الطابع الزمني محوّلاً إلى ثوانٍ منذ epoch (يُضاف للأحداث مرة واحدة عند استقبالها)
+EVENT_EPOCH_KEY = 'timestamp_epoch'
+
+
+def parse_timestamp(timestamp: Optional[str]) -> Optional[float]:
+    """تحويل الطابع الزمني ISO إلى ثوانٍ منذ epoch (None إذا كان مفقوداً أو غير صالح)"""
+    if not timestamp:
+        return None
+
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def _check_type(event_data: Dict, key: str, types: tuple, name: str) -> None:
+    value = event_data.get(key)
+    if value is not None and (not isinstance(value, types) or isinstance(value, bool)):
+        raise ValueError(f"event_data.{key} must be {name}")
+
+
+def validate_event_data(event_data: Any) -> Dict:
+    """
+    التحقق من أنواع حقول event_data التي تُقرأ في الأعمدة (ValueError إن لم تصح)
+
+    تُستدعى عند استقبال الأحداث حتى يُرفض الحدث غير الصالح بـ 422 بدل خطأ
+    داخلي عند تحويله إلى أعمدة.
+    """
+    if not isinstance(event_data, dict):
+        raise ValueError("event_data must be an object")
+    for key in ('duration', 'depth'):
+        _check_type(event_data, key, (int, float), 'a number')
+    for key in ('category', 'topic', 'query'):
+        _check_type(event_data, key, (str,), 'a string')
+    _check_type(event_data, 'articleId', (str, int), 'a string')
+    tags = event_data.get('tags')
+    if tags is not None and not (isinstance(tags, list) and all(isinstance(tag, str) for tag in tags)):
+        raise ValueError("event_data.tags must be a list of strings")
+    return event_data
+
+
+def event_epoch(event: Dict) -> Optional[float]:
+    """وقت الحدث بالثواني: المحسوب عند الاستقبال إن وُجد، وإلا من timestamp"""
+    if EVENT_EPOCH_KEY in event:
+        return event[EVENT_EPOCH_KEY]
+    return parse_timestamp(event.get('timestamp', ''))
+
+
+class EventBatch:
+    """
+    أحداث مستخدم كأعمدة متوازية بدل قائمة قواميس متداخلة
+
+    لكل حدث: نوعه ووقته ومعرف المقال (من event_data ومن الحقل العلوي) والتصنيف
+    والموضوع والمدة وعمق التمرير وطول الاستعلام، والوسوم بصيغة CSR
+    (tag_offsets مطلقة داخل tag_ids)، والحدث الأصلي في events. الأسماء معرفات
+    في مفردات الدفعة (event_types وarticle_names وterms) لا في مفردات العملية،
+    حتى لا تكبر بسلاسل العملاء. القيم المفقودة -1 (أو NaN للوقت). الأعمدة قد
+    تكون نوافذ على ذاكرة EventBuffer.
+    """
+
+    __slots__ = (
+        'type_ids', 'epochs', 'article_ids', 'linked_article_ids', 'category_ids',
+        'topic_ids', 'durations', 'depths', 'query_lengths', 'events', 'tag_offsets', 'tag_ids',
+        'event_types', 'article_names', 'terms'
+    )
+
+    def __init__(self, **columns):
+        for name in self.__slots__:
+            setattr(self, name, columns[name])
+
+    def __len__(self) -> int:
+        return int(self.type_ids.size)
+
+    @classmethod
+    def from_events(cls, events: Iterable[Dict]) -> 'EventBatch':
+        """تحويل أحداث بصيغة القواميس في مرور واحد"""
+        buffer = EventBuffer()
+        buffer.extend(events)
+        return buffer.view()
+
+    def to_events(self) -> List[Dict]:
+        """الأحداث الأصلية بصيغة القواميس (نفس الكائنات المضافة، دون نسخ)"""
+        return self.events.tolist()
+
+    def tag_events(self):
+        """(موقع الحدث، معرف الوسم) لكل وسم بترتيب الأحداث"""
+        counts = np.diff(self.tag_offsets)
+        events = np.repeat(np.arange(len(self), dtype=np.intp), counts)
+        if not events.size:
+            return events, self.tag_ids[:0]
+        return events, self.tag_ids[self.tag_offsets[0]:self.tag_offsets[-1]]
+
+    def type_mask(self, *event_types: str) -> np.ndarray:
+        """الأحداث التي نوعها أحد الأنواع المحددة"""
+        type_ids = [self.event_types.get(event_type, -1) for event_type in event_types]
+        return np.isin(self.type_ids, type_ids)
+
+    def event_type_names(self) -> List[str]:
+        """أنواع الأحداث بترتيب أول ظهور"""
+        unique, first = np.unique(self.type_ids, return_index=True)
+        return self.event_types.terms(unique[np.argsort(first)].tolist())
+
+    def article_id_list(self) -> List[Optional[str]]:
+        """event_data['articleId'] لكل حدث"""
+        return _article_names(self.article_ids, self.article_names)
+
+    def linked_article_ids_list(self) -> List[Optional[str]]:
+        """الحقل العلوي article_id لكل حدث"""
+        return _article_names(self.linked_article_ids, self.article_names)
+
+    def interacted_article_ids(self) -> List[Optional[str]]:
+        """articleId أو الحقل العلوي article_id لكل حدث"""
+        return _article_names(
+            np.where(self.article_ids >= 0, self.article_ids, self.linked_article_ids), self.article_names
+        )
+
+
+def _article_names(article_ids: np.ndarray, names: Vocabulary) -> List[Optional[str]]:
+    return [names.term(article_id) if article_id >= 0 else None for article_id in article_ids.tolist()]
+
+
+def event_article_ids(user_events: Union[EventBatch, Iterable[Dict]]) -> List[Optional[str]]:
+    """معرف المقال في event_data لكل حدث (قواميس أو EventBatch)"""
+    if isinstance(user_events, EventBatch):
+        return user_events.article_id_list()
+    return [event.get('event_data', {}).get('articleId') for event in user_events]
+
+
+def interacted_article_ids(user_events: Union[EventBatch, Iterable[Dict]]) -> List[Optional[str]]:
+    """معرف المقال المرتبط بكل حدث (من event_data أو الحقل العلوي)"""
+    if isinstance(user_events, EventBatch):
+        return user_events.interacted_article_ids()
+    return [
+        event.get('event_data', {}).get('articleId') or event.get('article_id')
+        for event in user_events
+    ]
+
+
+class EventBuffer:
+    """
+    مخزن أعمدة قابل للإلحاق لأحداث مستخدم واحد
+
+    view() يعيد EventBatch على نفس الذاكرة دون نسخ. الكتابة تكون دائماً بعد
+    نهاية آخر نافذة، والتوسيع أو حذف الأقدم ينشئ مصفوفات جديدة، فتبقى النوافذ
+    السابقة لقطات ثابتة صالحة.
+
+    لكل مخزن مفردات خاصة لأنواع الأحداث ومعرفات المقالات والمصطلحات
+    (التصنيفات والمواضيع والوسوم)، تُبنى من جديد عند إعادة التخصيص بالأسماء
+    التي ما زالت في الأحداث الحية فقط، فلا تكبر بالأحداث المحذوفة. النوافذ
+    السابقة تحتفظ بمفرداتها القديمة.
+    """
+
+    COLUMNS = (
+        ('type_ids', np.int32),
+        ('epochs', np.float64),
+        ('article_ids', np.int32),
+        ('linked_article_ids', np.int32),
+        ('category_ids', np.int32),
+        ('topic_ids', np.int32),
+        ('durations', np.float64),
+        ('depths', np.float64),
+        ('query_lengths', np.int32),
+        ('events', object),
+    )
+
+    # الأعمدة التي تشير إلى كل مفردات خاصة (tag_ids مصفوفة الوسوم)
+    NAME_COLUMNS = (
+        ('event_types', ('type_ids',)),
+        ('article_names', ('article_ids', 'linked_article_ids')),
+        ('terms', ('category_ids', 'topic_ids', 'tag_ids')),
+    )
+
+    def __init__(self, capacity: int = 64):
+        self._columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.COLUMNS}
+        self._tag_ids = np.empty(capacity, dtype=np.int32)
+        self._tag_offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self.event_types = Vocabulary()
+        self.article_names = Vocabulary()
+        self.terms = Vocabulary()
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def extend(self, events: Iterable[Dict]) -> None:
+        for event in events:
+            self.append(event)
+
+    def append(self, event: Dict) -> None:
+        event_data = event.get('event_data') or {}
+        tags = event_data.get('tags') or []
+
+        if self._end == self._columns['type_ids'].size:
+            self._reallocate(max(2 * len(self), 64))
+        tag_start = int(self._tag_offsets[self._end])
+        if tag_start + len(tags) > self._tag_ids.size:
+            tag_ids = np.empty(max(2 * self._tag_ids.size, tag_start + len(tags)), dtype=np.int32)
+            tag_ids[:tag_start] = self._tag_ids[:tag_start]
+            self._tag_ids = tag_ids
+
+        i = self._end
+        columns = self._columns
+        epoch = event_epoch(event)
+        category = event_data.get('category')
+        topic = event_data.get('topic')
+        article_id = event_data.get('articleId')
+        linked_article_id = event.get('article_id')
+
+        columns['type_ids'][i] = self.event_types.intern(event.get('event_type') or '')
+        columns['epochs'][i] = np.nan if epoch is None else epoch
+        columns['article_ids'][i] = self.article_names.intern(article_id) if article_id is not None else -1
+        columns['linked_article_ids'][i] = self.article_names.intern(linked_article_id) if linked_article_id else -1
+        columns['category_ids'][i] = self.terms.intern(category) if category else -1
+        columns['topic_ids'][i] = self.terms.intern(topic) if topic else -1
+        columns['durations'][i] = event_data.get('duration') or 0
+        columns['depths'][i] = event_data.get('depth') or 0
+        columns['query_lengths'][i] = len(event_data.get('query') or '')
+        columns['events'][i] = event
+
+        for offset, tag in enumerate(tags):
+            self._tag_ids[tag_start + offset] = self.terms.intern(tag)
+        self._tag_offsets[i + 1] = tag_start + len(tags)
+        self._end += 1
+
+    def drop_oldest(self, count: int) -> None:
+        """حذف أقدم count حدثاً"""
+        self._start = min(self._start + max(count, 0), self._end)
+
+    def _reallocate(self, capacity: int) -> None:
+        # نسخ الأحداث الحية فقط إلى مصفوفات جديدة (النوافذ القديمة لا تتأثر)
+        start, end = self._start, self._end
+        for name, dtype in self.COLUMNS:
+            column = np.empty(capacity, dtype=dtype)
+            column[:end - start] = self._columns[name][start:end]
+            self._columns[name] = column
+
+        tag_start, tag_end = int(self._tag_offsets[start]), int(self._tag_offsets[end])
+        tag_ids = np.empty(max(self._tag_ids.size, tag_end - tag_start), dtype=np.int32)
+        tag_ids[:tag_end - tag_start] = self._tag_ids[tag_start:tag_end]
+        tag_offsets = np.zeros(capacity + 1, dtype=np.int64)
+        tag_offsets[:end - start + 1] = self._tag_offsets[start:end + 1] - tag_start
+
+        self._tag_ids, self._tag_offsets = tag_ids, tag_offsets
+        self._start, self._end = 0, end - start
+        self._compact_names()
+
+    def _compact_names(self) -> None:
+        # مفردات جديدة بأسماء الأحداث الحية فقط، وإعادة ترقيم أعمدتها في المكان
+        # (المصفوفات أُنشئت للتو في _reallocate فلا تشترك فيها نافذة سابقة)
+        end = self._end
+        for attribute, names in self.NAME_COLUMNS:
+            vocabulary = getattr(self, attribute)
+            columns = [
+                self._tag_ids[:self._tag_offsets[end]] if name == 'tag_ids' else self._columns[name][:end]
+                for name in names
+            ]
+            used = np.unique(np.concatenate(columns))
+            used = used[used >= 0]
+            if used.size == len(vocabulary):
+                continue
+
+            compacted = Vocabulary()
+            for term in vocabulary.terms(used.tolist()):
+                compacted.intern(term)
+            # خانة أخيرة -1 حتى تبقى القيم المفقودة (-1) كما هي
+            remap = np.full(len(vocabulary) + 1, -1, dtype=np.int32)
+            remap[used] = np.arange(used.size, dtype=np.int32)
+            for column in columns:
+                column[:] = remap[column]
+            setattr(self, attribute, compacted)
+
+    def view(self) -> EventBatch:
+        """الأحداث الحالية كـ EventBatch دون نسخ"""
+        start, end = self._start, self._end
+        return EventBatch(
+            **{name: self._columns[name][start:end] for name, _ in self.COLUMNS},
+            tag_offsets=self._tag_offsets[start:end + 1],
+            tag_ids=self._tag_ids,
+            event_types=self.event_types,
+            article_names=self.article_names,
+            terms=self.terms
+        )
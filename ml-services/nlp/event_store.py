@@ -0,0 +1,294 @@
+"""
+مخزن أحداث المستخدمين
+Per-user Append-only Event Store
+@version 3.0.0
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional
+
+from .event_batch import EventBatch, EventBuffer
+
+logger = logging.getLogger(__name__)
+
+
+class EventStore(ABC):
+    """الواجهة الأساسية لمخزن الأحداث (إضافة فقط لكل مستخدم)"""
+
+    @abstractmethod
+    def append(self, user_id: str, events: List[Dict]) -> int:
+        """إضافة أحداث جديدة للمستخدم وإرجاع العدد الإجمالي لأحداثه"""
+
+    @abstractmethod
+    def iter_events(self, user_id: str) -> Iterator[Dict]:
+        """المرور على أحداث المستخدم بترتيب الإضافة"""
+
+    @abstractmethod
+    def count(self, user_id: str) -> int:
+        """عدد الأحداث المخزنة للمستخدم"""
+
+    @abstractmethod
+    def clear(self, user_id: str) -> None:
+        """حذف جميع أحداث المستخدم"""
+
+    @abstractmethod
+    def user_ids(self) -> Iterator[str]:
+        """معرفات المستخدمين الذين لهم أحداث في المخزن"""
+
+    @abstractmethod
+    def version(self, user_id: str) -> int:
+        """
+        إصدار أحداث المستخدم: يزيد بعدد الأحداث المضافة في كل append ويتغير
+        عند clear، فتعرف الحالات المشتقة (كحالة الاهتمامات) أنها قديمة
+        """
+
+    def get_events(self, user_id: str) -> List[Dict]:
+        """إرجاع أحداث المستخدم كقائمة"""
+        return list(self.iter_events(user_id))
+
+    def get_batch(self, user_id: str) -> EventBatch:
+        """أحداث المستخدم بالتمثيل العمودي (EventBatch)"""
+        return EventBatch.from_events(self.iter_events(user_id))
+
+    def stats(self) -> Dict:
+        """إحصائيات المخزن"""
+        return {'backend': self.__class__.__name__}
+
+
+class InMemoryEventStore(EventStore):
+    """
+    مخزن أحداث داخل الذاكرة (الافتراضي)
+
+    تُحفظ الأحداث في EventBuffer فقط: أعمدة يعيد get_batch نافذة عليها دون
+    نسخ، ومعها الأحداث الأصلية كما أُضيفت يعيدها iter_events.
+    """
+
+    def __init__(self, max_events_per_user: int = 10000):
+        # حد أقصى لعدد الأحداث المحفوظة لكل مستخدم (تُحذف الأقدم أولاً)
+        self.max_events_per_user = max_events_per_user
+        self._buffers: Dict[str, EventBuffer] = defaultdict(EventBuffer)
+        self._versions: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def append(self, user_id: str, events: List[Dict]) -> int:
+        with self._lock:
+            self._versions[user_id] += len(events)
+            buffer = self._buffers[user_id]
+            buffer.extend(events)
+
+            overflow = len(buffer) - self.max_events_per_user
+            if overflow > 0:
+                buffer.drop_oldest(overflow)
+
+            return len(buffer)
+
+    def get_batch(self, user_id: str) -> EventBatch:
+        with self._lock:
+            buffer = self._buffers.get(user_id)
+            return buffer.view() if buffer is not None else EventBatch.from_events(())
+
+    def iter_events(self, user_id: str) -> Iterator[Dict]:
+        return iter(self.get_batch(user_id).to_events())
+
+    def count(self, user_id: str) -> int:
+        buffer = self._buffers.get(user_id)
+        return len(buffer) if buffer is not None else 0
+
+    def user_ids(self) -> Iterator[str]:
+        with self._lock:
+            snapshot = list(self._buffers)
+        return iter(snapshot)
+
+    def clear(self, user_id: str) -> None:
+        with self._lock:
+            self._buffers.pop(user_id, None)
+            self._versions[user_id] += 1
+
+    def version(self, user_id: str) -> int:
+        return self._versions.get(user_id, 0)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            users = len(self._buffers)
+            events = sum(len(buffer) for buffer in self._buffers.values())
+        return {
+            'backend': 'memory',
+            'users': users,
+            'events': events,
+            'max_events_per_user': self.max_events_per_user,
+        }
+
+
+class RedisEventStore(EventStore):
+    """مخزن أحداث مبني على Redis (قائمة لكل مستخدم)"""
+
+    def __init__(self, url: str, max_events_per_user: int = 10000, key_prefix: str = 'ml:events:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.max_events_per_user = max_events_per_user
+        self.key_prefix = key_prefix
+
+    def _key(self, user_id: str) -> str:
+        return f"{self.key_prefix}{user_id}"
+
+    @property
+    def _users_key(self) -> str:
+        return f"{self.key_prefix.rstrip(':')}_users"
+
+    def _version_key(self, user_id: str) -> str:
+        # خارج نطاق مفاتيح القوائم حتى لا يتطابق مع مستخدم ينتهي معرفه بـ :version
+        return f"{self.key_prefix.rstrip(':')}_version:{user_id}"
+
+    def append(self, user_id: str, events: List[Dict]) -> int:
+        if not events:
+            return self.count(user_id)
+
+        key = self._key(user_id)
+        pipe = self.client.pipeline()
+        pipe.rpush(key, *[json.dumps(event, ensure_ascii=False) for event in events])
+        pipe.ltrim(key, -self.max_events_per_user, -1)
+        pipe.incrby(self._version_key(user_id), len(events))
+        pipe.sadd(self._users_key, user_id)
+        pipe.llen(key)
+        return int(pipe.execute()[-1])
+
+    def iter_events(self, user_id: str) -> Iterator[Dict]:
+        for raw in self.client.lrange(self._key(user_id), 0, -1):
+            yield json.loads(raw)
+
+    def count(self, user_id: str) -> int:
+        return int(self.client.llen(self._key(user_id)))
+
+    def user_ids(self) -> Iterator[str]:
+        for user_id in self.client.sscan_iter(self._users_key):
+            yield user_id.decode('utf-8') if isinstance(user_id, bytes) else user_id
+
+    def clear(self, user_id: str) -> None:
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(user_id))
+        pipe.srem(self._users_key, user_id)
+        pipe.incr(self._version_key(user_id))
+        pipe.execute()
+
+    def version(self, user_id: str) -> int:
+        return int(self.client.get(self._version_key(user_id)) or 0)
+
+    def stats(self) -> Dict:
+        return {'backend': 'redis', 'max_events_per_user': self.max_events_per_user}
+
+
+class SQLiteEventStore(EventStore):
+    """مخزن أحداث مبني على SQLite"""
+
+    def __init__(self, path: str, max_events_per_user: int = 10000):
+        self.path = path
+        self.max_events_per_user = max_events_per_user
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS user_events ('
+            ' seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' user_id TEXT NOT NULL,'
+            ' payload TEXT NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_user_events_user ON user_events (user_id, seq)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS user_event_versions ('
+            ' user_id TEXT PRIMARY KEY,'
+            ' version INTEGER NOT NULL)'
+        )
+        self._conn.commit()
+
+    def _bump_version(self, user_id: str, amount: int) -> None:
+        self._conn.execute(
+            'INSERT INTO user_event_versions (user_id, version) VALUES (?, ?)'
+            ' ON CONFLICT (user_id) DO UPDATE SET version = version + excluded.version',
+            (user_id, amount)
+        )
+
+    def append(self, user_id: str, events: List[Dict]) -> int:
+        with self._lock:
+            self._conn.executemany(
+                'INSERT INTO user_events (user_id, payload) VALUES (?, ?)',
+                [(user_id, json.dumps(event, ensure_ascii=False)) for event in events]
+            )
+            # الإبقاء على أحدث الأحداث فقط
+            self._conn.execute(
+                'DELETE FROM user_events WHERE user_id = ? AND seq NOT IN ('
+                ' SELECT seq FROM user_events WHERE user_id = ? ORDER BY seq DESC LIMIT ?)',
+                (user_id, user_id, self.max_events_per_user)
+            )
+            self._bump_version(user_id, len(events))
+            self._conn.commit()
+        return self.count(user_id)
+
+    def iter_events(self, user_id: str) -> Iterator[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT payload FROM user_events WHERE user_id = ? ORDER BY seq',
+                (user_id,)
+            ).fetchall()
+        for (payload,) in rows:
+            yield json.loads(payload)
+
+    def count(self, user_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT COUNT(*) FROM user_events WHERE user_id = ?', (user_id,)
+            ).fetchone()
+        return int(row[0])
+
+    def user_ids(self) -> Iterator[str]:
+        with self._lock:
+            rows = self._conn.execute('SELECT DISTINCT user_id FROM user_events').fetchall()
+        for (user_id,) in rows:
+            yield user_id
+
+    def clear(self, user_id: str) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM user_events WHERE user_id = ?', (user_id,))
+            self._bump_version(user_id, 1)
+            self._conn.commit()
+
+    def version(self, user_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT version FROM user_event_versions WHERE user_id = ?', (user_id,)
+            ).fetchone()
+        return int(row[0]) if row else 0
+
+    def stats(self) -> Dict:
+        return {'backend': 'sqlite', 'path': self.path, 'max_events_per_user': self.max_events_per_user}
+
+
+def create_event_store(url: Optional[str] = None, max_events_per_user: Optional[int] = None) -> EventStore:
+    """
+    إنشاء مخزن الأحداث حسب الرابط
+
+    Args:
+        url: memory:// أو redis://host:port أو sqlite:///path/to/events.db
+             (الافتراضي من متغير البيئة EVENT_STORE_URL)
+        max_events_per_user: الحد الأقصى للأحداث لكل مستخدم
+    """
+    url = url or os.getenv('EVENT_STORE_URL', 'memory://')
+    if max_events_per_user is None:
+        max_events_per_user = int(os.getenv('EVENT_STORE_MAX_EVENTS', '10000'))
+
+    if url.startswith(('redis://', 'rediss://')):
+        logger.info("Using Redis event store")
+        return RedisEventStore(url, max_events_per_user=max_events_per_user)
+
+    if url.startswith('sqlite:///'):
+        logger.info("Using SQLite event store")
+        return SQLiteEventStore(url[len('sqlite:///'):], max_events_per_user=max_events_per_user)
+
+    return InMemoryEventStore(max_events_per_user=max_events_per_user)
@@ -0,0 +1,272 @@
+"""
+منفّذ الأعمال الحسابية خارج حلقة الأحداث
+Bounded Executor Layer for CPU-bound Handlers
+@version 3.0.0
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+_EXHAUSTED = object()
+
+
+class ExecutorSaturated(Exception):
+    """رفض العمل لأن حد التزامن وطابور الانتظار لنقطة النهاية ممتلئان"""
+
+    def __init__(self, endpoint: str, limit: int):
+        super().__init__(f"Endpoint '{endpoint}' is saturated ({limit} requests in flight)")
+        self.endpoint = endpoint
+        self.limit = limit
+
+
+class EndpointLimit:
+    """
+    حد التزامن لنقطة نهاية واحدة
+
+    كل نقطة نهاية لها مجمّع خيوط بعدد max_concurrency، ويُقبل فوقه حتى
+    max_queue عمل منتظر؛ ما زاد عن ذلك يُرفض فوراً بدل أن يتراكم.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def capacity(self) -> int:
+        return self.max_concurrency + self.max_queue
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_concurrency,
+                thread_name_prefix=f"ml-{self.name}"
+            )
+        return self._pool
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, _future=None) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def stats(self) -> Dict:
+        return {
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'rejected': self.rejected,
+        }
+
+
+class Reservation:
+    """
+    مكان محجوز في حد نقطة نهاية لعمل طويل (مثل رد متدفق)
+
+    release آمن للاستدعاء أكثر من مرة ومن أكثر من مسار (إغلاق الرد أو انتهاء
+    المولّد)، ولا يُحرَّر المكان فعلياً قبل انتهاء آخر عمل أُرسل للمجمّع.
+    """
+
+    __slots__ = ('limit', '_pending', '_released', '_lock')
+
+    def __init__(self, limit: EndpointLimit):
+        self.limit = limit
+        self._pending: Optional[Future] = None
+        self._released = False
+        self._lock = threading.Lock()
+
+    def track(self, future: Future) -> None:
+        """تسجيل العمل الجاري في المجمّع حتى يُؤجَّل التحرير إلى انتهائه"""
+        self._pending = future
+
+    def release(self, _future=None) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+            pending = self._pending
+
+        if pending is not None:
+            # يُستدعى فوراً إن كان العمل قد انتهى
+            pending.add_done_callback(self.limit.release)
+        else:
+            self.limit.release()
+
+
+class WorkloadExecutor:
+    """
+    توزيع الأعمال الحسابية على مجمّعات الخيوط/العمليات
+
+    أعمال NumPy تحرر GIL فتكفيها الخيوط؛ أما نقاط النهاية المذكورة في
+    process_endpoints فتُرسل إلى مجمّع عمليات مشترك (يجب أن تكون دوالها
+    ووسائطها قابلة للـ pickle). الحدود تبقى لكل نقطة نهاية في الحالتين.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, tuple]] = None,
+        default_concurrency: int = 4,
+        default_queue: int = 16,
+        process_workers: int = 0,
+        process_endpoints: Iterable[str] = ()
+    ):
+        self.default_concurrency = default_concurrency
+        self.default_queue = default_queue
+        self.process_workers = process_workers
+        self.process_endpoints = set(process_endpoints)
+        self._limits: Dict[str, EndpointLimit] = {
+            name: EndpointLimit(name, concurrency, queue_size)
+            for name, (concurrency, queue_size) in (limits or {}).items()
+        }
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def limit_for(self, endpoint: str) -> EndpointLimit:
+        limit = self._limits.get(endpoint)
+        if limit is None:
+            with self._lock:
+                limit = self._limits.setdefault(
+                    endpoint, EndpointLimit(endpoint, self.default_concurrency, self.default_queue)
+                )
+        return limit
+
+    def _executor_for(self, endpoint: str, limit: EndpointLimit) -> Executor:
+        if self.process_workers > 0 and endpoint in self.process_endpoints:
+            if self._process_pool is None:
+                with self._lock:
+                    if self._process_pool is None:
+                        self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+            return self._process_pool
+        return limit.pool
+
+    def _acquire(self, endpoint: str) -> EndpointLimit:
+        limit = self.limit_for(endpoint)
+        if not limit.acquire():
+            raise ExecutorSaturated(endpoint, limit.capacity)
+        return limit
+
+    def reserve(self, endpoint: str) -> Reservation:
+        """
+        حجز مكان لعمل طويل (مثل رد متدفق) قبل بدء الرد
+
+        على المستدعي ضمان release حتى لو لم يبدأ استهلاك الرد (مثلاً من
+        إغلاق الرد)، لا الاعتماد على انتهاء المولّد وحده.
+
+        Raises:
+            ExecutorSaturated: إذا امتلأ حد التزامن وطابور الانتظار
+        """
+        return Reservation(self._acquire(endpoint))
+
+    async def run(self, endpoint: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        تنفيذ func خارج حلقة الأحداث ضمن حدود نقطة النهاية
+
+        Raises:
+            ExecutorSaturated: إذا امتلأ حد التزامن وطابور الانتظار
+        """
+        limit = self._acquire(endpoint)
+        try:
+            future = self._executor_for(endpoint, limit).submit(functools.partial(func, *args, **kwargs))
+        except BaseException:
+            limit.release()
+            raise
+
+        # يُحرَّر المكان عند انتهاء العمل فعلياً، حتى لو أُلغي الطلب قبلها
+        future.add_done_callback(limit.release)
+        return await asyncio.wrap_future(future)
+
+    async def iterate(self, reservation: Reservation, iterable: Iterable) -> AsyncIterator:
+        """
+        استهلاك مولّد متزامن عنصراً عنصراً في مجمّع خيوط نقطة النهاية
+
+        يُحرَّر المكان المحجوز بـ reserve عند انتهاء المولّد أو إغلاقه، وإن
+        أُلغي أثناء تنفيذ next في المجمّع فعند انتهائه (كما في run).
+        """
+        iterator = iter(iterable)
+        pool = reservation.limit.pool
+        try:
+            while True:
+                future = pool.submit(next, iterator, _EXHAUSTED)
+                reservation.track(future)
+                item = await asyncio.wrap_future(future)
+                if item is _EXHAUSTED:
+                    return
+                yield item
+        finally:
+            reservation.release()
+
+    def shutdown(self) -> None:
+        for limit in self._limits.values():
+            limit.shutdown()
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
+
+    def stats(self) -> Dict:
+        return {
+            'process_workers': self.process_workers,
+            'process_endpoints': sorted(self.process_endpoints),
+            'endpoints': {name: limit.stats() for name, limit in self._limits.items()},
+        }
+
+
+def parse_limits(spec: str) -> Dict[str, tuple]:
+    """
+    قراءة الحدود بصيغة "recommendations=4:16,text-analysis=8:32"
+    (التزامن:طول الطابور لكل نقطة نهاية)
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        try:
+            name, values = item.split('=', 1)
+            concurrency, _, queue_size = values.partition(':')
+            limits[name.strip()] = (int(concurrency), int(queue_size or 0))
+        except ValueError:
+            logger.warning(f"Ignoring invalid executor limit: {item}")
+    return limits
+
+
+def create_workload_executor() -> WorkloadExecutor:
+    """
+    إنشاء المنفّذ من متغيرات البيئة:
+        EXECUTOR_CONCURRENCY / EXECUTOR_QUEUE: الحد الافتراضي لكل نقطة نهاية
+        EXECUTOR_LIMITS: حدود خاصة مثل "recommendations=4:16"
+        EXECUTOR_PROCESS_WORKERS: حجم مجمّع العمليات (0 يعطّله)
+        EXECUTOR_PROCESS_ENDPOINTS: نقاط النهاية التي تُرسل إلى مجمّع العمليات
+    """
+    return WorkloadExecutor(
+        limits=parse_limits(os.getenv('EXECUTOR_LIMITS', '')),
+        default_concurrency=int(os.getenv('EXECUTOR_CONCURRENCY', '4')),
+        default_queue=int(os.getenv('EXECUTOR_QUEUE', '16')),
+        process_workers=int(os.getenv('EXECUTOR_PROCESS_WORKERS', '0')),
+        process_endpoints=[
+            name.strip() for name in os.getenv('EXECUTOR_PROCESS_ENDPOINTS', 'text-analysis,text-analysis-v2').split(',')
+            if name.strip()
+        ]
+    )
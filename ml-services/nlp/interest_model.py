@@ -5,10 +5,28 @@ User Interest Scoring Model
 """
 
 import numpy as np
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterable, List, Tuple, Optional, Union
 from datetime import datetime, timedelta
 import json
 import math
+import time
+
+from .event_batch import (
+    EVENT_EPOCH_KEY, SECONDS_PER_DAY, EventBatch, event_epoch, parse_timestamp
+)
+from .vocabulary import Vocabulary
+
+# الحد الأدنى لعامل التراجع الزمني: الأحداث القديمة تحتفظ بعُشر وزنها
+MIN_TIME_DECAY = 0.1
+
+def decay_horizon_days(decay_rate: float) -> float:
+    """
+    عمر الحدث (بالأيام الكسرية) الذي يبلغ عنده decay_rate ** الأيام حده الأدنى
+    MIN_TIME_DECAY؛ تقريب مستمر لحد جدول الأيام الكاملة في time_decay
+    """
+    if not 0 < decay_rate < 1:
+        return math.inf
+    return math.log(MIN_TIME_DECAY) / math.log(decay_rate)
 
 class UserInterestModel:
     """نموذج حساب درجة اهتمام المستخدم"""
@@ -35,57 +53,47 @@ class UserInterestModel:
         
         # حد أقصى لدرجة الاهتمام
         self.max_interest_score = 100.0
+        
+        # جدول التراجع لعدد الأيام الصحيح (يُبنى عند أول استخدام لكل decay_rate)
+        self.decay_table_days = 366
+        self._decay_table: Optional[Tuple[float, np.ndarray]] = None
     
-    def compute_interest_score(self, user_events: List[Dict]) -> Dict[str, float]:
+    def compute_interest_score(
+        self,
+        user_events: Union[EventBatch, Iterable[Dict]],
+        now: Optional[float] = None
+    ) -> Dict[str, float]:
         """
         حساب درجة الاهتمام للمستخدم بناءً على الأحداث
         
         Args:
-            user_events: قائمة الأحداث السلوكية للمستخدم
+            user_events: قائمة الأحداث السلوكية للمستخدم (أو EventBatch)
+            now: الوقت المرجعي للتراجع بالثواني (الافتراضي وقت الطلب)
             
         Returns:
             قاموس يحتوي على درجة الاهتمام لكل موضوع/تصنيف
         """
-        category_scores = {}
-        topic_scores = {}
+        interests = InterestAccumulator(self, now)
         
         # تجميع الأحداث حسب التصنيف والموضوع
-        for event in user_events:
-            event_type = event.get('event_type', '')
-            event_data = event.get('event_data', {})
-            timestamp = event.get('timestamp', '')
-            
-            # حساب وزن الحدث
-            weight = self._calculate_event_weight(event_type, event_data)
-            
-            # حساب عامل التراجع الزمني
-            time_decay = self._calculate_time_decay(timestamp)
-            
-            # الدرجة النهائية للحدث
-            final_score = weight * time_decay
-            
-            # تحديث درجة التصنيف
-            category = event_data.get('category')
-            if category:
-                category_scores[category] = category_scores.get(category, 0) + final_score
-            
-            # تحديث درجة الموضوع
-            topic = event_data.get('topic')
-            if topic:
-                topic_scores[topic] = topic_scores.get(topic, 0) + final_score
-            
-            # معالجة الكلمات المفتاحية
-            tags = event_data.get('tags', [])
-            for tag in tags:
-                topic_scores[tag] = topic_scores.get(tag, 0) + final_score * 0.5
+        if isinstance(user_events, EventBatch):
+            interests.add_batch(user_events)
+        else:
+            for event in user_events:
+                interests.add(event)
         
+        return interests.scores()
+    
+    def _merge_interest_scores(
+        self,
+        category_scores: Dict[str, float],
+        topic_scores: Dict[str, float]
+    ) -> Dict[str, float]:
         # دمج النتائج
         all_scores = {**category_scores, **topic_scores}
         
         # تطبيق التطبيع والحدود
-        normalized_scores = self._normalize_scores(all_scores)
-        
-        return normalized_scores
+        return self._normalize_scores(all_scores)
     
     def _calculate_event_weight(self, event_type: str, event_data: Dict) -> float:
         """حساب وزن الحدث بناءً على نوعه والبيانات المرافقة"""
@@ -113,26 +121,58 @@ class UserInterestModel:
         
         return max(base_weight, 0.1)
     
-    def _calculate_time_decay(self, timestamp: str) -> float:
-        """حساب عامل التراجع الزمني للحدث"""
+    def batch_event_weights(self, batch: EventBatch) -> np.ndarray:
+        """أوزان أحداث EventBatch (مطابقة لـ _calculate_event_weight لكل حدث)"""
+        base_weights = np.array([
+            self.event_weights.get(event_type, 0.1)
+            for event_type in batch.event_types.terms(range(len(batch.event_types)))
+        ])
+        weights = base_weights[batch.type_ids] if len(base_weights) else np.zeros(len(batch))
         
-        if not timestamp:
-            return 1.0
+        reading = batch.type_mask('reading_time')
+        weights[reading] *= np.minimum(batch.durations[reading] / 60 / 2, 3.0)
         
-        try:
-            event_time = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            current_time = datetime.now(event_time.tzinfo)
-            
-            # عدد الأيام منذ الحدث
-            days_ago = (current_time - event_time).days
-            
-            # تطبيق التراجع الأسي
-            decay_factor = math.pow(self.decay_rate, days_ago)
-            
-            return max(decay_factor, 0.1)
+        scroll = batch.type_mask('scroll_depth')
+        weights[scroll] *= batch.depths[scroll] / 100
         
-        except Exception:
-            return 1.0
+        search = batch.type_mask('search_query')
+        weights[search] *= np.minimum(batch.query_lengths[search] / 10, 2.0)
+        
+        return np.maximum(weights, 0.1)
+    
+    def _calculate_time_decay(self, timestamp: str) -> float:
+        """حساب عامل التراجع الزمني للحدث"""
+        epoch = parse_timestamp(timestamp)
+        epochs = np.array([np.nan if epoch is None else epoch])
+        return float(self.time_decay(epochs, time.time())[0])
+    
+    def time_decay(self, epochs: np.ndarray, now: float) -> np.ndarray:
+        """
+        عوامل التراجع الزمني لمصفوفة أوقات الأحداث
+        
+        decay_rate ** (عدد الأيام الكاملة منذ الحدث) بحد أدنى 0.1، والأوقات
+        المفقودة (NaN) عاملها 1.0. الأيام الصحيحة ضمن الجدول تُقرأ منه مباشرة.
+        """
+        if self._decay_table is None or self._decay_table[0] != self.decay_rate:
+            table = np.array([
+                max(math.pow(self.decay_rate, days), MIN_TIME_DECAY)
+                for days in range(self.decay_table_days)
+            ])
+            self._decay_table = (self.decay_rate, table)
+        table = self._decay_table[1]
+        
+        days_ago = np.floor((now - epochs) / SECONDS_PER_DAY)
+        decay = np.ones(epochs.shape)
+        
+        known = ~np.isnan(days_ago)
+        in_table = known & (days_ago >= 0) & (days_ago < table.size)
+        decay[in_table] = table[days_ago[in_table].astype(np.intp)]
+        
+        # أحداث مستقبلية أو أقدم من الجدول
+        outside = known & ~in_table
+        decay[outside] = np.maximum(np.power(self.decay_rate, days_ago[outside]), MIN_TIME_DECAY)
+        
+        return decay
     
     def _normalize_scores(self, scores: Dict[str, float]) -> Dict[str, float]:
         """تطبيع درجات الاهتمام وتطبيق الحدود"""
@@ -162,13 +202,49 @@ class UserInterestModel:
         
         return normalized
     
-    def get_user_profile(self, user_events: List[Dict]) -> Dict:
-        """إنشاء ملف شخصي شامل للمستخدم"""
+    def aggregate_events(
+        self,
+        user_events: Union[EventBatch, Iterable[Dict]],
+        compute_interests: bool = True,
+        now: Optional[float] = None
+    ) -> 'EventAggregator':
+        """
+        تجميع كل إحصاءات الأحداث في مرور واحد
         
-        interest_scores = self.compute_interest_score(user_events)
+        تقبل أي مكرِّر (مثل iter_events لمخزن الأحداث) فلا تُحمَّل القائمة كاملة،
+        أو EventBatch فتُجمع أعمدته بعمليات مصفوفية.
+        """
+        aggregator = EventAggregator(self, compute_interests, now)
+        if isinstance(user_events, EventBatch):
+            aggregator.add_batch(user_events)
+        else:
+            for event in user_events:
+                aggregator.add(event)
+        return aggregator
+    
+    def get_user_profile(
+        self,
+        user_events: Union[EventBatch, Iterable[Dict]],
+        interest_scores: Optional[Dict[str, float]] = None,
+        include_statistics: bool = False,
+        now: Optional[float] = None
+    ) -> Dict:
+        """
+        إنشاء ملف شخصي شامل للمستخدم
+        
+        درجات الاهتمام (إن لم تُمرر) وأنماط السلوك ومستوى التفاعل تُحسب في مرور
+        واحد على الأحداث، وتُستخدم interest_scores الناتجة مباشرة في التوصيات.
+        include_statistics يضيف إحصاءات الأحداث (العدد، المقالات، الأنواع).
+        """
+        
+        aggregator = self.aggregate_events(
+            user_events, compute_interests=interest_scores is None, now=now
+        )
+        if interest_scores is None:
+            interest_scores = aggregator.interest_scores()
         
         # تحليل أنماط السلوك
-        behavior_patterns = self._analyze_behavior_patterns(user_events)
+        behavior_patterns = aggregator.behavior_patterns()
         
         # تحديد التفضيلات الرئيسية
         top_interests = sorted(
@@ -178,19 +254,237 @@ class UserInterestModel:
         )[:10]
         
         # حساب مستوى التفاعل
-        engagement_level = self._calculate_engagement_level(user_events)
+        engagement_level = aggregator.engagement_level()
         
-        return {
+        profile = {
             'interest_scores': interest_scores,
             'top_interests': top_interests,
             'behavior_patterns': behavior_patterns,
             'engagement_level': engagement_level,
             'last_updated': datetime.now().isoformat(),
         }
+        
+        if include_statistics:
+            profile['statistics'] = aggregator.statistics()
+        
+        return profile
     
-    def _analyze_behavior_patterns(self, user_events: List[Dict]) -> Dict:
+    def _analyze_behavior_patterns(self, user_events: Iterable[Dict]) -> Dict:
         """تحليل أنماط السلوك للمستخدم"""
+        return self.aggregate_events(user_events, compute_interests=False).behavior_patterns()
+    
+    def _calculate_engagement_level(self, user_events: Iterable[Dict]) -> str:
+        """حساب مستوى التفاعل للمستخدم"""
+        return self.aggregate_events(user_events, compute_interests=False).engagement_level()
+
+class InterestAccumulator:
+    """
+    تجميع درجات الاهتمام حدثاً حدثاً مع حساب التراجع الزمني على دفعات
+    
+    تُجمع أوزان الأحداث وأوقاتها في دفعات من batch_size حدثاً، ويُحسب تراجعها
+    بعملية مصفوفية واحدة ثم تُضاف إلى الدرجات بنفس ترتيب الأحداث.
+    """
+    
+    batch_size = 1024
+    
+    def __init__(self, model: UserInterestModel, now: Optional[float] = None):
+        self.model = model
+        self.now = time.time() if now is None else now
+        self.category_scores = {}
+        self.topic_scores = {}
+        self._weights = []
+        self._epochs = []
+        self._event_data = []
+    
+    def add(self, event: Dict) -> None:
+        event_data = event.get('event_data', {})
+        
+        # حساب وزن الحدث
+        self._weights.append(self.model._calculate_event_weight(event.get('event_type', ''), event_data))
+        epoch = event_epoch(event)
+        self._epochs.append(np.nan if epoch is None else epoch)
+        self._event_data.append(event_data)
+        
+        if len(self._event_data) >= self.batch_size:
+            self.flush()
+    
+    def add_batch(self, batch: EventBatch) -> None:
+        """
+        إضافة EventBatch كاملاً بعمليات مصفوفية
+        
+        المجاميع تُجمع بترتيب الأحداث (الموضوع ثم وسومه لكل حدث) فتطابق add لكل حدث.
+        """
+        self.flush()
+        if not len(batch):
+            return
+        
+        final_scores = self.model.batch_event_weights(batch) * self.model.time_decay(batch.epochs, self.now)
+        
+        has_category = batch.category_ids >= 0
+        _accumulate_terms(
+            self.category_scores, batch.category_ids[has_category], final_scores[has_category], batch.terms
+        )
+        
+        # الموضوع (الخانة 0) ثم الوسوم بنصف الوزن لكل حدث
+        topic_events = np.flatnonzero(batch.topic_ids >= 0)
+        tag_events, tag_ids = batch.tag_events()
+        tag_slots = np.arange(tag_events.size) - batch.tag_offsets[tag_events] + batch.tag_offsets[0] + 1
         
+        events = np.concatenate([topic_events, tag_events])
+        order = np.lexsort((np.concatenate([np.zeros(topic_events.size), tag_slots]), events))
+        term_ids = np.concatenate([batch.topic_ids[topic_events], tag_ids])[order]
+        values = np.concatenate([final_scores[topic_events], final_scores[tag_events] * 0.5])[order]
+        _accumulate_terms(self.topic_scores, term_ids, values, batch.terms)
+    
+    def flush(self) -> None:
+        if not self._event_data:
+            return
+        
+        # حساب عامل التراجع الزمني للدفعة
+        decays = self.model.time_decay(np.array(self._epochs, dtype=np.float64), self.now).tolist()
+        category_scores = self.category_scores
+        topic_scores = self.topic_scores
+        
+        for weight, time_decay, event_data in zip(self._weights, decays, self._event_data):
+            # الدرجة النهائية للحدث
+            final_score = weight * time_decay
+            
+            # تحديث درجة التصنيف
+            category = event_data.get('category')
+            if category:
+                category_scores[category] = category_scores.get(category, 0) + final_score
+            
+            # تحديث درجة الموضوع
+            topic = event_data.get('topic')
+            if topic:
+                topic_scores[topic] = topic_scores.get(topic, 0) + final_score
+            
+            # معالجة الكلمات المفتاحية
+            for tag in event_data.get('tags', []):
+                topic_scores[tag] = topic_scores.get(tag, 0) + final_score * 0.5
+        
+        self._weights, self._epochs, self._event_data = [], [], []
+    
+    def scores(self) -> Dict[str, float]:
+        self.flush()
+        return self.model._merge_interest_scores(self.category_scores, self.topic_scores)
+
+def _accumulate_terms(scores: Dict[str, float], term_ids: np.ndarray, values: np.ndarray,
+                      vocabulary: Vocabulary) -> None:
+    """إضافة مجاميع القيم لكل مصطلح إلى القاموس بترتيب أول ظهور"""
+    if not term_ids.size:
+        return
+    
+    # np.bincount يجمع بترتيب العناصر كما يفعل الجمع حدثاً حدثاً
+    totals = np.bincount(term_ids, weights=values)
+    unique, first = np.unique(term_ids, return_index=True)
+    for term_id in unique[np.argsort(first, kind='stable')].tolist():
+        key = vocabulary.term(term_id)
+        scores[key] = scores.get(key, 0) + float(totals[term_id])
+
+class EventAggregator:
+    """
+    مجمّع إحصاءات أحداث المستخدم في مرور واحد
+    
+    يحدّث حدثاً حدثاً درجات الاهتمام (اختيارياً) وأنماط السلوك ومستوى التفاعل
+    والمقالات وأنواع الأحداث، بذاكرة لا تعتمد على عدد الأحداث.
+    """
+    
+    # الأحداث المحسوبة في معدل التفاعل (أنماط السلوك)
+    PATTERN_INTERACTIONS = ('article_like', 'article_share', 'article_comment')
+    
+    # الأحداث المحسوبة في مستوى التفاعل
+    ENGAGEMENT_INTERACTIONS = (
+        'article_like', 'article_share', 'article_comment',
+        'article_bookmark', 'search_query'
+    )
+    
+    def __init__(self, model: UserInterestModel, compute_interests: bool = True,
+                 now: Optional[float] = None):
+        self.model = model
+        self.interests = InterestAccumulator(model, now) if compute_interests else None
+        
+        self.total_events = 0
+        self.reading_time_total = 0
+        self.reading_time_count = 0
+        self.scroll_depth_total = 0
+        self.scroll_depth_count = 0
+        self.interactions = 0
+        self.interactive_events = 0
+        self.category_counts = {}
+        self.article_ids = set()
+        self.event_types = {}
+    
+    def add(self, event: Dict) -> None:
+        event_type = event.get('event_type', '')
+        event_data = event.get('event_data', {})
+        self.total_events += 1
+        
+        if self.interests is not None:
+            self.interests.add(event)
+        
+        if event_type == 'reading_time':
+            self.reading_time_total += event_data.get('duration', 0)
+            self.reading_time_count += 1
+        
+        elif event_type == 'scroll_depth':
+            self.scroll_depth_total += event_data.get('depth', 0)
+            self.scroll_depth_count += 1
+        
+        elif event_type in self.PATTERN_INTERACTIONS:
+            self.interactions += 1
+        
+        if event_type in self.ENGAGEMENT_INTERACTIONS:
+            self.interactive_events += 1
+        
+        # تجميع التصنيفات
+        category = event_data.get('category')
+        if category:
+            self.category_counts[category] = self.category_counts.get(category, 0) + 1
+        
+        article_id = event.get('article_id')
+        if article_id:
+            self.article_ids.add(article_id)
+        
+        self.event_types[event.get('event_type')] = None
+    
+    def add_batch(self, batch: EventBatch) -> None:
+        """تجميع EventBatch كاملاً بعمليات مصفوفية"""
+        self.total_events += len(batch)
+        
+        if self.interests is not None:
+            self.interests.add_batch(batch)
+        
+        reading = batch.type_mask('reading_time')
+        self.reading_time_total += sum(batch.durations[reading].tolist())
+        self.reading_time_count += int(reading.sum())
+        
+        scroll = batch.type_mask('scroll_depth')
+        self.scroll_depth_total += sum(batch.depths[scroll].tolist())
+        self.scroll_depth_count += int(scroll.sum())
+        
+        self.interactions += int(batch.type_mask(*self.PATTERN_INTERACTIONS).sum())
+        self.interactive_events += int(batch.type_mask(*self.ENGAGEMENT_INTERACTIONS).sum())
+        
+        category_ids = batch.category_ids[batch.category_ids >= 0]
+        counts = {}
+        _accumulate_terms(counts, category_ids, np.ones(category_ids.size), batch.terms)
+        for category, count in counts.items():
+            self.category_counts[category] = self.category_counts.get(category, 0) + int(count)
+        
+        self.article_ids.update(
+            article_id for article_id in batch.linked_article_ids_list() if article_id
+        )
+        
+        for event_type in batch.event_type_names():
+            self.event_types[event_type] = None
+    
+    def interest_scores(self) -> Dict[str, float]:
+        if self.interests is None:
+            return {}
+        return self.interests.scores()
+    
+    def behavior_patterns(self) -> Dict:
         patterns = {
             'reading_time_avg': 0,
             'scroll_depth_avg': 0,
@@ -199,66 +493,29 @@ class UserInterestModel:
             'activity_times': [],
         }
         
-        reading_times = []
-        scroll_depths = []
-        interactions = 0
-        category_counts = {}
-        
-        for event in user_events:
-            event_type = event.get('event_type', '')
-            event_data = event.get('event_data', {})
-            
-            if event_type == 'reading_time':
-                reading_times.append(event_data.get('duration', 0))
-            
-            elif event_type == 'scroll_depth':
-                scroll_depths.append(event_data.get('depth', 0))
-            
-            elif event_type in ['article_like', 'article_share', 'article_comment']:
-                interactions += 1
-            
-            # تجميع التصنيفات
-            category = event_data.get('category')
-            if category:
-                category_counts[category] = category_counts.get(category, 0) + 1
-        
         # حساب المتوسطات
-        if reading_times:
-            patterns['reading_time_avg'] = sum(reading_times) / len(reading_times)
+        if self.reading_time_count:
+            patterns['reading_time_avg'] = self.reading_time_total / self.reading_time_count
         
-        if scroll_depths:
-            patterns['scroll_depth_avg'] = sum(scroll_depths) / len(scroll_depths)
+        if self.scroll_depth_count:
+            patterns['scroll_depth_avg'] = self.scroll_depth_total / self.scroll_depth_count
         
-        patterns['interaction_frequency'] = interactions / max(len(user_events), 1)
+        patterns['interaction_frequency'] = self.interactions / max(self.total_events, 1)
         
         # التصنيفات المفضلة
         patterns['preferred_categories'] = sorted(
-            category_counts.items(),
+            self.category_counts.items(),
             key=lambda x: x[1],
             reverse=True
         )[:5]
         
         return patterns
     
-    def _calculate_engagement_level(self, user_events: List[Dict]) -> str:
-        """حساب مستوى التفاعل للمستخدم"""
-        
-        if not user_events:
+    def engagement_level(self) -> str:
+        if not self.total_events:
             return 'low'
         
-        # حساب عدد الأحداث التفاعلية
-        interactive_events = [
-            'article_like', 'article_share', 'article_comment',
-            'article_bookmark', 'search_query'
-        ]
-        
-        interaction_count = sum(
-            1 for event in user_events 
-            if event.get('event_type') in interactive_events
-        )
-        
-        total_events = len(user_events)
-        interaction_ratio = interaction_count / total_events
+        interaction_ratio = self.interactive_events / self.total_events
         
         if interaction_ratio >= 0.3:
             return 'high'
@@ -266,6 +523,13 @@ class UserInterestModel:
             return 'medium'
         else:
             return 'low'
+    
+    def statistics(self) -> Dict:
+        return {
+            'total_events': self.total_events,
+            'unique_articles': len(self.article_ids),
+            'event_types': list(self.event_types),
+        }
 
 # مثال على الاستخدام
 if __name__ == "__main__":
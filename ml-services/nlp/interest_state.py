@@ -0,0 +1,353 @@
+"""
+حالة اهتمامات المستخدم التراكمية
+Incremental, Decay-aware User Interest State
+@version 3.0.0
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from .event_store import EventStore
+from .interest_model import (
+    MIN_TIME_DECAY, SECONDS_PER_DAY, UserInterestModel, decay_horizon_days, event_epoch
+)
+from .vocabulary import Vocabulary
+
+logger = logging.getLogger(__name__)
+
+
+class UserInterestState:
+    """
+    مجمّعات اهتمام متراجعة أسياً لمستخدم واحد
+
+    تقارب compute_interest_score: مساهمة الحدث amount * decay_rate ** (أيامه)
+    بحد أدنى MIN_TIME_DECAY، لكن بالأيام الكسرية بدل جدول الأيام الكاملة، فتفرق
+    الدرجة الخام بأقل من عامل decay_rate. لكل مفتاح (تصنيف/موضوع/وسم) جزءان:
+    - الحديث: درجة ووقت آخر تحديث، فتكون قيمته في اللحظة t مساوية لـ
+      score * decay_rate ** ((t - last_update) / يوم)
+    - المستقر (لا يتراجع): مجموع amount * MIN_TIME_DECAY للأحداث التي تجاوزت
+      أفق التراجع، وamount كاملاً للأحداث بلا وقت (عاملها 1.0 كالحساب الكامل)
+    تُلحق مساهمات الجزء الحديث بقائمة pending، وتُرتب بالوقت عند الحاجة فقط
+    حتى تتجاوز الأفق فتُطرح منه وتُنقل إلى المستقر (settle). المفاتيح معرفات
+    في مفردات الحالة، والمجمّعات مصفوفات متوازية مرتبة حسب المعرف.
+    """
+
+    __slots__ = (
+        'decay_rate', 'log_decay', 'horizon', 'vocabulary', 'ids', 'scores', 'updated',
+        'settled', 'young', 'pending', 'pending_sorted', 'event_count', 'version'
+    )
+
+    def __init__(self, decay_rate: float = 0.95, vocabulary: Optional[Vocabulary] = None):
+        self.decay_rate = decay_rate
+        self.log_decay = math.log(decay_rate)
+        self.horizon = decay_horizon_days(decay_rate) * SECONDS_PER_DAY
+        # مفردات خاصة بالحالة: مفاتيح العملاء لا تُضاف إلى مفردات العملية
+        self.vocabulary = vocabulary or Vocabulary()
+        self.ids = array('i')
+        self.scores = array('d')
+        self.updated = array('d')
+        self.settled = array('d')
+        # عدد المساهمات في الجزء الحديث لكل مفتاح
+        self.young = array('i')
+        # (وقت الحدث، معرف المفتاح، المقدار) لمساهمات الجزء الحديث
+        self.pending: List[Tuple[float, int, float]] = []
+        self.pending_sorted = True
+        self.event_count = 0
+        # إصدار أحداث المستخدم في مخزن الأحداث الذي بُنيت منه الحالة
+        self.version: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _decay(self, seconds: float) -> float:
+        return math.exp(self.log_decay * seconds / SECONDS_PER_DAY)
+
+    def _position(self, term_id: int) -> int:
+        """موضع المفتاح في المصفوفات (يُضاف بقيم صفرية إن لم يوجد)"""
+        position = bisect_left(self.ids, term_id)
+        if position == len(self.ids) or self.ids[position] != term_id:
+            self.ids.insert(position, term_id)
+            self.scores.insert(position, 0.0)
+            self.updated.insert(position, 0.0)
+            self.settled.insert(position, 0.0)
+            self.young.insert(position, 0)
+        return position
+
+    def add(self, key: str, amount: float, event_time: Optional[float], now: float) -> None:
+        """إضافة مساهمة حدث لمفتاح واحد (event_time=None لحدث بلا وقت صالح)"""
+        term_id = self.vocabulary.intern(key)
+        position = self._position(term_id)
+
+        if event_time is None:
+            self.settled[position] += amount
+            return
+        if event_time <= now - self.horizon:
+            self.settled[position] += amount * MIN_TIME_DECAY
+            return
+
+        score, last_update = self.scores[position], self.updated[position]
+        if not self.young[position]:
+            self.scores[position] = amount
+            self.updated[position] = event_time
+        elif event_time >= last_update:
+            # تقديم الدرجة إلى وقت الحدث ثم الإضافة
+            self.scores[position] = score * self._decay(event_time - last_update) + amount
+            self.updated[position] = event_time
+        else:
+            # حدث متأخر الوصول: نُرجعه إلى وقت آخر تحديث
+            self.scores[position] = score + amount * self._decay(last_update - event_time)
+        self.young[position] += 1
+        if self.pending and event_time < self.pending[-1][0]:
+            self.pending_sorted = False
+        self.pending.append((event_time, term_id, amount))
+
+    def _sort_pending(self) -> None:
+        # الأحداث تصل غالباً بترتيبها، فيكون الترتيب مروراً خطياً
+        if not self.pending_sorted:
+            self.pending.sort()
+            self.pending_sorted = True
+
+    def settle(self, now: float) -> None:
+        """نقل المساهمات التي تجاوزت أفق التراجع من الجزء الحديث إلى المستقر"""
+        self._sort_pending()
+        cutoff = now - self.horizon
+        settled = 0
+        for event_time, term_id, amount in self.pending:
+            if event_time > cutoff:
+                break
+            settled += 1
+            position = bisect_left(self.ids, term_id)
+            self.young[position] -= 1
+            if self.young[position]:
+                self.scores[position] -= amount * self._decay(self.updated[position] - event_time)
+            else:
+                self.scores[position] = 0.0
+            self.settled[position] += amount * MIN_TIME_DECAY
+        del self.pending[:settled]
+
+    def scores_at(self, now: Optional[float] = None) -> Dict[str, float]:
+        """الدرجات الخام بعد تطبيق التراجع حتى اللحظة المحددة"""
+        now = time.time() if now is None else now
+        scores = [
+            (score * self._decay(now - last_update) if young else 0.0) + settled
+            for score, last_update, settled, young in zip(
+                self.scores, self.updated, self.settled, self.young
+            )
+        ]
+
+        # مساهمات تجاوزت الأفق منذ آخر settle: تُحسب بحدها الأدنى دون تعديل الحالة
+        self._sort_pending()
+        cutoff = now - self.horizon
+        for event_time, term_id, amount in self.pending:
+            if event_time > cutoff:
+                break
+            position = bisect_left(self.ids, term_id)
+            scores[position] += amount * (MIN_TIME_DECAY - self._decay(now - event_time))
+
+        return dict(zip(self.vocabulary.terms(self.ids), scores))
+
+    def to_dict(self) -> Dict:
+        # المعرفات خاصة بالعملية، فتُحفظ المفاتيح كنصوص
+        keys = self.vocabulary.terms(self.ids)
+        return {
+            'decay_rate': self.decay_rate,
+            'event_count': self.event_count,
+            'version': self.version,
+            'accumulators': {
+                key: [score, last_update, settled, young]
+                for key, score, last_update, settled, young in zip(
+                    keys, self.scores, self.updated, self.settled, self.young
+                )
+            },
+            'pending': [
+                [event_time, key, amount]
+                for (event_time, _, amount), key in zip(
+                    self.pending, self.vocabulary.terms(term_id for _, term_id, _ in self.pending)
+                )
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, vocabulary: Optional[Vocabulary] = None) -> 'UserInterestState':
+        state = cls(decay_rate=data.get('decay_rate', 0.95), vocabulary=vocabulary)
+        state.event_count = data.get('event_count', 0)
+        state.version = data.get('version')
+        entries = sorted(
+            (state.vocabulary.intern(key), values)
+            for key, values in data.get('accumulators', {}).items()
+        )
+        for term_id, values in entries:
+            # الحالات المحفوظة قبل إضافة الجزء المستقر: [score, last_update]
+            score, last_update, settled, young = (list(values) + [0.0, 1])[:4]
+            state.ids.append(term_id)
+            state.scores.append(float(score))
+            state.updated.append(float(last_update))
+            state.settled.append(float(settled))
+            state.young.append(int(young))
+        state.pending = sorted(
+            (float(event_time), state.vocabulary.intern(key), float(amount))
+            for event_time, key, amount in data.get('pending', [])
+        )
+        return state
+
+
+class InterestStateStore:
+    """
+    مخزن حالات الاهتمام لكل المستخدمين مع حفظ اختياري على القرص
+
+    مع تحديد event_store تُقارن حالة المستخدم بإصدار أحداثه في المخزن: إذا
+    أضافت عملية أخرى أحداثاً (أو فُقدت الحالة بإعادة التشغيل) تُعاد بناء
+    الحالة من المخزن عند أول قراءة بدل التقييم من حالة ناقصة.
+    """
+
+    def __init__(self, interest_model: Optional[UserInterestModel] = None, path: Optional[str] = None,
+                 event_store: Optional[EventStore] = None):
+        self.interest_model = interest_model or UserInterestModel()
+        self.path = path if path is not None else os.getenv('INTEREST_STATE_PATH')
+        self.event_store = event_store
+        self._states: Dict[str, UserInterestState] = {}
+        self._lock = threading.Lock()
+
+        if self.path and os.path.exists(self.path):
+            self.load()
+
+    def apply_events(self, user_id: str, events: List[Dict], now: Optional[float] = None,
+                     version: Optional[int] = None) -> Optional[UserInterestState]:
+        """
+        تحديث حالة المستخدم بأحداث جديدة (O(1) لكل حدث)
+
+        Args:
+            version: إصدار أحداث المستخدم في المخزن بعد إضافة هذه الأحداث؛ إذا
+                     لم تكن الحالة مبنية على الإصدار السابق لها مباشرة تُحذف
+                     وتُعاد بناؤها من المخزن عند القراءة التالية
+
+        Returns:
+            الحالة المحدّثة، أو None إذا أُجّل بناؤها
+        """
+        now = time.time() if now is None else now
+
+        with self._lock:
+            state = self._states.get(user_id)
+            if version is not None:
+                base = state.version if state is not None else 0
+                if base != version - len(events):
+                    self._states.pop(user_id, None)
+                    return None
+            if state is None:
+                state = UserInterestState(self.interest_model.decay_rate)
+                self._states[user_id] = state
+
+            state.settle(now)
+            for event in events:
+                self._apply_event(state, event, now)
+            state.version = version
+
+        return state
+
+    def rebuild(self, user_id: str, now: Optional[float] = None) -> Optional[UserInterestState]:
+        """إعادة بناء حالة المستخدم من كل أحداثه في مخزن الأحداث"""
+        if self.event_store is None:
+            return None
+        now = time.time() if now is None else now
+
+        # الإصدار يُقرأ قبل الأحداث: إضافة متزامنة تُظهر الحالة قديمة فتُبنى مجدداً
+        version = self.event_store.version(user_id)
+        state = UserInterestState(self.interest_model.decay_rate)
+        for event in self.event_store.iter_events(user_id):
+            self._apply_event(state, event, now)
+        state.version = version
+
+        with self._lock:
+            if not state.event_count:
+                self._states.pop(user_id, None)
+                return None
+            self._states[user_id] = state
+        return state
+
+    def _apply_event(self, state: UserInterestState, event: Dict, now: float) -> None:
+        event_type = event.get('event_type', '')
+        event_data = event.get('event_data', {})
+
+        weight = self.interest_model._calculate_event_weight(event_type, event_data)
+        # الأحداث بلا طابع زمني صالح لا تتراجع، كما في compute_interest_score
+        event_time = event_epoch(event)
+
+        category = event_data.get('category')
+        if category:
+            state.add(category, weight, event_time, now)
+
+        topic = event_data.get('topic')
+        if topic:
+            state.add(topic, weight, event_time, now)
+
+        for tag in event_data.get('tags', []):
+            state.add(tag, weight * 0.5, event_time, now)
+
+        state.event_count += 1
+
+    def has_user(self, user_id: str) -> bool:
+        return user_id in self._states
+
+    def get_interest_scores(self, user_id: str, now: Optional[float] = None) -> Optional[Dict[str, float]]:
+        """
+        درجات الاهتمام المطبّعة للمستخدم (نفس مخرجات compute_interest_score)
+
+        Returns:
+            None إذا لم تكن للمستخدم حالة محفوظة ولا أحداث في المخزن
+        """
+        state = self._states.get(user_id)
+        if self.event_store is not None and (
+            state is None or state.version != self.event_store.version(user_id)
+        ):
+            state = self.rebuild(user_id, now)
+        if state is None:
+            return None
+
+        return self.interest_model._normalize_scores(state.scores_at(now))
+
+    def clear(self, user_id: str) -> None:
+        with self._lock:
+            self._states.pop(user_id, None)
+
+    def save(self, path: Optional[str] = None) -> None:
+        """حفظ جميع الحالات في ملف JSON"""
+        path = path or self.path
+        if not path:
+            return
+
+        with self._lock:
+            data = {user_id: state.to_dict() for user_id, state in self._states.items()}
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None) -> None:
+        """تحميل الحالات من ملف JSON"""
+        path = path or self.path
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            with self._lock:
+                self._states = {
+                    user_id: UserInterestState.from_dict(state)
+                    for user_id, state in data.items()
+                }
+            logger.info(f"Loaded interest state for {len(self._states)} users")
+        except Exception as e:
+            logger.warning(f"Could not load interest state from {path}: {str(e)}")
+
+    def stats(self) -> Dict:
+        return {
+            'users': len(self._states),
+            'keys': sum(len(state) for state in self._states.values()),
+            'path': self.path,
+        }
@@ -0,0 +1,83 @@
+"""
+مطابقة قوائم الكلمات (المشاعر، التصنيفات) في مرور واحد
+Compiled Multi-lexicon Matching
+@version 3.0.0
+"""
+
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+
+class LexiconMatches:
+    """نتيجة المطابقة: عدد المطابقات والكلمات المطابقة لكل تسمية"""
+
+    __slots__ = ('counts', 'words', 'total_tokens')
+
+    def __init__(self, total_tokens: int = 0):
+        self.counts: Dict[Hashable, int] = {}
+        # التسمية -> {الكلمة: عدد مرات ظهورها} بترتيب أول ظهور
+        self.words: Dict[Hashable, Dict[str, int]] = {}
+        self.total_tokens = total_tokens
+
+    def count(self, label: Hashable) -> int:
+        return self.counts.get(label, 0)
+
+    def matched_words(self, label: Hashable) -> List[str]:
+        return list(self.words.get(label, ()))
+
+
+class LexiconMatcher:
+    """
+    جدول مُجمّع مرة واحدة من عدة قوائم كلمات (تسمية -> كلمات)
+
+    كل كلمة تُربط بكل التسميات التي تنتمي إليها (مثل «مقبول» في الإيجابي
+    والمحايد)، فتُطابق كل القوائم معاً في مرور واحد على الرموز بدل مرور
+    لكل قائمة أو تقاطع مجموعات لكل تصنيف.
+    """
+
+    def __init__(self, lexicons: Dict[Hashable, Iterable[str]]):
+        self.lexicons: Dict[Hashable, Tuple[str, ...]] = {}
+        self._labels: Dict[str, Tuple[Hashable, ...]] = {}
+
+        for label, words in lexicons.items():
+            unique_words = tuple(dict.fromkeys(words))
+            self.lexicons[label] = unique_words
+            for word in unique_words:
+                self._labels[word] = self._labels.get(word, ()) + (label,)
+
+    def lexicon_size(self, label: Hashable) -> int:
+        return len(self.lexicons.get(label, ()))
+
+    def match_tokens(self, tokens: List[str]) -> LexiconMatches:
+        """
+        مطابقة كلمات كاملة: كل رمز يساوي كلمة في القوائم يُحسب لكل تسمياتها
+        """
+        matches = LexiconMatches(len(tokens))
+        get_labels = self._labels.get
+
+        for token in tokens:
+            labels = get_labels(token)
+            if labels is None:
+                continue
+            for label in labels:
+                matches.counts[label] = matches.counts.get(label, 0) + 1
+                words = matches.words.setdefault(label, {})
+                words[token] = words.get(token, 0) + 1
+
+        return matches
+
+    def match_substrings(self, text: str) -> LexiconMatches:
+        """
+        مطابقة أجزاء النص: كل كلمة ظاهرة في أي موضع من النص تُحسب مرة واحدة
+
+        يُبحث عن كل كلمة مميزة مرة واحدة مهما تكررت في القوائم.
+        """
+        matches = LexiconMatches()
+
+        for word, labels in self._labels.items():
+            if word not in text:
+                continue
+            for label in labels:
+                matches.counts[label] = matches.counts.get(label, 0) + 1
+                matches.words.setdefault(label, {})[word] = 1
+
+        return matches
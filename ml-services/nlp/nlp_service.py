@@ -5,11 +5,16 @@
 
 import re
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from collections import Counter
 import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize, sent_tokenize
+import numpy as np
+
+from .document_frequency import CORPUS_DOCUMENT_FREQUENCY, DocumentFrequency
+from .entity_extraction import (
+    ARABIC_KEYWORD_START, ARABIC_WORD_START, ASCII_TOKEN_START, EntityExtractor, arabic_words
+)
+from .text_normalization import TEXT_NORMALIZER, AnalyzedDocument, TextInput, source_text
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -17,13 +22,21 @@ logger = logging.getLogger(__name__)
 class NLPService:
     """خدمة معالجة اللغة الطبيعية للنصوص العربية"""
     
-    def __init__(self):
-        """تهيئة الخدمة وتحميل الموارد المطلوبة"""
+    def __init__(self, document_frequency: Optional[DocumentFrequency] = None):
+        """تهيئة الخدمة وتحميل الموارد المطلوبة (document_frequency: جدول المدونة لحساب IDF)"""
         try:
             # Download required NLTK data
             nltk.download('punkt', quiet=True)
             nltk.download('stopwords', quiet=True)
             
+            # Shared normalizer: each text is cleaned and tokenized once
+            self.normalizer = TEXT_NORMALIZER
+            
+            # Corpus document frequencies for keyword IDF
+            self.document_frequency = (
+                CORPUS_DOCUMENT_FREQUENCY if document_frequency is None else document_frequency
+            )
+            
             # Arabic stopwords
             self.arabic_stopwords = set([
                 'في', 'من', 'إلى', 'على', 'عن', 'مع', 'هذا', 'هذه', 'ذلك', 'تلك',
@@ -36,13 +49,21 @@ class NLPService:
                 'أضافت', 'أشار', 'أشارت', 'بين', 'أكد', 'أكدت'
             ])
             
-            # Common Arabic patterns for entity extraction
+            # Common Arabic patterns for entity extraction, in match priority order.
+            # Organization and location tails are bounded to three words, and a
+            # name never starts at or runs through an organization/location
+            # keyword (with or without the article) so the keyword patterns still
+            # see it in the single scan.
+            keyword = ARABIC_KEYWORD_START
+            entity_keywords = 'شركة|مؤسسة|منظمة|جمعية|جامعة|وزارة|مدينة|محافظة|منطقة|دولة'
+            name_word = rf'(?!(?:ال)?(?:{entity_keywords})(?![أ-ي]))[أ-ي]+'
             self.arabic_patterns = {
-                'name': r'[أ-ي]+\s+[أ-ي]+(?:\s+[أ-ي]+)?',
-                'organization': r'(?:شركة|مؤسسة|منظمة|جمعية|جامعة|وزارة)\s+[أ-ي\s]+',
-                'location': r'(?:مدينة|محافظة|منطقة|دولة)\s+[أ-ي\s]+',
-                'date': r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}|\d{4}[/-]\d{1,2}[/-]\d{1,2}'
+                'date': rf'{ASCII_TOKEN_START}(?:\d{{1,2}}[/-]\d{{1,2}}[/-]\d{{2,4}}|\d{{4}}[/-]\d{{1,2}}[/-]\d{{1,2}})',
+                'organization': rf'{keyword}(?:شركة|مؤسسة|منظمة|جمعية|جامعة|وزارة)\s+{arabic_words(3)}',
+                'location': rf'{keyword}(?:مدينة|محافظة|منطقة|دولة)\s+{arabic_words(3)}',
+                'name': rf'{ARABIC_WORD_START}{name_word}(?:\s+{name_word}){{1,2}}',
             }
+            self.entity_extractor = EntityExtractor(self.arabic_patterns)
             
             logger.info("NLP Service initialized successfully")
             
@@ -50,36 +71,22 @@ class NLPService:
             logger.error(f"Error initializing NLP Service: {str(e)}")
             raise
     
-    def clean_arabic_text(self, text: str) -> str:
+    def clean_arabic_text(self, text: TextInput) -> str:
         """تنظيف النص العربي"""
-        # Remove diacritics (tashkeel)
-        text = re.sub(r'[ًٌٍَُِّْ]', '', text)
-        
-        # Normalize Arabic characters
-        text = re.sub(r'[إأآا]', 'ا', text)
-        text = re.sub(r'ى', 'ي', text)
-        text = re.sub(r'ة', 'ه', text)
-        
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text.strip())
-        
-        # Remove special characters but keep Arabic and basic punctuation
-        text = re.sub(r'[^\u0600-\u06FF\s\.\،\؟\!\:]', '', text)
-        
-        return text
+        return self.analyze_document(text).text
     
-    def extract_keywords(self, text: str, max_keywords: int = 10) -> List[str]:
+    def analyze_document(self, text: TextInput) -> AnalyzedDocument:
+        """تطبيع النص وتقطيعه مرة واحدة لتمريره إلى كل التحليلات"""
+        return self.normalizer.analyze(text)
+    
+    def extract_keywords(self, text: TextInput, max_keywords: int = 10) -> List[str]:
         """استخراج الكلمات المفتاحية من النص"""
         try:
-            # Clean text
-            cleaned_text = self.clean_arabic_text(text)
-            
-            # Tokenize
-            words = word_tokenize(cleaned_text)
+            words = self.analyze_document(text).words
             
             # Filter out stopwords and short words
             filtered_words = [
-                word.lower() for word in words
+                word for word in words
                 if len(word) > 2 and word not in self.arabic_stopwords
                 and re.match(r'^[أ-ي]+$', word)
             ]
@@ -87,8 +94,12 @@ class NLPService:
             # Count frequency
             word_freq = Counter(filtered_words)
             
-            # Return top keywords
-            keywords = [word for word, freq in word_freq.most_common(max_keywords)]
+            # Return top keywords by TF-IDF against the corpus (ties keep frequency order)
+            ranked = word_freq.most_common()
+            scores = np.array([freq for _, freq in ranked]) * self.document_frequency.idf_many(
+                word for word, _ in ranked
+            )
+            keywords = [ranked[i][0] for i in np.argsort(-scores, kind='stable')[:max_keywords]]
             
             logger.info(f"Extracted {len(keywords)} keywords from text")
             return keywords
@@ -97,30 +108,26 @@ class NLPService:
             logger.error(f"Error extracting keywords: {str(e)}")
             return []
     
-    def summarize(self, text: str, max_length: int = 150, language: str = "ar") -> str:
+    def summarize(self, text: TextInput, max_length: int = 150, language: str = "ar") -> str:
         """تلخيص النص العربي"""
         try:
-            # Clean text
-            cleaned_text = self.clean_arabic_text(text)
-            
-            # Split into sentences
-            sentences = sent_tokenize(cleaned_text)
+            document = self.analyze_document(text)
+            cleaned_text = document.text
+            sentences = document.sentences
             
             if len(sentences) <= 3:
                 return cleaned_text[:max_length] + "..." if len(cleaned_text) > max_length else cleaned_text
             
             # Calculate sentence scores based on word frequency
             word_freq = Counter()
-            for sentence in sentences:
-                words = word_tokenize(sentence.lower())
+            for words in document.sentence_words:
                 for word in words:
                     if word not in self.arabic_stopwords and len(word) > 2:
                         word_freq[word] += 1
             
             # Score sentences
             sentence_scores = {}
-            for sentence in sentences:
-                words = word_tokenize(sentence.lower())
+            for sentence, words in zip(sentences, document.sentence_words):
                 score = 0
                 word_count = 0
                 for word in words:
@@ -147,19 +154,20 @@ class NLPService:
             # Sort sentences by original order
             original_order = []
             for sentence in sentences:
-                if sentence in [s for s, _ in summary_sentences]:
+                if sentence in summary_sentences:
                     original_order.append(sentence)
             
             summary = ' '.join(original_order[:3])  # Limit to 3 sentences max
             
-            logger.info(f"Generated summary of length {len(summary)} from original text of length {len(text)}")
+            logger.info(f"Generated summary of length {len(summary)} from original text of length {len(document.source)}")
             return summary
             
         except Exception as e:
             logger.error(f"Error in summarization: {str(e)}")
+            text = source_text(text)
             return text[:max_length] + "..." if len(text) > max_length else text
     
-    def generate_tags(self, text: str, max_tags: int = 5) -> List[str]:
+    def generate_tags(self, text: TextInput, max_tags: int = 5) -> List[str]:
         """اقتراح علامات للمحتوى"""
         try:
             # Extract keywords first
@@ -199,12 +207,12 @@ class NLPService:
             logger.error(f"Error generating tags: {str(e)}")
             return ['عام']  # Return default tag
     
-    def analyze_readability(self, text: str) -> Dict[str, Any]:
+    def analyze_readability(self, text: TextInput) -> Dict[str, Any]:
         """تحليل سهولة قراءة النص"""
         try:
-            cleaned_text = self.clean_arabic_text(text)
-            sentences = sent_tokenize(cleaned_text)
-            words = word_tokenize(cleaned_text)
+            document = self.analyze_document(text)
+            sentences = document.sentence_spans
+            words = document.words
             
             # Basic readability metrics
             avg_sentence_length = len(words) / len(sentences) if sentences else 0
@@ -243,33 +251,17 @@ class NLPService:
             logger.error(f"Error analyzing readability: {str(e)}")
             return {'level': 'غير محدد', 'error': str(e)}
     
-    def extract_entities(self, text: str) -> Dict[str, List[str]]:
-        """استخراج الكيانات المسماة من النص"""
+    def extract_entities(self, text: TextInput) -> Dict[str, List[str]]:
+        """استخراج الكيانات المسماة من النص (الأصلي قبل التطبيع)"""
         try:
+            found = self.entity_extractor.extract(source_text(text))
             entities = {
-                'names': [],
-                'organizations': [],
-                'locations': [],
-                'dates': []
+                'names': found['name'],
+                'organizations': found['organization'],
+                'locations': found['location'],
+                'dates': found['date']
             }
             
-            # Extract using regex patterns
-            for entity_type, pattern in self.arabic_patterns.items():
-                matches = re.findall(pattern, text, re.IGNORECASE)
-                if entity_type == 'name':
-                    entities['names'].extend(matches)
-                elif entity_type == 'organization':
-                    entities['organizations'].extend(matches)
-                elif entity_type == 'location':
-                    entities['locations'].extend(matches)
-                elif entity_type == 'date':
-                    entities['dates'].extend(matches)
-            
-            # Remove duplicates and clean
-            for key in entities:
-                entities[key] = list(set(entities[key]))
-                entities[key] = [entity.strip() for entity in entities[key]]
-            
             logger.info(f"Extracted entities: {sum(len(v) for v in entities.values())} total")
             return entities
             
@@ -7,42 +7,39 @@
 
 import asyncio
 import logging
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
 import json
 import re
 import numpy as np
-import pandas as pd
 from dataclasses import dataclass, asdict
 from pathlib import Path
 
-# استيراد مكتبات تعلم الآلة
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-import joblib
+# مكتبات تعلم الآلة (sklearn, joblib, transformers, torch) تُستورد عند أول
+# استخدام فقط، حتى يبدأ العامل بسرعة عند الاكتفاء بالتقديرات الأساسية
+try:
+    from .batched_inference import SentimentBatcher
+    from .text_normalization import FEATURE_NORMALIZER, AnalyzedDocument, TextInput
+except ImportError:  # التشغيل المباشر كسكربت
+    from batched_inference import SentimentBatcher
+    from text_normalization import FEATURE_NORMALIZER, AnalyzedDocument, TextInput
 
-# مكتبات معالجة النصوص العربية
-import arabic_reshaper
-from bidi.algorithm import get_display
-import pyarabic.araby as araby
-from textblob import TextBlob
-from transformers import pipeline, AutoTokenizer, AutoModel
-import torch
-
-# إعداد التسجيل
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('performance_predictor.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+def configure_logging(log_file: str = 'performance_predictor.log'):
+    """
+    إعداد التسجيل عند التشغيل كسكربت (الاستيراد لا يُنشئ ملفات ولا يغيّر التسجيل)
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file, encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
 @dataclass
 class ArticleMetrics:
     """مقاييس المقالة للتنبؤ"""
@@ -77,17 +74,67 @@ class PerformancePrediction:
     expected_peak_time: datetime
 
 class ArabicTextAnalyzer:
-    """محلل النصوص العربية"""
+    """
+    محلل النصوص العربية
     
-    def __init__(self):
+    النماذج تُحمّل عند أول استخدام (أو مسبقاً عبر warm_up)، ويشير is_ready
+    إلى اكتمال تحميلها.
+    """
+    
+    def __init__(self, sentiment_batch_size: int = 32, sentiment_max_wait_ms: float = 10.0):
         self.sentiment_pipeline = None
         self.tokenizer = None
         self.model = None
-        self._initialize_models()
+        
+        self._models_loaded = threading.Event()
+        self._models_lock = threading.Lock()
+        
+        # تطبيع وتقطيع مشترك: يُنظف كل نص مرة واحدة لكل المميزات
+        self.normalizer = FEATURE_NORMALIZER
+        
+        # تجميع نصوص تحليل المشاعر في دفعات بدلاً من تمرير كل نص على حدة
+        self.sentiment_batcher = SentimentBatcher(
+            batch_size=sentiment_batch_size,
+            max_wait_ms=sentiment_max_wait_ms
+        )
+    
+    @property
+    def is_ready(self) -> bool:
+        """هل اكتمل تحميل النماذج"""
+        return self._models_loaded.is_set()
+    
+    def warm_up(self, background: bool = False) -> Optional[threading.Thread]:
+        """
+        تحميل النماذج مسبقاً
+        
+        Args:
+            background: التحميل في خيط خلفي وإرجاعه دون انتظار
+        """
+        if not background:
+            self.ensure_models()
+            return None
+        
+        thread = threading.Thread(target=self.ensure_models, name='text-analyzer-warm-up', daemon=True)
+        thread.start()
+        return thread
+    
+    def ensure_models(self) -> None:
+        """تحميل النماذج مرة واحدة (الاستدعاءات المتزامنة تنتظر التحميل الأول)"""
+        if self._models_loaded.is_set():
+            return
+        
+        with self._models_lock:
+            if self._models_loaded.is_set():
+                return
+            self._initialize_models()
+            self.sentiment_batcher.sentiment_pipeline = self.sentiment_pipeline
+            self._models_loaded.set()
     
     def _initialize_models(self):
         """تهيئة نماذج معالجة النصوص العربية"""
         try:
+            from transformers import pipeline, AutoTokenizer, AutoModel
+            
             # نموذج تحليل المشاعر العربية
             self.sentiment_pipeline = pipeline(
                 "sentiment-analysis", 
@@ -108,37 +155,36 @@ class ArabicTextAnalyzer:
     def _load_fallback_models(self):
         """تحميل النماذج البديلة"""
         try:
+            from transformers import pipeline
+            
             self.sentiment_pipeline = pipeline("sentiment-analysis")
             logger.info("تم تحميل النماذج البديلة")
         except Exception as e:
             logger.error(f"فشل في تحميل النماذج البديلة: {e}")
     
-    def clean_arabic_text(self, text: str) -> str:
+    def clean_arabic_text(self, text: TextInput) -> str:
         """تنظيف النص العربي"""
-        # إزالة التشكيل
-        text = araby.strip_diacritics(text)
-        
-        # إزالة الأرقام الإنجليزية واستبدالها بالعربية
-        text = re.sub(r'[0-9]', lambda m: araby.convert_to_arabic_number(m.group()), text)
-        
-        # إزالة الرموز غير المرغوبة
-        text = re.sub(r'[^\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF\s]', '', text)
-        
-        # توحيد المسافات
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        return text
+        return self.analyze_document(text).text
+    
+    def analyze_document(self, text: TextInput) -> AnalyzedDocument:
+        """تطبيع النص وتقطيعه مرة واحدة (التشكيل، الأرقام العربية، الرموز غير العربية)"""
+        return self.normalizer.analyze(text)
     
-    def extract_text_features(self, text: str) -> Dict[str, float]:
+    def extract_text_features(self, text: TextInput, sentiment_score: Optional[float] = None) -> Dict[str, float]:
         """استخراج مميزات النص العربي"""
-        cleaned_text = self.clean_arabic_text(text)
+        document = self.analyze_document(text)
+        text = document.source
+        words = document.tokens
+        
+        if sentiment_score is None:
+            sentiment_score = self._analyze_sentiment(document.text)
         
         features = {
             # مميزات أساسية
-            'word_count': len(cleaned_text.split()),
-            'char_count': len(cleaned_text),
-            'sentence_count': len(re.split(r'[.!?؟]', cleaned_text)),
-            'avg_word_length': np.mean([len(word) for word in cleaned_text.split()]) if cleaned_text.split() else 0,
+            'word_count': len(words),
+            'char_count': len(document.text),
+            'sentence_count': len(document.sentence_spans),
+            'avg_word_length': np.mean([len(word) for word in words]) if words else 0,
             
             # مميزات النص العربي
             'arabic_char_ratio': len(re.findall(r'[\u0600-\u06FF]', text)) / len(text) if text else 0,
@@ -147,42 +193,43 @@ class ArabicTextAnalyzer:
             'exclamation_marks': text.count('!'),
             
             # مميزات المشاعر
-            'sentiment_score': self._analyze_sentiment(cleaned_text),
+            'sentiment_score': sentiment_score,
             
             # مميزات المحتوى
-            'readability_score': self._calculate_readability(cleaned_text),
-            'keyword_density': self._calculate_keyword_density(cleaned_text),
+            'readability_score': self._calculate_readability(document),
+            'keyword_density': self._calculate_keyword_density(document),
             'title_similarity': 0.0  # سيتم حسابها لاحقاً
         }
         
         return features
     
+    def extract_text_features_batch(self, texts: List[str]) -> List[Dict[str, float]]:
+        """استخراج مميزات عدة نصوص مع تحليل مشاعرها في دفعات"""
+        self.ensure_models()
+        documents = [self.analyze_document(text) for text in texts]
+        sentiment_scores = self.sentiment_batcher.score_many([document.text for document in documents])
+        
+        return [
+            self.extract_text_features(document, sentiment_score)
+            for document, sentiment_score in zip(documents, sentiment_scores)
+        ]
+    
     def _analyze_sentiment(self, text: str) -> float:
-        """تحليل مشاعر النص"""
+        """تحليل مشاعر النص (يُجمّع مع الطلبات المتزامنة في دفعة واحدة)"""
         try:
-            if self.sentiment_pipeline and text.strip():
-                result = self.sentiment_pipeline(text[:512])  # تحديد النص لتجنب الأخطاء
-                if isinstance(result, list) and len(result) > 0:
-                    if isinstance(result[0], list):
-                        # إذا كان النتيجة قائمة من النتائج
-                        positive_score = next((r['score'] for r in result[0] if r['label'] == 'POSITIVE'), 0.5)
-                        return positive_score
-                    else:
-                        # إذا كان النتيجة واحدة
-                        return result[0]['score'] if result[0]['label'] == 'POSITIVE' else 1 - result[0]['score']
-            return 0.5  # قيمة محايدة
+            self.ensure_models()
+            return self.sentiment_batcher.score(text)
         except Exception as e:
             logger.warning(f"خطأ في تحليل المشاعر: {e}")
             return 0.5
     
-    def _calculate_readability(self, text: str) -> float:
+    def _calculate_readability(self, document: AnalyzedDocument) -> float:
         """حساب سهولة القراءة للنص العربي"""
-        words = text.split()
+        words = document.tokens
         if not words:
             return 0.0
         
-        sentences = re.split(r'[.!?؟]', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
+        sentences = document.sentence_spans
         
         if not sentences:
             return 0.0
@@ -194,9 +241,9 @@ class ArabicTextAnalyzer:
         readability = 100 - (1.015 * avg_words_per_sentence) - (84.6 * avg_chars_per_word / 100)
         return max(0, min(100, readability)) / 100
     
-    def _calculate_keyword_density(self, text: str) -> float:
+    def _calculate_keyword_density(self, document: AnalyzedDocument) -> float:
         """حساب كثافة الكلمات المفتاحية"""
-        words = text.split()
+        words = document.tokens
         if len(words) < 10:
             return 0.0
         
@@ -216,49 +263,101 @@ class ArabicTextAnalyzer:
 class PerformancePredictor:
     """متنبئ أداء المحتوى"""
     
+    METRICS = ('views', 'engagement', 'shares', 'comments')
+    
     def __init__(self, model_path: str = "models/"):
         self.model_path = Path(model_path)
         self.model_path.mkdir(exist_ok=True)
         
         self.text_analyzer = ArabicTextAnalyzer()
-        self.scaler = StandardScaler()
         self.encoders = {}
         
-        # النماذج المختلفة
-        self.models = {
-            'views': RandomForestRegressor(n_estimators=100, random_state=42),
-            'engagement': GradientBoostingRegressor(n_estimators=100, random_state=42),
-            'shares': RandomForestRegressor(n_estimators=100, random_state=42),
-            'comments': LinearRegression()
-        }
+        # النماذج المختلفة (تُنشأ عند التدريب أو تُحمّل من الملفات المحفوظة)
+        self.scaler = None
+        self.models = {}
         
         self.is_trained = False
         self._load_models()
     
+    @staticmethod
+    def _create_model(metric: str):
+        """إنشاء نموذج جديد غير مدرب للمقياس"""
+        from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+        from sklearn.linear_model import LinearRegression
+        
+        return {
+            'views': lambda: RandomForestRegressor(n_estimators=100, random_state=42),
+            'engagement': lambda: GradientBoostingRegressor(n_estimators=100, random_state=42),
+            'shares': lambda: RandomForestRegressor(n_estimators=100, random_state=42),
+            'comments': lambda: LinearRegression()
+        }[metric]()
+    
+    def _ensure_untrained_models(self):
+        """إكمال النماذج والمطبِّع الناقصة بنسخ جديدة قبل التدريب"""
+        from sklearn.preprocessing import StandardScaler
+        
+        if self.scaler is None:
+            self.scaler = StandardScaler()
+        for metric in self.METRICS:
+            if metric not in self.models:
+                self.models[metric] = self._create_model(metric)
+    
     def _load_models(self):
         """تحميل النماذج المحفوظة"""
+        scaler_file = self.model_path / "scaler.joblib"
+        model_files = {metric: self.model_path / f"{metric}_model.joblib" for metric in self.METRICS}
+        
+        # بدون ملفات محفوظة تبقى التنبؤات أساسية ولا حاجة لتحميل أي مكتبة
+        if not scaler_file.exists():
+            logger.info("لم يتم العثور على نماذج محفوظة، سيتم استخدام التقديرات الأساسية")
+            return
+        
         try:
-            for metric, model in self.models.items():
-                model_file = self.model_path / f"{metric}_model.joblib"
+            import joblib
+            
+            for metric, model_file in model_files.items():
                 if model_file.exists():
                     self.models[metric] = joblib.load(model_file)
                     logger.info(f"تم تحميل نموذج {metric}")
             
-            scaler_file = self.model_path / "scaler.joblib"
-            if scaler_file.exists():
-                self.scaler = joblib.load(scaler_file)
+            self.scaler = joblib.load(scaler_file)
+            self._ensure_untrained_models()
             
             self.is_trained = True
             logger.info("تم تحميل جميع النماذج المحفوظة")
         except Exception as e:
             logger.warning(f"لم يتم العثور على نماذج محفوظة: {e}")
     
+    def warm_up(self, background: bool = True) -> Optional[threading.Thread]:
+        """تحميل نماذج تحليل النصوص مسبقاً (في الخلفية افتراضياً)"""
+        return self.text_analyzer.warm_up(background=background)
+    
+    @property
+    def is_ready(self) -> bool:
+        """جاهزية التنبؤ الكامل (النماذج مدربة ونماذج النصوص محمّلة)"""
+        return self.is_trained and self.text_analyzer.is_ready
+    
     def prepare_features(self, article: ArticleMetrics) -> np.ndarray:
         """تحضير المميزات للتنبؤ"""
-        # استخراج مميزات النص
-        title_features = self.text_analyzer.extract_text_features(article.title)
-        content_features = self.text_analyzer.extract_text_features(article.content)
+        return self.prepare_features_batch([article])
+    
+    def prepare_features_batch(self, articles: List[ArticleMetrics]) -> np.ndarray:
+        """تحضير مميزات عدة مقالات (العناوين والمحتوى في دفعات مشاعر مشتركة)"""
+        if not articles:
+            return np.zeros((0, 0))
+        
+        text_features = self.text_analyzer.extract_text_features_batch(
+            [article.title for article in articles] + [article.content for article in articles]
+        )
         
+        return np.array([
+            self._article_features(article, text_features[i], text_features[len(articles) + i])
+            for i, article in enumerate(articles)
+        ])
+    
+    def _article_features(self, article: ArticleMetrics, title_features: Dict[str, float],
+                          content_features: Dict[str, float]) -> List[float]:
+        """متجه مميزات مقالة واحدة"""
         # حساب التشابه بين العنوان والمحتوى
         title_content_similarity = self._calculate_similarity(article.title, article.content[:500])
         
@@ -305,14 +404,14 @@ class PerformancePredictor:
             self._encode_category(article.category)
         ]
         
-        return np.array(features).reshape(1, -1)
+        return features
     
     def _calculate_similarity(self, text1: str, text2: str) -> float:
         """حساب التشابه بين نصين"""
         try:
             # تحويل النصوص إلى كلمات
-            words1 = set(self.text_analyzer.clean_arabic_text(text1).split())
-            words2 = set(self.text_analyzer.clean_arabic_text(text2).split())
+            words1 = set(self.text_analyzer.analyze_document(text1).tokens)
+            words2 = set(self.text_analyzer.analyze_document(text2).tokens)
             
             if not words1 or not words2:
                 return 0.0
@@ -564,6 +663,11 @@ class PerformancePredictor:
                 logger.error("فشل في تحضير بيانات التدريب")
                 return False
             
+            from sklearn.model_selection import train_test_split
+            from sklearn.metrics import mean_absolute_error, r2_score
+            
+            self._ensure_untrained_models()
+            
             # تطبيع المميزات
             X_scaled = self.scaler.fit_transform(X)
             
@@ -600,8 +704,7 @@ class PerformancePredictor:
     
     def _prepare_training_data(self, data: List[Dict[str, Any]]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
         """تحضير بيانات التدريب"""
-        features_list = []
-        targets = {'views': [], 'engagement': [], 'shares': [], 'comments': []}
+        samples = []
         
         for item in data:
             try:
@@ -623,21 +726,46 @@ class PerformancePredictor:
                     topic_trending_score=item.get('topic_trending_score', 0.5),
                     seasonal_factor=item.get('seasonal_factor', 1.0)
                 )
+                samples.append((article, item))
                 
-                # استخراج المميزات
-                features = self.prepare_features(article)
-                features_list.append(features[0])
-                
-                # إضافة الأهداف
-                targets['views'].append(item.get('actual_views', 0))
-                targets['engagement'].append(item.get('actual_engagement', 0))
-                targets['shares'].append(item.get('actual_shares', 0))
-                targets['comments'].append(item.get('actual_comments', 0))
-                
             except Exception as e:
                 logger.warning(f"تجاهل عينة بسبب خطأ: {e}")
                 continue
         
+        # مميزات النصوص لكل العينات معاً (تحليل المشاعر في دفعات)، وإن فشلت
+        # الدفعة تُحسب لكل عينة وحدها حتى لا تُفقد العينات السليمة
+        text_features = None
+        if samples:
+            try:
+                text_features = self.text_analyzer.extract_text_features_batch(
+                    [article.title for article, _ in samples] + [article.content for article, _ in samples]
+                )
+            except Exception as e:
+                logger.warning(f"تعذر تحليل نصوص العينات دفعة واحدة: {e}")
+        
+        features_list = []
+        targets = {'views': [], 'engagement': [], 'shares': [], 'comments': []}
+        
+        for i, (article, item) in enumerate(samples):
+            try:
+                if text_features is None:
+                    features = self.prepare_features(article)[0]
+                else:
+                    features = self._article_features(
+                        article, text_features[i], text_features[len(samples) + i]
+                    )
+            except Exception as e:
+                logger.warning(f"تجاهل عينة بسبب خطأ: {e}")
+                continue
+            
+            features_list.append(features)
+            
+            # إضافة الأهداف
+            targets['views'].append(item.get('actual_views', 0))
+            targets['engagement'].append(item.get('actual_engagement', 0))
+            targets['shares'].append(item.get('actual_shares', 0))
+            targets['comments'].append(item.get('actual_comments', 0))
+        
         X = np.array(features_list) if features_list else np.array([])
         y_dict = {k: np.array(v) for k, v in targets.items()}
         
@@ -646,6 +774,8 @@ class PerformancePredictor:
     def _save_models(self):
         """حفظ النماذج المدربة"""
         try:
+            import joblib
+            
             for metric, model in self.models.items():
                 joblib.dump(model, self.model_path / f"{metric}_model.joblib")
             
@@ -670,6 +800,8 @@ class PerformancePredictor:
 async def main():
     """مثال على استخدام خدمة توقع الأداء"""
     
+    configure_logging()
+    
     # إنشاء متنبئ الأداء
     predictor = PerformancePredictor()
     
@@ -4,18 +4,25 @@ Intelligent Recommendation Engine
 @version 3.0.0
 """
 
+import heapq
 import numpy as np
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
 from datetime import datetime, timedelta
 import json
 import math
-from .interest_model import UserInterestModel
+import time
+from .event_batch import event_article_ids
+from .interest_model import SECONDS_PER_DAY, UserInterestModel
+from .vectorized_scoring import (
+    ArticleFeatures, VectorizedScorer, freshness_from_epochs, parse_published_epoch, select_top_indices
+)
 
 class RecommendationEngine:
     """محرك التوصيات الذكي"""
     
-    def __init__(self):
-        self.interest_model = UserInterestModel()
+    def __init__(self, interest_model: Optional[UserInterestModel] = None):
+        # يُشارك نموذج الاهتمام مع الخدمة حتى تُحسب الدرجات بنفس الأوزان مرة واحدة
+        self.interest_model = interest_model or UserInterestModel()
         
         # أوزان خوارزميات التوصية المختلفة
         self.algorithm_weights = {
@@ -29,22 +36,50 @@ class RecommendationEngine:
         self.freshness_weight = 0.2    # وزن الحداثة
         self.diversity_threshold = 0.3  # عتبة التنوع
         self.min_score_threshold = 0.1  # حد أدنى للدرجة
+        self.max_per_category = 2       # حد أقصى للمقالات من نفس التصنيف
+        
+        # توليد المرشحين من الكتالوج (None لتقييم كل المقالات)
+        self.candidate_budget = 2000          # الحد الأقصى للمقالات المُقيّمة
+        self.candidate_interest_limit = 20    # عدد أقوى الاهتمامات المستخدمة
+        self.candidate_backfill_ratio = 0.2   # نسبة المقالات الشائعة/الحديثة
+        
+        # حساب الدرجات بشكل متجهي (False للرجوع إلى الحساب لكل مقال على حدة)
+        self.use_vectorized_scoring = True
+        self.vectorized_scorer = VectorizedScorer(self.algorithm_weights, self.freshness_weight)
+        
+        # نموذج التصفية التعاونية بين المقالات (ItemCooccurrenceModel)؛
+        # بدونه تقتصر الدرجة التعاونية على تفاعلات المستخدم السابقة مع المقال
+        self.collaborative_model = None
+        
+        # فهرس تضمينات المقالات (ArticleEmbeddingIndex) لاسترجاع المقالات القريبة
+        # دلالياً من آخر قراءات المستخدم؛ بدونه تقتصر المطابقة على الوسوم والتصنيفات
+        self.embedding_index = None
+        self.semantic_weight = 0.3          # وزن التشابه الدلالي في درجة المحتوى
+        self.semantic_recent_reads = 10     # عدد آخر المقالات المقروءة المستخدمة
+        self.semantic_neighbors = 200       # عدد المقالات المسترجعة من الفهرس
+        
+        # عدد المستخدمين المُقيّمين معاً في مصفوفة واحدة في التوصيات المجمّعة
+        self.batch_size = 256
         
     def recommend_articles(
         self, 
         user_events: List[Dict], 
         articles: List[Dict], 
         top_n: int = 5,
-        context: str = 'homepage'
+        context: str = 'homepage',
+        user_interests: Optional[Dict[str, float]] = None,
+        now: Optional[float] = None
     ) -> List[Dict]:
         """
         توليد توصيات مخصصة للمستخدم
         
         Args:
-            user_events: الأحداث السلوكية للمستخدم
+            user_events: الأحداث السلوكية للمستخدم (قائمة قواميس أو EventBatch)
             articles: المقالات المتاحة
             top_n: عدد التوصيات المطلوبة
             context: سياق التوصية
+            user_interests: درجات اهتمام محسوبة مسبقاً (تُحسب من الأحداث إن لم تُمرر)
+            now: الوقت المرجعي للطلب بالثواني (للتراجع والحداثة)
             
         Returns:
             قائمة المقالات الموصى بها مع الدرجات
@@ -53,44 +88,240 @@ class RecommendationEngine:
         if not articles:
             return []
         
+        now = time.time() if now is None else now
+        
         # حساب درجات الاهتمام للمستخدم
-        user_interests = self.interest_model.compute_interest_score(user_events)
+        if user_interests is None:
+            user_interests = self.interest_model.compute_interest_score(user_events, now)
         
-        # حساب درجات التوصية لكل مقال
-        article_scores = []
+        if self.use_vectorized_scoring:
+            return self.recommend_from_features(
+                ArticleFeatures(articles), user_interests, user_events, top_n, context, now=now
+            )
         
-        for article in articles:
+        # حساب درجات التوصية لكل مقال مع الاحتفاظ بأفضلها فقط لكل تصنيف
+        # (كومة صغرى محدودة لكل تصنيف بمفتاح (الدرجة، -الموقع))
+        category_heaps = {}
+        
+        for index, article in enumerate(articles):
             # حساب درجة التوصية الإجمالية
             total_score = self._calculate_article_score(
-                article, user_interests, user_events, context
+                article, user_interests, user_events, context, now
             )
             
-            if total_score >= self.min_score_threshold:
-                article_scores.append({
-                    **article,
-                    'recommendation_score': total_score,
-                    'recommendation_reason': self._generate_reason(article, user_interests)
-                })
-        
-        # ترتيب المقالات حسب الدرجة
-        sorted_articles = sorted(
-            article_scores, 
-            key=lambda x: x['recommendation_score'], 
-            reverse=True
+            if total_score < self.min_score_threshold:
+                continue
+            
+            category = article.get('category', {}).get('name', '')
+            heap = category_heaps.setdefault(category, [])
+            entry = (total_score, -index)
+            
+            if len(heap) < self.max_per_category:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+        
+        # أفضل N مقالات بعد تطبيق حد التنوع، وإنشاء النتائج للفائزين فقط
+        winners = heapq.nlargest(
+            top_n, (entry for heap in category_heaps.values() for entry in heap)
+        )
+        
+        return [
+            {
+                **articles[-neg_index],
+                'recommendation_score': total_score,
+                'recommendation_reason': self._generate_reason(articles[-neg_index], user_interests)
+            }
+            for total_score, neg_index in winners
+        ]
+    
+    def recommend_from_features(
+        self,
+        features: ArticleFeatures,
+        user_interests: Dict[str, float],
+        user_events: List[Dict],
+        top_n: int = 5,
+        context: str = 'homepage',
+        semantic_neighbors: Optional[Dict[str, float]] = None,
+        now: Optional[float] = None
+    ) -> List[Dict]:
+        """
+        توليد التوصيات من تمثيل عمودي للمقالات (نفس ترتيب المسار غير المتجهي)
+        """
+        
+        if semantic_neighbors is None:
+            semantic_neighbors = self._semantic_neighbors(user_events)
+        
+        semantic_boost = None
+        if semantic_neighbors:
+            semantic_boost = np.fromiter(
+                (semantic_neighbors.get(article_id, 0.0) for article_id in features.ids),
+                dtype=np.float64, count=len(features)
+            ) * self.semantic_weight
+        
+        scores = self.vectorized_scorer.score(
+            features, user_interests, user_events,
+            context_multiplier=self._get_context_multiplier(context),
+            now=now,
+            collaborative_model=self.collaborative_model,
+            semantic_boost=semantic_boost
         )
         
-        # تطبيق التنوع
-        diverse_articles = self._apply_diversity_filter(sorted_articles, user_interests)
+        # اختيار أفضل N مع تطبيق حد التنوع دون ترتيب كل المرشحين
+        selected = select_top_indices(
+            scores, features.category_ids, top_n,
+            per_category_cap=self.max_per_category,
+            min_score=self.min_score_threshold
+        )
         
-        # إرجاع أفضل N مقالات
-        return diverse_articles[:top_n]
+        # إنشاء النتائج للفائزين فقط
+        return [
+            {
+                **features.articles[i],
+                'recommendation_score': float(scores[i]),
+                'recommendation_reason': self._generate_reason(features.articles[i], user_interests)
+            }
+            for i in selected
+        ]
+    
+    def recommend_batch(
+        self,
+        features: ArticleFeatures,
+        users: Iterable[Tuple[Optional[Dict[str, float]], List[Dict]]],
+        top_n: int = 5,
+        context: str = 'homepage'
+    ) -> Iterator[List[Dict]]:
+        """
+        توصيات عدة مستخدمين على نفس المقالات المرشحة
+        
+        Args:
+            features: التمثيل العمودي للمقالات المرشحة (مشترك بين المستخدمين)
+            users: أزواج (درجات الاهتمام أو None، الأحداث) تُقرأ تدريجياً
+            top_n: عدد التوصيات لكل مستخدم
+            context: سياق التوصية
+            
+        Returns:
+            مولّد لقائمة توصيات كل مستخدم بنفس ترتيب users؛ يُقيّم batch_size
+            مستخدماً في كل مرة فتبقى الذاكرة ثابتة مهما كان عدد المستخدمين
+        """
+        
+        context_multiplier = self._get_context_multiplier(context)
+        now = time.time()
+        users = iter(users)
+        
+        while True:
+            chunk = [user for _, user in zip(range(self.batch_size), users)]
+            if not chunk:
+                return
+            
+            interests_per_user = [
+                self.interest_model.compute_interest_score(user_events, now)
+                if user_interests is None else user_interests
+                for user_interests, user_events in chunk
+            ]
+            events_per_user = [user_events for _, user_events in chunk]
+            
+            semantic_boost = None
+            if self.embedding_index is not None and len(features):
+                semantic_boost = np.zeros((len(chunk), len(features)))
+                for row, user_events in enumerate(events_per_user):
+                    neighbors = self._semantic_neighbors(user_events)
+                    if neighbors:
+                        semantic_boost[row] = np.fromiter(
+                            (neighbors.get(article_id, 0.0) for article_id in features.ids),
+                            dtype=np.float64, count=len(features)
+                        ) * self.semantic_weight
+            
+            scores = self.vectorized_scorer.score_batch(
+                features, interests_per_user, events_per_user,
+                context_multiplier=context_multiplier,
+                now=now,
+                collaborative_model=self.collaborative_model,
+                semantic_boost=semantic_boost
+            )
+            
+            for row, user_interests in enumerate(interests_per_user):
+                selected = select_top_indices(
+                    scores[row], features.category_ids, top_n,
+                    per_category_cap=self.max_per_category,
+                    min_score=self.min_score_threshold
+                )
+                yield [
+                    {
+                        **features.articles[i],
+                        'recommendation_score': float(scores[row, i]),
+                        'recommendation_reason': self._generate_reason(features.articles[i], user_interests)
+                    }
+                    for i in selected
+                ]
+    
+    def recommend_from_catalog(
+        self,
+        catalog,
+        user_interests: Dict[str, float],
+        user_events: List[Dict],
+        top_n: int = 5,
+        context: str = 'homepage',
+        article_ids: Optional[List[str]] = None,
+        category: Optional[str] = None,
+        published_since: Optional[str] = None,
+        now: Optional[float] = None
+    ) -> List[Dict]:
+        """
+        توليد التوصيات من كتالوج المقالات
+        
+        تُولّد المرشحات من الفهرس المعكوس لأقوى اهتمامات المستخدم مع إكمالها
+        بالمقالات الشائعة والحديثة، فلا تُقيّم المقالات البعيدة عن اهتماماته.
+        """
+        
+        # البذور بترتيب أولويتها: الأقرب دلالياً من آخر القراءات، ثم مقالات
+        # الأحداث من الأحدث إلى الأقدم؛ يأخذ الكتالوج منها ما تسعه الميزانية
+        semantic_neighbors = self._semantic_neighbors(user_events)
+        seed_article_ids = list(dict.fromkeys([
+            *sorted(semantic_neighbors, key=semantic_neighbors.get, reverse=True),
+            *(article_id for article_id in reversed(event_article_ids(user_events)) if article_id is not None)
+        ]))
+        
+        candidates = catalog.select(
+            article_ids=article_ids,
+            category=category,
+            published_since=published_since,
+            user_interests=user_interests,
+            candidate_budget=self.candidate_budget,
+            interest_limit=self.candidate_interest_limit,
+            backfill_ratio=self.candidate_backfill_ratio,
+            seed_article_ids=seed_article_ids,
+            now=now
+        )
+        
+        return self.recommend_from_features(
+            candidates, user_interests, user_events, top_n, context, semantic_neighbors, now
+        )
+    
+    def _semantic_neighbors(self, user_events: List[Dict]) -> Dict[str, float]:
+        """المقالات الأقرب دلالياً لآخر ما قرأه المستخدم مع درجة التشابه"""
+        if self.embedding_index is None:
+            return {}
+        
+        recent_reads = []
+        for article_id in reversed(event_article_ids(user_events)):
+            if article_id and article_id not in recent_reads:
+                recent_reads.append(article_id)
+                if len(recent_reads) >= self.semantic_recent_reads:
+                    break
+        
+        if not recent_reads:
+            return {}
+        
+        return self.embedding_index.similar_to_articles(recent_reads, k=self.semantic_neighbors)
     
     def _calculate_article_score(
         self, 
         article: Dict, 
         user_interests: Dict[str, float], 
         user_events: List[Dict],
-        context: str
+        context: str,
+        now: Optional[float] = None
     ) -> float:
         """حساب درجة التوصية للمقال"""
         
@@ -107,7 +338,7 @@ class RecommendationEngine:
         diversity_score = self._diversity_score(article, user_interests)
         
         # 5. درجة الحداثة
-        freshness_score = self._freshness_score(article)
+        freshness_score = self._freshness_score(article, now)
         
         # 6. تعديل حسب السياق
         context_multiplier = self._get_context_multiplier(context)
@@ -143,7 +374,7 @@ class RecommendationEngine:
             score += np.mean(tag_scores) * 0.3
         
         # درجة الكاتب (إذا كان المستخدم يتابع كاتب معين)
-        author = article.get('author', {}).get('name', '')
+        author = (article.get('author') or {}).get('name', '')
         if author in user_interests:
             score += user_interests[author] * 0.3
         
@@ -157,8 +388,8 @@ class RecommendationEngine:
         
         # البحث عن تفاعلات مماثلة
         similar_interactions = 0
-        for event in user_events:
-            if event.get('event_data', {}).get('articleId') == article_id:
+        for event_article_id in event_article_ids(user_events):
+            if event_article_id == article_id:
                 similar_interactions += 1
         
         # حساب درجة بسيطة بناءً على التفاعلات السابقة
@@ -194,32 +425,27 @@ class RecommendationEngine:
         
         return diversity
     
-    def _freshness_score(self, article: Dict) -> float:
+    def _freshness_score(self, article: Dict, now: Optional[float] = None) -> float:
         """حساب درجة الحداثة للمقال"""
         
-        published_at = article.get('published_at')
-        if not published_at:
+        published_epoch = parse_published_epoch(article.get('published_at'))
+        if np.isnan(published_epoch):
             return 0.0
         
-        try:
-            pub_date = datetime.fromisoformat(published_at.replace('Z', '+00:00'))
-            now = datetime.now(pub_date.tzinfo)
-            
-            # عدد الأيام منذ النشر
-            days_old = (now - pub_date).days
-            
-            # درجة الحداثة تتناقص مع الوقت
-            if days_old < 1:
-                return 1.0
-            elif days_old < 7:
-                return 0.8
-            elif days_old < 30:
-                return 0.5
-            else:
-                return 0.2
-        
-        except Exception:
-            return 0.0
+        now = time.time() if now is None else now
+        
+        # عدد الأيام منذ النشر
+        days_old = math.floor((now - published_epoch) / SECONDS_PER_DAY)
+        
+        # درجة الحداثة تتناقص مع الوقت
+        if days_old < 1:
+            return 1.0
+        elif days_old < 7:
+            return 0.8
+        elif days_old < 30:
+            return 0.5
+        else:
+            return 0.2
     
     def _get_context_multiplier(self, context: str) -> float:
         """حساب مضاعف السياق"""
@@ -252,7 +478,7 @@ class RecommendationEngine:
             category_count = category_counts.get(category, 0)
             
             # السماح بحد أقصى مقالين من نفس التصنيف
-            if category_count < 2:
+            if category_count < self.max_per_category:
                 diverse_articles.append(article)
                 category_counts[category] = category_count + 1
         
@@ -298,8 +524,11 @@ class RecommendationEngine:
         coverage = len(unique_categories) / max(len(categories), 1)
         
         # مقياس الحداثة
-        freshness_scores = [self._freshness_score(r) for r in recommendations]
-        freshness = np.mean(freshness_scores) if freshness_scores else 0
+        published_epoch = np.fromiter(
+            (parse_published_epoch(r.get('published_at')) for r in recommendations),
+            dtype=np.float64, count=len(recommendations)
+        )
+        freshness = float(np.mean(freshness_from_epochs(published_epoch)))
         
         return {
             'diversity': round(diversity, 2),
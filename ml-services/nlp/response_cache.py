@@ -0,0 +1,225 @@
+"""
+ذاكرة مؤقتة لنتائج التوصيات
+Versioned Recommendation Response Cache
+@version 3.0.0
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(*parts: Any) -> str:
+    """مفتاح ثابت من أجزاء قابلة للتحويل إلى JSON"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache(ABC):
+    """
+    الواجهة الأساسية للذاكرة المؤقتة
+
+    لكل مستخدم إصدار يزداد مع كل حدث جديد (invalidate_user) ويدخل في
+    المفتاح، فتُهمل النتائج القديمة دون البحث عنها وحذفها.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # العدّادات تُحدَّث من عدة خيوط (مجمّع المنفّذ)
+        self._counters_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self._get(key)
+        with self._counters_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def _count_invalidation(self) -> None:
+        with self._counters_lock:
+            self.invalidations += 1
+
+    @abstractmethod
+    def set(self, key: str, value: Dict) -> None:
+        """تخزين نتيجة"""
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[Dict]:
+        """قراءة نتيجة (None إذا لم توجد أو انتهت صلاحيتها)"""
+
+    @abstractmethod
+    def user_version(self, user_id: str) -> int:
+        """إصدار ملف المستخدم الحالي"""
+
+    @abstractmethod
+    def invalidate_user(self, user_id: str) -> None:
+        """إبطال نتائج المستخدم (عند وصول أحداث جديدة)"""
+
+    @abstractmethod
+    def invalidate_all(self) -> None:
+        """إبطال كل النتائج (عند تغير المقالات)"""
+
+    def stats(self) -> Dict:
+        with self._counters_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'backend': self.__class__.__name__,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+            'invalidations': self.invalidations,
+        }
+
+
+class NullResponseCache(ResponseCache):
+    """ذاكرة مؤقتة معطلة (كل طلب يُحسب من جديد)"""
+
+    def set(self, key: str, value: Dict) -> None:
+        pass
+
+    def _get(self, key: str) -> Optional[Dict]:
+        return None
+
+    def user_version(self, user_id: str) -> int:
+        return 0
+
+    def invalidate_user(self, user_id: str) -> None:
+        pass
+
+    def invalidate_all(self) -> None:
+        pass
+
+    def stats(self) -> Dict:
+        return {**super().stats(), 'backend': 'disabled'}
+
+
+class InMemoryResponseCache(ResponseCache):
+    """ذاكرة LRU داخل العملية مع مدة صلاحية (الافتراضي)"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 60.0):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # المفتاح -> (وقت الانتهاء، القيمة)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._user_versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def user_version(self, user_id: str) -> int:
+        return self._user_versions.get(user_id, 0)
+
+    def invalidate_user(self, user_id: str) -> None:
+        with self._lock:
+            self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+        self._count_invalidation()
+
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        self._count_invalidation()
+
+    def stats(self) -> Dict:
+        return {
+            **super().stats(),
+            'backend': 'memory',
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+        }
+
+
+class RedisResponseCache(ResponseCache):
+    """ذاكرة مؤقتة مشتركة بين العمال في Redis (قيم JSON بمدة صلاحية)"""
+
+    def __init__(self, url: str, ttl_seconds: float = 60.0, key_prefix: str = 'ml:recommendations:'):
+        super().__init__()
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+
+    def _get(self, key: str) -> Optional[Dict]:
+        payload = self.client.get(f"{self.key_prefix}{self._generation()}:{key}")
+        return json.loads(payload) if payload is not None else None
+
+    def set(self, key: str, value: Dict) -> None:
+        self.client.set(
+            f"{self.key_prefix}{self._generation()}:{key}",
+            json.dumps(value, ensure_ascii=False),
+            ex=max(int(self.ttl_seconds), 1)
+        )
+
+    def _generation(self) -> int:
+        return int(self.client.get(f"{self.key_prefix}generation") or 0)
+
+    def user_version(self, user_id: str) -> int:
+        return int(self.client.get(f"{self.key_prefix}user:{user_id}") or 0)
+
+    def invalidate_user(self, user_id: str) -> None:
+        self.client.incr(f"{self.key_prefix}user:{user_id}")
+        self._count_invalidation()
+
+    def invalidate_all(self) -> None:
+        # المفاتيح القديمة تنتهي صلاحيتها تلقائياً
+        self.client.incr(f"{self.key_prefix}generation")
+        self._count_invalidation()
+
+    def stats(self) -> Dict:
+        return {**super().stats(), 'backend': 'redis', 'ttl_seconds': self.ttl_seconds}
+
+
+def create_response_cache(url: Optional[str] = None) -> ResponseCache:
+    """
+    إنشاء الذاكرة المؤقتة حسب الرابط
+
+    Args:
+        url: memory:// أو redis://host:port أو none لتعطيلها
+             (الافتراضي من متغير البيئة RESPONSE_CACHE_URL)
+    """
+    url = url or os.getenv('RESPONSE_CACHE_URL', 'memory://')
+    ttl_seconds = float(os.getenv('RESPONSE_CACHE_TTL', '60'))
+
+    if url in ('none', 'off', 'disabled'):
+        return NullResponseCache()
+
+    if url.startswith(('redis://', 'rediss://')):
+        logger.info("Using Redis response cache")
+        return RedisResponseCache(url, ttl_seconds=ttl_seconds)
+
+    return InMemoryResponseCache(
+        max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '10000')),
+        ttl_seconds=ttl_seconds
+    )
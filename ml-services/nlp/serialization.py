@@ -0,0 +1,59 @@
+"""
+ترميز JSON سريع للطلبات والردود الكبيرة
+Fast JSON Encoding for Large Payloads
+@version 3.0.0
+"""
+
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # المكتبة اختيارية، ونرجع إلى json القياسية
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+
+
+def _default(value: Any) -> Any:
+    # قيم NumPy المفردة والمصفوفات التي قد تصل من طبقة الحساب
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value: Any) -> bytes:
+    """ترميز القيمة إلى JSON (UTF-8) عبر orjson إن توفرت"""
+    if orjson is not None:
+        return orjson.dumps(
+            value, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(value, ensure_ascii=False, default=_default).encode('utf-8')
+
+
+def loads(data: bytes) -> Any:
+    """فك ترميز JSON عبر orjson إن توفرت"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """رد JSON يُرمَّز بـ dumps (orjson إن توفرت) بدل json القياسية"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def project_fields(items: Iterable[Dict], fields: Optional[List[str]]) -> List[Dict]:
+    """
+    الإبقاء على الحقول المطلوبة فقط من كل عنصر
+
+    مثل fields=["id", "recommendation_score", "recommendation_reason"] بدل إرجاع
+    المقال كاملاً. None يعيد العناصر كما هي.
+    """
+    if fields is None:
+        return list(items)
+    return [{field: item[field] for field in fields if field in item} for item in items]
@@ -9,15 +9,30 @@ from typing import Dict, List, Any, Optional
 from collections import Counter
 import numpy as np
 
+from .document_frequency import CORPUS_DOCUMENT_FREQUENCY, DocumentFrequency
+from .entity_extraction import (
+    ARABIC_KEYWORD_START, ARABIC_WORD_START, ASCII_TOKEN_START, EntityExtractor, arabic_words
+)
+from .lexicon import LexiconMatcher, LexiconMatches
+from .text_normalization import TEXT_NORMALIZER, AnalyzedDocument, TextInput, source_text
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
 class TextAnalyzer:
     """محلل النصوص المتقدم للمحتوى العربي"""
     
-    def __init__(self):
-        """تهيئة محلل النصوص"""
+    def __init__(self, document_frequency: Optional[DocumentFrequency] = None):
+        """تهيئة محلل النصوص (document_frequency: جدول المدونة لحساب IDF)"""
         try:
+            # Shared normalizer: each text is cleaned and tokenized once
+            self.normalizer = TEXT_NORMALIZER
+            
+            # Corpus document frequencies for keyword IDF
+            self.document_frequency = (
+                CORPUS_DOCUMENT_FREQUENCY if document_frequency is None else document_frequency
+            )
+            
             # Sentiment analysis keywords
             self.positive_words = {
                 'ممتاز', 'رائع', 'عظيم', 'جيد', 'مفيد', 'ناجح', 'إيجابي', 'سعيد',
@@ -36,46 +51,50 @@ class TextAnalyzer:
                 'بسيط', 'مباشر', 'صريح', 'واقعي', 'حقيقي', 'فعلي', 'أساسي'
             }
             
-            # Entity patterns for Arabic text
+            # Entity patterns for Arabic text, in match priority order: where two
+            # patterns match at the same position the earlier one wins. Arabic
+            # keywords match at a word start (after an attached و/ب/ال... prefix),
+            # and name tails are bounded to three words instead of [أ-ي\s]+.
+            token = ASCII_TOKEN_START
+            keyword = ARABIC_KEYWORD_START
+            entity_name = arabic_words(3)
             self.entity_patterns = {
-                'person': [
-                    r'(?:الدكتور|الأستاذ|المهندس|الطبيب)\s+([أ-ي\s]+)',
-                    r'([أ-ي]+\s+[أ-ي]+)(?:\s+قال|أضاف|ذكر|أشار)',
-                    r'(?:السيد|السيدة)\s+([أ-ي\s]+)',
+                'url': [
+                    rf'{token}https?://[^\s]+',
+                    rf'{token}www\.[^\s]+',
                 ],
-                'organization': [
-                    r'(?:شركة|مؤسسة|منظمة|جمعية|هيئة|وزارة|مجلس)\s+([أ-ي\s]+)',
-                    r'(?:جامعة|معهد|مركز|مستشفى|مدرسة)\s+([أ-ي\s]+)',
-                    r'(?:بنك|مصرف)\s+([أ-ي\s]+)',
+                'email': [
+                    rf'{token}[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{{2,}}',
                 ],
-                'location': [
-                    r'(?:مدينة|محافظة|منطقة|إقليم|دولة|بلد)\s+([أ-ي\s]+)',
-                    r'(?:في|إلى|من)\s+(الرياض|جدة|مكة|المدينة|الدمام|تبوك|أبها|حائل|الطائف)',
-                    r'(?:شارع|طريق|حي)\s+([أ-ي\s]+)',
+                'phone': [
+                    rf'{token}(?:\+966|0096656)\d{{8}}',
+                    rf'{token}05\d{{8}}',
+                    rf'{token}\d{{3}}-\d{{3}}-\d{{4}}',
+                ],
+                'money': [
+                    rf'{token}\d+(?:,\d{{3}})*\s*(?:ريال|دولار|يورو|دينار|درهم)',
+                    rf'{keyword}(?:مليون|مليار|ألف)\s+(?:ريال|دولار|يورو)',
                 ],
                 'date': [
-                    r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}',
-                    r'\d{4}[/-]\d{1,2}[/-]\d{1,2}',
-                    r'(?:يوم|أمس|اليوم|غداً|بعد غد)',
-                    r'(?:الإثنين|الثلاثاء|الأربعاء|الخميس|الجمعة|السبت|الأحد)',
+                    rf'{token}\d{{1,2}}[/-]\d{{1,2}}[/-]\d{{2,4}}',
+                    rf'{token}\d{{4}}[/-]\d{{1,2}}[/-]\d{{1,2}}',
+                    rf'{keyword}(?:يوم|أمس|اليوم|غداً|بعد غد|الإثنين|الثلاثاء|الأربعاء|الخميس|الجمعة|السبت|الأحد)',
                 ],
-                'money': [
-                    r'\d+(?:,\d{3})*\s*(?:ريال|دولار|يورو|دينار|درهم)',
-                    r'(?:مليون|مليار|ألف)\s+(?:ريال|دولار|يورو)',
+                'organization': [
+                    rf'{keyword}(?:شركة|مؤسسة|منظمة|جمعية|هيئة|وزارة|مجلس|جامعة|معهد|مركز|مستشفى|مدرسة|بنك|مصرف)'
+                    rf'\s+({entity_name})',
                 ],
-                'phone': [
-                    r'(?:\+966|0096656)\d{8}',
-                    r'05\d{8}',
-                    r'\d{3}-\d{3}-\d{4}',
+                'location': [
+                    rf'{keyword}(?:مدينة|محافظة|منطقة|إقليم|دولة|بلد|شارع|طريق|حي)\s+({entity_name})',
+                    rf'{keyword}(?:في|إلى|من)\s+(الرياض|جدة|مكة|المدينة|الدمام|تبوك|أبها|حائل|الطائف)',
                 ],
-                'email': [
-                    r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}',
+                'person': [
+                    rf'{keyword}(?:الدكتور|الأستاذ|المهندس|الطبيب|السيد|السيدة)\s+({entity_name})',
+                    rf'{ARABIC_WORD_START}([أ-ي]+\s+[أ-ي]+)(?=\s+(?:قال|أضاف|ذكر|أشار))',
                 ],
-                'url': [
-                    r'https?://[^\s]+',
-                    r'www\.[^\s]+',
-                ]
             }
+            # All patterns compiled into one alternation, scanned once per text
+            self.entity_extractor = EntityExtractor(self.entity_patterns, re.IGNORECASE)
             
             # Category keywords for text classification
             self.category_keywords = {
@@ -109,36 +128,45 @@ class TextAnalyzer:
                 }
             }
             
+            # All lexicons compiled into one matcher, so sentiment, classification
+            # and tag suggestions share a single pass over the tokens
+            self.lexicon = LexiconMatcher({
+                ('sentiment', 'positive'): self.positive_words,
+                ('sentiment', 'negative'): self.negative_words,
+                ('sentiment', 'neutral'): self.neutral_words,
+                **{
+                    ('category', category): data['keywords']
+                    for category, data in self.category_keywords.items()
+                }
+            })
+            
             logger.info("Text Analyzer initialized successfully")
             
         except Exception as e:
             logger.error(f"Error initializing Text Analyzer: {str(e)}")
             raise
     
-    def clean_text(self, text: str) -> str:
+    def clean_text(self, text: TextInput) -> str:
         """تنظيف النص"""
-        # Remove diacritics
-        text = re.sub(r'[ًٌٍَُِّْ]', '', text)
-        
-        # Normalize Arabic characters
-        text = re.sub(r'[إأآا]', 'ا', text)
-        text = re.sub(r'ى', 'ي', text)
-        text = re.sub(r'ة', 'ه', text)
-        
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text.strip())
-        
-        return text
+        return self.analyze_document(text).text
+    
+    def analyze_document(self, text: TextInput) -> AnalyzedDocument:
+        """تطبيع النص وتقطيعه مرة واحدة لتمريره إلى كل التحليلات"""
+        return self.normalizer.analyze(text)
+    
+    def match_lexicons(self, text: TextInput) -> LexiconMatches:
+        """مطابقة كل قوائم الكلمات مع النص المنظف في مرور واحد"""
+        return self.lexicon.match_tokens(self.analyze_document(text).tokens)
     
-    def analyze_sentiment(self, text: str) -> Dict[str, Any]:
-        """تحليل المشاعر في النص"""
+    def analyze_sentiment(self, text: TextInput, matches: Optional[LexiconMatches] = None) -> Dict[str, Any]:
+        """تحليل المشاعر في النص (matches: نتيجة match_lexicons إن حُسبت مسبقاً)"""
         try:
-            cleaned_text = self.clean_text(text).lower()
-            words = cleaned_text.split()
+            if matches is None:
+                matches = self.match_lexicons(text)
             
-            positive_count = sum(1 for word in words if word in self.positive_words)
-            negative_count = sum(1 for word in words if word in self.negative_words)
-            neutral_count = sum(1 for word in words if word in self.neutral_words)
+            positive_count = matches.count(('sentiment', 'positive'))
+            negative_count = matches.count(('sentiment', 'negative'))
+            neutral_count = matches.count(('sentiment', 'neutral'))
             
             total_sentiment_words = positive_count + negative_count + neutral_count
             
@@ -167,7 +195,7 @@ class TextAnalyzer:
                     'positive_words': positive_count,
                     'negative_words': negative_count,
                     'neutral_words': neutral_count,
-                    'total_words': len(words)
+                    'total_words': matches.total_tokens
                 }
             }
             
@@ -183,8 +211,8 @@ class TextAnalyzer:
                 'error': str(e)
             }
     
-    def extract_entities(self, text: str) -> Dict[str, List[str]]:
-        """استخراج الكيانات المسماة"""
+    def extract_entities(self, text: TextInput) -> Dict[str, List[str]]:
+        """استخراج الكيانات المسماة (من النص الأصلي قبل التطبيع)"""
         try:
             entities = {
                 'person': [],
@@ -197,23 +225,7 @@ class TextAnalyzer:
                 'url': []
             }
             
-            for entity_type, patterns in self.entity_patterns.items():
-                for pattern in patterns:
-                    matches = re.findall(pattern, text, re.IGNORECASE)
-                    if matches:
-                        if isinstance(matches[0], tuple):
-                            # If pattern has groups, extract the groups
-                            entities[entity_type].extend([match[0] if match[0] else match for match in matches])
-                        else:
-                            # If pattern doesn't have groups, use the whole match
-                            entities[entity_type].extend(matches)
-            
-            # Clean and deduplicate entities
-            for entity_type in entities:
-                entities[entity_type] = list(set([
-                    entity.strip() for entity in entities[entity_type] 
-                    if entity and entity.strip()
-                ]))
+            entities.update(self.entity_extractor.extract(source_text(text)))
             
             logger.info(f"Extracted {sum(len(v) for v in entities.values())} entities")
             return entities
@@ -222,11 +234,10 @@ class TextAnalyzer:
             logger.error(f"Error extracting entities: {str(e)}")
             return {entity_type: [] for entity_type in self.entity_patterns.keys()}
     
-    def extract_keywords(self, text: str, max_keywords: int = 10) -> List[Dict[str, Any]]:
+    def extract_keywords(self, text: TextInput, max_keywords: int = 10) -> List[Dict[str, Any]]:
         """استخراج الكلمات المفتاحية مع درجات الأهمية"""
         try:
-            cleaned_text = self.clean_text(text).lower()
-            words = cleaned_text.split()
+            words = self.analyze_document(text).tokens
             
             # Remove common stop words
             stop_words = {
@@ -243,22 +254,25 @@ class TextAnalyzer:
             
             # Calculate word frequencies
             word_freq = Counter(filtered_words)
+            if not word_freq:
+                return []
             
-            # Calculate TF-IDF-like scores
+            # TF-IDF against the corpus document frequencies (ties keep frequency order)
             total_words = len(filtered_words)
-            keywords = []
+            ranked = word_freq.most_common()
+            idf_scores = self.document_frequency.idf_many(word for word, _ in ranked)
+            importance = np.array([freq for _, freq in ranked]) / total_words * idf_scores
+            order = np.argsort(-importance, kind='stable')[:max_keywords]
             
-            for word, freq in word_freq.most_common(max_keywords):
-                tf_score = freq / total_words
-                # Simple IDF approximation (can be improved with a larger corpus)
-                idf_score = np.log(total_words / freq) if freq > 0 else 0
-                importance = tf_score * idf_score
-                
+            keywords = []
+            for i in order:
+                word, freq = ranked[i]
                 keywords.append({
                     'word': word,
                     'frequency': freq,
-                    'importance': round(importance, 4),
-                    'tf_score': round(tf_score, 4)
+                    'importance': round(float(importance[i]), 4),
+                    'tf_score': round(freq / total_words, 4),
+                    'idf_score': round(float(idf_scores[i]), 4)
                 })
             
             logger.info(f"Extracted {len(keywords)} keywords")
@@ -268,24 +282,24 @@ class TextAnalyzer:
             logger.error(f"Error extracting keywords: {str(e)}")
             return []
     
-    def classify_text(self, text: str) -> Dict[str, Any]:
-        """تصنيف النص إلى فئات"""
+    def classify_text(self, text: TextInput, matches: Optional[LexiconMatches] = None) -> Dict[str, Any]:
+        """تصنيف النص إلى فئات (matches: نتيجة match_lexicons إن حُسبت مسبقاً)"""
         try:
-            cleaned_text = self.clean_text(text).lower()
-            words = set(cleaned_text.split())
+            if matches is None:
+                matches = self.match_lexicons(text)
             
             category_scores = {}
             
             for category, data in self.category_keywords.items():
-                category_words = set(data['keywords'])
-                overlap = words & category_words
+                label = ('category', category)
+                overlap = matches.matched_words(label)
                 
                 if overlap:
                     # Calculate score based on word overlap and weights
-                    score = len(overlap) / len(category_words) * data['weight']
+                    score = len(overlap) / self.lexicon.lexicon_size(label) * data['weight']
                     category_scores[category] = {
                         'score': round(score, 4),
-                        'matched_words': list(overlap)
+                        'matched_words': overlap
                     }
             
             # Sort categories by score
@@ -316,12 +330,35 @@ class TextAnalyzer:
                 'error': str(e)
             }
     
-    def analyze_text_quality(self, text: str) -> Dict[str, Any]:
+    def suggest_tags(self, text: TextInput, matches: Optional[LexiconMatches] = None,
+                     max_tags: int = 5) -> List[str]:
+        """اقتراح وسوم من كلمات التصنيفات الأكثر ظهوراً في النص"""
+        if matches is None:
+            matches = self.match_lexicons(text)
+        
+        frequencies = Counter()
+        for category in self.category_keywords:
+            frequencies.update(matches.words.get(('category', category), {}))
+        
+        return [word for word, _ in frequencies.most_common(max_tags)]
+    
+    def analyze_content(self, text: TextInput) -> Dict[str, Any]:
+        """تحليل المشاعر والتصنيف واقتراح الوسوم من مطابقة واحدة للنص"""
+        document = self.analyze_document(text)
+        matches = self.match_lexicons(document)
+        
+        return {
+            'sentiment': self.analyze_sentiment(document, matches),
+            'classification': self.classify_text(document, matches),
+            'suggested_tags': self.suggest_tags(document, matches)
+        }
+    
+    def analyze_text_quality(self, text: TextInput) -> Dict[str, Any]:
         """تحليل جودة النص"""
         try:
-            cleaned_text = self.clean_text(text)
-            sentences = [s.strip() for s in cleaned_text.split('.') if s.strip()]
-            words = cleaned_text.split()
+            document = self.analyze_document(text)
+            sentences = document.sentence_spans
+            words = document.tokens
             
             # Basic metrics
             avg_sentence_length = len(words) / len(sentences) if sentences else 0
@@ -355,7 +392,7 @@ class TextAnalyzer:
                 'readability': readability,
                 'readability_score': readability_score,
                 'metrics': {
-                    'total_characters': len(text),
+                    'total_characters': len(document.source),
                     'total_words': len(words),
                     'total_sentences': len(sentences),
                     'unique_words': unique_words,
@@ -0,0 +1,199 @@
+"""
+تطبيع النص العربي وتقطيعه مرة واحدة لكل مستند
+Shared Arabic Normalization and Tokenization
+@version 3.0.0
+"""
+
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple, Union
+
+# علامات التشكيل (نفس مجموعة pyarabic.araby.DIACRITICS): الحركات والتنوين
+# والشدة والسكون والألف الخنجرية وعلامات المصحف
+DIACRITIC_RANGES = (
+    (0x0610, 0x061A), (0x064B, 0x065F), (0x0670, 0x0670), (0x06D6, 0x06DC),
+    (0x06DF, 0x06E4), (0x06E7, 0x06E8), (0x06EA, 0x06ED),
+)
+
+# كتل الحروف العربية (الأساسية، الملحق، الموسعة-أ، أشكال العرض أ وب)
+ARABIC_SCRIPT_RANGES = (
+    (0x0600, 0x06FF), (0x0750, 0x077F), (0x08A0, 0x08FF), (0xFB50, 0xFDFF), (0xFE70, 0xFEFF),
+)
+
+# توحيد أشكال الألف والياء والتاء المربوطة
+LETTER_NORMALIZATION = {'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ى': 'ي', 'ة': 'ه'}
+
+ARABIC_DIGITS = '٠١٢٣٤٥٦٧٨٩'
+
+SENTENCE_TERMINATORS = '.!?؟'
+# علامات الترقيم التي تُزال من أطراف الكلمات
+WORD_PUNCTUATION = '.،,؛;:!?؟"\'()[]{}«»-'
+
+# جملة: نص حتى علامات نهايتها (ضمناً)
+_SENTENCE = re.compile(rf'[^{re.escape(SENTENCE_TERMINATORS)}]+[{re.escape(SENTENCE_TERMINATORS)}]*')
+
+
+class AnalyzedDocument:
+    """
+    نص مطبّع مع رموزه وحدود جمله، يُمرَّر بين طرق التحليل بدل النص الخام
+
+    source هو النص الأصلي (للكيانات والمقاييس على النص كما كُتب)، وtext النص
+    المطبّع، وtokens كلماته المفصولة بالمسافات، وsentence_spans مواضع الجمل
+    (بداية، نهاية) في text بعلامات نهايتها. الكلمات دون علامات الترقيم وكلمات كل جملة تُحسب
+    عند أول طلب وتُحفظ.
+    """
+
+    __slots__ = ('source', 'text', 'tokens', 'sentence_spans', 'normalizer_key', '_words', '_sentence_words')
+
+    def __init__(self, source: str, tokens: Tuple[str, ...], normalizer_key: Tuple):
+        self.source = source
+        self.text = text = ' '.join(tokens)
+        self.tokens = tokens
+        self.sentence_spans: Tuple[Tuple[int, int], ...] = tuple(_sentence_spans(text))
+        self.normalizer_key = normalizer_key
+        self._words: Optional[Tuple[str, ...]] = None
+        self._sentence_words: Optional[Tuple[Tuple[str, ...], ...]] = None
+
+    @property
+    def sentences(self) -> List[str]:
+        return [self.text[start:end] for start, end in self.sentence_spans]
+
+    @property
+    def words(self) -> Tuple[str, ...]:
+        """الرموز بعد إزالة علامات الترقيم من أطرافها (وحذف الرموز الفارغة)"""
+        if self._words is None:
+            self._words = _strip_punctuation(self.tokens)
+        return self._words
+
+    @property
+    def sentence_words(self) -> Tuple[Tuple[str, ...], ...]:
+        """كلمات كل جملة بترتيب sentence_spans"""
+        if self._sentence_words is None:
+            self._sentence_words = tuple(
+                _strip_punctuation(self.text[start:end].split()) for start, end in self.sentence_spans
+            )
+        return self._sentence_words
+
+
+# نص خام أو مستند محلل؛ كل طرق التحليل تقبل أياً منهما
+TextInput = Union[str, AnalyzedDocument]
+
+
+def _sentence_spans(text: str) -> Iterable[Tuple[int, int]]:
+    for match in _SENTENCE.finditer(text):
+        start, end = match.span()
+        sentence = match.group()
+        stripped = sentence.strip()
+        if stripped.rstrip(SENTENCE_TERMINATORS).strip():
+            start += len(sentence) - len(sentence.lstrip())
+            yield start, start + len(stripped)
+
+
+def _strip_punctuation(tokens: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(word for word in (token.strip(WORD_PUNCTUATION) for token in tokens) if word)
+
+
+class _TranslationTable(dict):
+    """
+    جدول str.translate يحذف الرموز خارج النطاقات المسموحة
+
+    يُقرر مصير كل رمز عند أول ظهور له ثم يُحفظ، فتبقى الترجمة بحثاً في قاموس.
+    """
+
+    def __init__(self, mapping, keep_ranges, keep_chars: str):
+        super().__init__(mapping)
+        self._keep_ranges = keep_ranges
+        self._keep_chars = keep_chars
+
+    def __missing__(self, codepoint: int):
+        char = chr(codepoint)
+        keep = (
+            char.isspace() or char in self._keep_chars
+            or any(low <= codepoint <= high for low, high in self._keep_ranges)
+        )
+        value = codepoint if keep else None
+        self[codepoint] = value
+        return value
+
+
+class ArabicNormalizer:
+    """
+    تطبيع النص العربي بجدول str.translate واحد وتعبير نمطي واحد
+
+    الجدول يحذف التشكيل ويوحد الحروف (normalize_letters) ويحول الأرقام
+    اللاتينية إلى عربية (arabic_digits) ويحذف الرموز خارج keep_ranges
+    وkeep_chars إن حُددت. التعبير النمطي يحدد مواضع الرموز التي يغيرها الجدول
+    فتُترجم هذه المقاطع وحدها، ثم يوحد التقطيع على المسافات المسافاتِ ويعطي
+    الرموز معاً. analyze يعيد AnalyzedDocument ويحفظ آخر cache_size مستنداً،
+    فيُطبّع النص ويُقطّع مرة واحدة مهما تعددت التحليلات.
+    """
+
+    def __init__(self, normalize_letters: bool = True, lowercase: bool = True,
+                 arabic_digits: bool = False, keep_ranges: Optional[Tuple[Tuple[int, int], ...]] = None,
+                 keep_chars: str = '', cache_size: int = 256):
+        self.lowercase = lowercase
+        self.key = (normalize_letters, lowercase, arabic_digits, keep_ranges, keep_chars)
+
+        mapping = {
+            codepoint: None
+            for low, high in DIACRITIC_RANGES
+            for codepoint in range(low, high + 1)
+        }
+        if normalize_letters:
+            mapping.update(str.maketrans(LETTER_NORMALIZATION))
+        if arabic_digits:
+            mapping.update(str.maketrans('0123456789', ARABIC_DIGITS))
+
+        changed = '[' + ''.join(re.escape(chr(codepoint)) for codepoint in mapping) + ']'
+        if keep_ranges is None:
+            self._table = mapping
+        else:
+            self._table = _TranslationTable(mapping, keep_ranges, keep_chars)
+            kept = ''.join(
+                f'{re.escape(chr(low))}-{re.escape(chr(high))}' for low, high in keep_ranges
+            ) + re.escape(keep_chars)
+            changed = rf'(?:{changed}|[^{kept}\s])'
+        self._changed = re.compile(changed + '+')
+        self._analyze = lru_cache(maxsize=cache_size)(self._build_document)
+
+    def normalize(self, text: str) -> str:
+        """النص المطبّع (دون بناء مستند)"""
+        return ' '.join(self._tokens(text))
+
+    def analyze(self, text: TextInput) -> AnalyzedDocument:
+        """
+        مستند محلل للنص؛ المستند الناتج عن نفس إعدادات التطبيع يُعاد كما هو،
+        ومستند من تطبيع آخر يُعاد تحليله من نصه الأصلي
+        """
+        if isinstance(text, AnalyzedDocument):
+            if text.normalizer_key == self.key:
+                return text
+            text = text.source
+        return self._analyze(text)
+
+    def cache_info(self):
+        return self._analyze.cache_info()
+
+    def _tokens(self, text: str) -> Tuple[str, ...]:
+        table = self._table
+        text = self._changed.sub(lambda match: match.group().translate(table), text)
+        if self.lowercase:
+            text = text.lower()
+        return tuple(text.split())
+
+    def _build_document(self, text: str) -> AnalyzedDocument:
+        return AnalyzedDocument(text, self._tokens(text), self.key)
+
+
+def source_text(text: TextInput) -> str:
+    """النص الأصلي لنص أو مستند محلل"""
+    return text.source if isinstance(text, AnalyzedDocument) else text
+
+
+# التطبيع المشترك لتحليل النصوص (TextAnalyzer وNLPService)
+TEXT_NORMALIZER = ArabicNormalizer()
+
+# تطبيع مميزات توقع الأداء: الحروف كما هي، أرقام عربية، وحذف كل ما ليس عربياً
+FEATURE_NORMALIZER = ArabicNormalizer(
+    normalize_letters=False, lowercase=False, arabic_digits=True, keep_ranges=ARABIC_SCRIPT_RANGES
+)
@@ -0,0 +1,105 @@
+"""
+تحليل النص بمراحل على تقطيع واحد
+Staged Text Analysis Pipeline
+@version 3.0.0
+"""
+
+import time
+from typing import Any, Callable, Dict, Iterable, Literal, Optional, get_args
+
+from .lexicon import LexiconMatches
+from .nlp_service import NLPService
+from .text_api import TextAnalyzer
+from .text_normalization import AnalyzedDocument, TextInput
+
+TextStage = Literal[
+    'sentiment', 'entities', 'keywords', 'classification', 'quality', 'readability', 'summary', 'tags'
+]
+
+# كل المراحل بترتيب التنفيذ الافتراضي
+ANALYSIS_STAGES = get_args(TextStage)
+
+# المراحل التي تحتاج مطابقة قوائم الكلمات (تُحسب مرة واحدة لها جميعاً)
+LEXICON_STAGES = frozenset({'sentiment', 'classification'})
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+class TextAnalysisPipeline:
+    """
+    يشغّل تحليلات TextAnalyzer وNLPService المطلوبة كمراحل على مستند واحد
+
+    يُطبّع النص ويُقطّع مرة واحدة (المحللان يشتركان في TEXT_NORMALIZER)،
+    وتُطابق قوائم الكلمات مرة واحدة إن طُلبت مرحلة تحتاجها، ثم تُمرَّر
+    النتيجتان إلى كل مرحلة. يُسجل زمن كل خطوة بالمللي ثانية.
+    """
+
+    def __init__(self, text_analyzer: Optional[TextAnalyzer] = None,
+                 nlp_service: Optional[NLPService] = None):
+        self.text_analyzer = text_analyzer or TextAnalyzer()
+        self.nlp_service = nlp_service or NLPService()
+
+        # المرحلة -> دالة (المستند، المطابقة، الخيارات)
+        self._stages: Dict[str, Callable[[AnalyzedDocument, Optional[LexiconMatches], Dict], Any]] = {
+            'sentiment': lambda document, matches, options:
+                self.text_analyzer.analyze_sentiment(document, matches),
+            'entities': lambda document, matches, options:
+                self.text_analyzer.extract_entities(document),
+            'keywords': lambda document, matches, options:
+                self.text_analyzer.extract_keywords(document, options['max_keywords']),
+            'classification': lambda document, matches, options:
+                self.text_analyzer.classify_text(document, matches),
+            'quality': lambda document, matches, options:
+                self.text_analyzer.analyze_text_quality(document),
+            'readability': lambda document, matches, options:
+                self.nlp_service.analyze_readability(document),
+            'summary': lambda document, matches, options:
+                self.nlp_service.summarize(document, options['summary_length']),
+            'tags': lambda document, matches, options:
+                self.nlp_service.generate_tags(document, options['max_tags']),
+        }
+
+    def run(self, text: TextInput, stages: Optional[Iterable[str]] = None,
+            max_keywords: int = 10, max_tags: int = 5, summary_length: int = 150) -> Dict[str, Any]:
+        """
+        تشغيل المراحل المطلوبة (كلها إن لم تُحدد) بترتيب طلبها
+
+        Raises:
+            ValueError: إذا طُلبت مرحلة غير معروفة
+        """
+        stages = list(dict.fromkeys(stages)) if stages else list(ANALYSIS_STAGES)
+        unknown = [stage for stage in stages if stage not in self._stages]
+        if unknown:
+            raise ValueError(f"Unknown analysis stages: {', '.join(unknown)}")
+
+        options = {'max_keywords': max_keywords, 'max_tags': max_tags, 'summary_length': summary_length}
+        timings: Dict[str, float] = {}
+        total_start = time.perf_counter()
+
+        start = time.perf_counter()
+        document = self.text_analyzer.analyze_document(text)
+        timings['normalize'] = _elapsed_ms(start)
+
+        matches = None
+        if LEXICON_STAGES.intersection(stages):
+            start = time.perf_counter()
+            matches = self.text_analyzer.match_lexicons(document)
+            timings['lexicons'] = _elapsed_ms(start)
+
+        analysis = {}
+        for stage in stages:
+            start = time.perf_counter()
+            analysis[stage] = self._stages[stage](document, matches, options)
+            timings[stage] = _elapsed_ms(start)
+
+        timings['total'] = _elapsed_ms(total_start)
+
+        return {
+            'analysis': analysis,
+            'stages': stages,
+            'timings_ms': timings,
+            'text_length': len(document.source),
+            'token_count': len(document.tokens)
+        }
@@ -0,0 +1,427 @@
+"""
+حساب درجات التوصية بشكل متجهي
+Vectorized (NumPy) Article Scoring
+@version 3.0.0
+"""
+
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+from scipy import sparse
+
+from .event_batch import event_article_ids
+from .vocabulary import VOCABULARY, SparseInterests, Vocabulary
+
+SECONDS_PER_DAY = 86400.0
+
+
+def parse_published_epoch(published_at: Optional[str]) -> float:
+    """تحويل تاريخ النشر إلى ثوانٍ منذ epoch (NaN إذا كان مفقوداً أو غير صالح)"""
+    if not published_at:
+        return np.nan
+
+    try:
+        return datetime.fromisoformat(published_at.replace('Z', '+00:00')).timestamp()
+    except (ValueError, TypeError, AttributeError):
+        return np.nan
+
+
+def freshness_from_epochs(published_epoch: np.ndarray, now: Optional[float] = None) -> np.ndarray:
+    """درجة الحداثة حسب عمر المقال بالأيام الكاملة (0 لتاريخ النشر المفقود)"""
+    now = time.time() if now is None else now
+    days_old = np.floor((now - published_epoch) / SECONDS_PER_DAY)
+
+    freshness = np.select(
+        [days_old < 1, days_old < 7, days_old < 30],
+        [1.0, 0.8, 0.5],
+        default=0.2
+    )
+    freshness[np.isnan(published_epoch)] = 0.0
+    return freshness
+
+
+def round_like_python(values: np.ndarray, ndigits: int = 3) -> np.ndarray:
+    """
+    تقريب مطابق لـ round() في بايثون
+
+    np.round قد يختلف عن round() عند القيم الواقعة على منتصف خانة التقريب،
+    لذلك نعيد تقريب تلك الحالات النادرة فقط عبر round().
+    """
+    rounded = np.round(values, ndigits)
+    scaled = values * (10 ** ndigits)
+    ambiguous = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for i in ambiguous:
+        rounded[i] = round(float(values[i]), ndigits)
+    return rounded
+
+
+class ArticleFeatures:
+    """
+    تمثيل عمودي للمقالات المرشحة
+
+    يُبنى مرة واحدة من قائمة المقالات، وتُخزن الأسماء (التصنيفات، الوسوم، الكتّاب)
+    كمعرفات صحيحة في المفردات المشتركة حتى تُحسب الدرجات بعمليات مصفوفية.
+    """
+
+    def __init__(
+        self,
+        articles: List[Dict],
+        published_epoch: Optional[np.ndarray] = None,
+        vocabulary: Optional[Vocabulary] = None
+    ):
+        """
+        Args:
+            articles: المقالات
+            published_epoch: تواريخ النشر محوّلة مسبقاً (مثل التي يحفظها الكتالوج عند الإضافة)
+            vocabulary: المفردات (الافتراضي المفردات المشتركة في العملية)
+        """
+        self.articles = articles
+        self.vocabulary = vocabulary or VOCABULARY
+        intern = self.vocabulary.intern
+
+        n = len(articles)
+        self.ids: List[str] = []
+        self.category_names: List[str] = []
+        self.category_ids = np.empty(n, dtype=np.int32)
+        self.author_ids = np.empty(n, dtype=np.int32)
+        self.tag_counts = np.zeros(n, dtype=np.int32)
+        self.view_counts = np.zeros(n, dtype=np.float64)
+        self.like_counts = np.zeros(n, dtype=np.float64)
+        self.comment_counts = np.zeros(n, dtype=np.float64)
+        self.published_epoch = np.empty(n, dtype=np.float64)
+
+        tag_rows = []
+        for i, article in enumerate(articles):
+            category = (article.get('category') or {}).get('name', '')
+            author = (article.get('author') or {}).get('name', '')
+            tags = article.get('tags') or []
+
+            self.ids.append(article.get('id', ''))
+            self.category_names.append(category)
+            self.category_ids[i] = intern(category)
+            self.author_ids[i] = intern(author)
+            tag_rows.append([intern(tag) for tag in tags])
+            self.tag_counts[i] = len(tags)
+
+            self.view_counts[i] = article.get('view_count', 0)
+            self.like_counts[i] = article.get('like_count', 0)
+            self.comment_counts[i] = article.get('comment_count', 0)
+            if published_epoch is None:
+                self.published_epoch[i] = parse_published_epoch(article.get('published_at'))
+
+        if published_epoch is not None:
+            self.published_epoch[:] = published_epoch
+
+        # عرض متجهات الاهتمام: كل معرفات هذه المقالات أصغر منه
+        self.n_terms = len(self.vocabulary)
+
+        # مصفوفة الوسوم مبطّنة بـ -1 (يشير إلى خانة وزنها صفر)
+        max_tags = int(self.tag_counts.max()) if n else 0
+        self.tag_ids = np.full((n, max(max_tags, 1)), -1, dtype=np.int32)
+        for i, row in enumerate(tag_rows):
+            self.tag_ids[i, :len(row)] = row
+
+        # درجة الشعبية لا تعتمد على المستخدم فتُحسب مرة واحدة
+        popularity = (
+            np.log(self.view_counts + 1) * 0.5 +
+            np.log(self.like_counts + 1) * 0.3 +
+            np.log(self.comment_counts + 1) * 0.2
+        )
+        self.popularity = np.minimum(popularity / 10, 1.0)
+        self._tag_matrix = None
+
+    def __len__(self) -> int:
+        return len(self.articles)
+
+    def take(self, indices: np.ndarray) -> 'ArticleFeatures':
+        """مجموعة جزئية من المقالات دون إعادة التحليل (المفردات مشتركة)"""
+        indices = np.asarray(indices, dtype=np.intp)
+        subset = ArticleFeatures.__new__(ArticleFeatures)
+        subset.vocabulary = self.vocabulary
+        subset.n_terms = self.n_terms
+        subset.articles = [self.articles[i] for i in indices]
+        subset.ids = [self.ids[i] for i in indices]
+        subset.category_names = [self.category_names[i] for i in indices]
+
+        for name in ('category_ids', 'author_ids', 'tag_counts', 'view_counts', 'like_counts',
+                     'comment_counts', 'published_epoch', 'tag_ids', 'popularity'):
+            setattr(subset, name, getattr(self, name)[indices])
+        subset._tag_matrix = None
+
+        return subset
+
+    @classmethod
+    def concat(cls, first: 'ArticleFeatures', second: 'ArticleFeatures') -> 'ArticleFeatures':
+        """ضم مقالات second بعد مقالات first دون إعادة التحليل (نفس المفردات)"""
+        combined = cls.__new__(cls)
+        combined.vocabulary = first.vocabulary
+        combined.n_terms = max(first.n_terms, second.n_terms)
+        combined.articles = first.articles + second.articles
+        combined.ids = first.ids + second.ids
+        combined.category_names = first.category_names + second.category_names
+
+        for name in ('category_ids', 'author_ids', 'tag_counts', 'view_counts', 'like_counts',
+                     'comment_counts', 'published_epoch', 'popularity'):
+            setattr(combined, name, np.concatenate([getattr(first, name), getattr(second, name)]))
+
+        # مصفوفة الوسوم بعرض الأكبر منهما
+        width = max(first.tag_ids.shape[1], second.tag_ids.shape[1])
+        combined.tag_ids = np.full((len(combined.ids), width), -1, dtype=np.int32)
+        combined.tag_ids[:len(first), :first.tag_ids.shape[1]] = first.tag_ids
+        combined.tag_ids[len(first):, :second.tag_ids.shape[1]] = second.tag_ids
+        combined._tag_matrix = None
+
+        return combined
+
+    def _sparse(self, user_interests: Union[Dict[str, float], SparseInterests]) -> SparseInterests:
+        if isinstance(user_interests, SparseInterests):
+            return user_interests
+        return SparseInterests.from_dict(user_interests, self.vocabulary)
+
+    def interest_vector(self, user_interests: Union[Dict[str, float], SparseInterests]) -> np.ndarray:
+        """متجه اهتمامات المستخدم على مفردات المقالات (الخانة الأخيرة للتبطين)"""
+        return self._sparse(user_interests).dense(self.n_terms)
+
+    def interest_matrix(
+        self,
+        interests_per_user: List[Union[Dict[str, float], SparseInterests]]
+    ) -> np.ndarray:
+        """مصفوفة اهتمامات عدة مستخدمين (صف لكل مستخدم) على مفردات المقالات"""
+        weights = np.zeros((len(interests_per_user), self.n_terms + 1), dtype=np.float64)
+        for row, user_interests in enumerate(interests_per_user):
+            interests = self._sparse(user_interests)
+            known = interests.ids < self.n_terms
+            weights[row, interests.ids[known]] = interests.weights[known]
+        return weights
+
+    def tag_matrix(self) -> sparse.csr_matrix:
+        """مصفوفة متفرقة (مقال × مصطلح) بعدد مرات ظهور كل وسم في المقال"""
+        if self._tag_matrix is None:
+            rows, columns = np.nonzero(self.tag_ids >= 0)
+            self._tag_matrix = sparse.csr_matrix(
+                (np.ones(rows.size), (rows, self.tag_ids[rows, columns])),
+                shape=(len(self), self.n_terms + 1)
+            )
+        return self._tag_matrix
+
+    def freshness(self, now: Optional[float] = None) -> np.ndarray:
+        """درجة الحداثة لكل مقال حسب عمره بالأيام"""
+        return freshness_from_epochs(self.published_epoch, now)
+
+
+class VectorizedScorer:
+    """حساب جميع مكونات درجة التوصية لكل المقالات دفعة واحدة"""
+
+    def __init__(self, algorithm_weights: Dict[str, float], freshness_weight: float):
+        self.algorithm_weights = algorithm_weights
+        self.freshness_weight = freshness_weight
+
+    def content_scores(
+        self,
+        features: ArticleFeatures,
+        weights: np.ndarray,
+        semantic_boost: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        category_scores = weights[features.category_ids]
+
+        tag_totals = weights[features.tag_ids].sum(axis=1)
+        tag_means = np.divide(
+            tag_totals, features.tag_counts,
+            out=np.zeros(len(features)), where=features.tag_counts > 0
+        )
+
+        author_scores = weights[features.author_ids]
+
+        score = category_scores * 0.4 + tag_means * 0.3 + author_scores * 0.3
+        score = score / 100
+
+        # التشابه الدلالي مع آخر قراءات المستخدم (موزوناً مسبقاً)
+        if semantic_boost is not None:
+            score = score + semantic_boost
+
+        return np.minimum(score, 1.0)
+
+    def collaborative_scores(
+        self,
+        features: ArticleFeatures,
+        user_events: List[Dict],
+        collaborative_model=None
+    ) -> np.ndarray:
+        interactions: Dict[str, int] = {}
+        for article_id in event_article_ids(user_events):
+            if article_id is not None:
+                interactions[article_id] = interactions.get(article_id, 0) + 1
+
+        counts = np.zeros(len(features), dtype=np.float64)
+        if interactions:
+            for i, article_id in enumerate(features.ids):
+                count = interactions.get(article_id)
+                if count:
+                    counts[i] = count
+
+        scores = np.minimum(counts * 0.1, 1.0)
+
+        # تشابه المقالات بالتفاعل المشترك بين المستخدمين (إن توفر النموذج)
+        if collaborative_model is not None:
+            scores = np.maximum(scores, collaborative_model.score(user_events, features.ids))
+
+        return scores
+
+    def diversity_scores(self, features: ArticleFeatures, weights: np.ndarray) -> np.ndarray:
+        return 1.0 - np.minimum(weights[features.category_ids] / 100, 1.0)
+
+    def score(
+        self,
+        features: ArticleFeatures,
+        user_interests: Dict[str, float],
+        user_events: List[Dict],
+        context_multiplier: float = 1.0,
+        now: Optional[float] = None,
+        collaborative_model=None,
+        semantic_boost: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        الدرجة الإجمالية لكل مقال (مطابقة لـ RecommendationEngine._calculate_article_score)
+        """
+        if not len(features):
+            return np.zeros(0)
+
+        weights = features.interest_vector(user_interests)
+
+        total = (
+            self.content_scores(features, weights, semantic_boost) * self.algorithm_weights['content_based'] +
+            self.collaborative_scores(features, user_events, collaborative_model) *
+            self.algorithm_weights['collaborative'] +
+            features.popularity * self.algorithm_weights['popularity'] +
+            self.diversity_scores(features, weights) * self.algorithm_weights['diversity']
+        )
+
+        total = (total * (1 + features.freshness(now) * self.freshness_weight) *
+                 context_multiplier)
+
+        return round_like_python(total, 3)
+
+    def score_batch(
+        self,
+        features: ArticleFeatures,
+        interests_per_user: List[Dict[str, float]],
+        events_per_user: List[List[Dict]],
+        context_multiplier: float = 1.0,
+        now: Optional[float] = None,
+        collaborative_model=None,
+        semantic_boost: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        درجات عدة مستخدمين على نفس المرشحين كمصفوفة (مستخدم × مقال)
+
+        مكونات المقالات (الشعبية، الحداثة، مصفوفة الوسوم) تُحسب مرة واحدة للدفعة،
+        ومكونات المستخدمين عمليات مصفوفية على مصفوفة الاهتمامات. النتائج مطابقة
+        لـ score لكل مستخدم حتى فروق التقريب في جمع الوسوم.
+        """
+        n_users, n_articles = len(interests_per_user), len(features)
+        if not n_users or not n_articles:
+            return np.zeros((n_users, n_articles))
+
+        weights = features.interest_matrix(interests_per_user)
+        category_weights = weights[:, features.category_ids]
+
+        # متوسط اهتمام المستخدم بوسوم كل مقال عبر ضرب متفرق واحد
+        tag_totals = (features.tag_matrix() @ weights.T).T
+        tag_means = np.divide(
+            tag_totals, features.tag_counts,
+            out=np.zeros((n_users, n_articles)), where=features.tag_counts > 0
+        )
+
+        content = (
+            category_weights * 0.4 + tag_means * 0.3 + weights[:, features.author_ids] * 0.3
+        ) / 100
+        if semantic_boost is not None:
+            content = content + semantic_boost
+        content = np.minimum(content, 1.0)
+
+        total = (
+            content * self.algorithm_weights['content_based'] +
+            self.collaborative_scores_batch(features, events_per_user, collaborative_model) *
+            self.algorithm_weights['collaborative'] +
+            features.popularity * self.algorithm_weights['popularity'] +
+            (1.0 - np.minimum(category_weights / 100, 1.0)) * self.algorithm_weights['diversity']
+        )
+
+        total = (total * (1 + features.freshness(now) * self.freshness_weight) *
+                 context_multiplier)
+
+        return round_like_python(total.ravel(), 3).reshape(total.shape)
+
+    def collaborative_scores_batch(
+        self,
+        features: ArticleFeatures,
+        events_per_user: List[List[Dict]],
+        collaborative_model=None
+    ) -> np.ndarray:
+        positions: Dict[str, List[int]] = {}
+        for i, article_id in enumerate(features.ids):
+            positions.setdefault(article_id, []).append(i)
+
+        counts = np.zeros((len(events_per_user), len(features)), dtype=np.float64)
+        for row, user_events in enumerate(events_per_user):
+            for article_id in event_article_ids(user_events):
+                for i in positions.get(article_id, ()):
+                    counts[row, i] += 1
+
+        scores = np.minimum(counts * 0.1, 1.0)
+
+        if collaborative_model is not None:
+            scores = np.maximum(scores, collaborative_model.score_batch(events_per_user, features.ids))
+
+        return scores
+
+
+def select_top_indices(
+    scores: np.ndarray,
+    category_ids: np.ndarray,
+    top_n: int,
+    per_category_cap: int = 2,
+    min_score: float = 0.0
+) -> List[int]:
+    """
+    اختيار أفضل N مقالات مع حد أقصى لكل تصنيف دون ترتيب كل المرشحين
+
+    نأخذ نافذة من أعلى الدرجات عبر np.partition ونرتبها فقط، ونطبق حد التصنيف
+    أثناء المرور عليها؛ وإذا استُنفدت النافذة بسبب الحد نوسّعها. الترتيب عند
+    التساوي حسب الموقع الأصلي (مطابق للترتيب المستقر).
+    """
+    eligible = np.flatnonzero(scores >= min_score)
+    total = eligible.size
+    if total == 0 or top_n <= 0:
+        return []
+
+    eligible_scores = scores[eligible]
+    window = min(total, max(top_n * per_category_cap * 2, 32))
+
+    while True:
+        if window < total:
+            threshold = np.partition(eligible_scores, total - window)[total - window]
+            candidates = eligible[eligible_scores >= threshold]
+        else:
+            candidates = eligible
+
+        ordered = candidates[np.lexsort((candidates, -scores[candidates]))]
+
+        selected = []
+        category_counts: Dict[int, int] = {}
+        for i in ordered:
+            category = category_ids[i]
+            count = category_counts.get(category, 0)
+            if count >= per_category_cap:
+                continue
+            selected.append(int(i))
+            category_counts[category] = count + 1
+            if len(selected) >= top_n:
+                return selected
+
+        if candidates.size >= total:
+            return selected
+
+        window = min(total, window * 4)
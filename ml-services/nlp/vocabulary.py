@@ -0,0 +1,103 @@
+"""
+مفردات مشتركة بمعرفات صحيحة
+Interned Vocabulary and Sparse Interest Vectors
+@version 3.0.0
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+class Vocabulary:
+    """
+    جدول مشترك يحوّل الأسماء (التصنيفات، المواضيع، الوسوم، الكتّاب) إلى معرفات
+    صحيحة متتالية
+
+    المعرفات لا تتغير بعد إسنادها، فتتشارك المقالات وحالات المستخدمين ونسخ
+    الكتالوج المتتالية نفس الترقيم، وتُخزن السلسلة النصية مرة واحدة فقط.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._terms: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._ids
+
+    def intern(self, term: str) -> int:
+        """معرف المصطلح، مع إضافته إذا كان جديداً"""
+        term_id = self._ids.get(term)
+        if term_id is None:
+            with self._lock:
+                term_id = self._ids.get(term)
+                if term_id is None:
+                    term_id = len(self._terms)
+                    self._terms.append(term)
+                    self._ids[term] = term_id
+        return term_id
+
+    def get(self, term: str, default: Optional[int] = None) -> Optional[int]:
+        """معرف المصطلح دون إضافته"""
+        return self._ids.get(term, default)
+
+    def term(self, term_id: int) -> str:
+        return self._terms[term_id]
+
+    def terms(self, term_ids: Iterable[int]) -> List[str]:
+        return [self._terms[term_id] for term_id in term_ids]
+
+
+class SparseInterests:
+    """
+    اهتمامات مستخدم كمصفوفتين متوازيتين (معرفات مرتبة، أوزان)
+
+    بديل مضغوط لقاموس {المصطلح: الدرجة}؛ يتحول إلى متجه كثيف على أي مجموعة
+    مقالات بعملية فهرسة واحدة.
+    """
+
+    __slots__ = ('ids', 'weights')
+
+    def __init__(self, ids: np.ndarray, weights: np.ndarray):
+        self.ids = ids
+        self.weights = weights
+
+    def __len__(self) -> int:
+        return int(self.ids.size)
+
+    @classmethod
+    def from_dict(cls, scores: Dict[str, float], vocabulary: Optional['Vocabulary'] = None) -> 'SparseInterests':
+        """تحويل قاموس الدرجات (المصطلحات غير الموجودة في المفردات تُهمل)"""
+        vocabulary = vocabulary or VOCABULARY
+        pairs = sorted(
+            (term_id, score)
+            for term_id, score in ((vocabulary.get(term), score) for term, score in scores.items())
+            if term_id is not None
+        )
+        return cls(
+            np.fromiter((term_id for term_id, _ in pairs), dtype=np.int32, count=len(pairs)),
+            np.fromiter((score for _, score in pairs), dtype=np.float64, count=len(pairs))
+        )
+
+    def to_dict(self, vocabulary: Optional['Vocabulary'] = None) -> Dict[str, float]:
+        vocabulary = vocabulary or VOCABULARY
+        return dict(zip(vocabulary.terms(self.ids.tolist()), self.weights.tolist()))
+
+    def dense(self, size: int) -> np.ndarray:
+        """
+        متجه كثيف بطول size + 1 (الخانة الأخيرة للتبطين)؛ المعرفات التي
+        أُضيفت للمفردات بعد بناء المقالات لا تطابق أي مقال فتُهمل
+        """
+        weights = np.zeros(size + 1, dtype=np.float64)
+        known = self.ids < size
+        weights[self.ids[known]] = self.weights[known]
+        return weights
+
+
+# المفردات المشتركة في العملية
+VOCABULARY = Vocabulary()
@@ -0,0 +1,1219 @@
+"""
+اختبارات نظام التوصيات وملفات اهتمام المستخدمين
+الغرض: اختبار مخزن الأحداث ومحرك التوصيات وواجهات /recommendations
+"""
+
+import os
+import random
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+# إضافة مسار المشروع
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from nlp.article_catalog import ArticleCatalog
+from nlp.article_embeddings import ArticleEmbeddingIndex, normalize_rows
+from nlp.collaborative_model import ItemCooccurrenceModel
+from nlp.event_batch import EventBatch
+from nlp.event_store import EventStore, InMemoryEventStore, SQLiteEventStore, create_event_store
+from nlp.executor import ExecutorSaturated, WorkloadExecutor, parse_limits
+from nlp.interest_model import EVENT_EPOCH_KEY, UserInterestModel, parse_timestamp
+from nlp.interest_state import InterestStateStore
+from nlp.recommendation_engine import RecommendationEngine
+from nlp.response_cache import InMemoryResponseCache, cache_key
+from nlp.vectorized_scoring import ArticleFeatures
+from nlp.vocabulary import SparseInterests
+
+
+def make_events():
+    """أحداث تجريبية لمستخدم واحد"""
+    return [
+        {
+            'event_type': 'article_view',
+            'event_data': {'category': 'تقنية', 'topic': 'ذكاء اصطناعي', 'tags': ['AI']},
+            'timestamp': '2024-01-15T10:00:00Z'
+        },
+        {
+            'event_type': 'article_like',
+            'event_data': {'category': 'تقنية', 'articleId': '1'},
+            'timestamp': '2024-01-15T10:05:00Z'
+        },
+        {
+            'event_type': 'reading_time',
+            'event_data': {'duration': 180, 'category': 'رياضة'},
+            'timestamp': '2024-01-15T10:03:00Z'
+        },
+    ]
+
+
+def make_articles():
+    """مقالات تجريبية"""
+    return [
+        {
+            'id': '1',
+            'title': 'مستقبل الذكاء الاصطناعي',
+            'category': {'name': 'تقنية'},
+            'tags': ['AI', 'تقنية'],
+            'view_count': 1500,
+            'like_count': 50,
+            'published_at': '2024-01-14T12:00:00Z'
+        },
+        {
+            'id': '2',
+            'title': 'أخبار الرياضة اليوم',
+            'category': {'name': 'رياضة'},
+            'tags': ['كرة القدم'],
+            'view_count': 800,
+            'like_count': 25,
+            'published_at': '2024-01-15T08:00:00Z'
+        },
+        {
+            'id': '3',
+            'title': 'أسواق المال',
+            'category': {'name': 'اقتصاد'},
+            'tags': [],
+            'view_count': 20,
+        },
+    ]
+
+
+class TestEventStore(unittest.TestCase):
+    """اختبارات مخزن الأحداث"""
+
+    def test_append_and_read_in_order(self):
+        """اختبار الإضافة والقراءة بنفس الترتيب"""
+        store = InMemoryEventStore()
+        events = make_events()
+        self.assertEqual(store.append('u1', events[:2]), 2)
+        self.assertEqual(store.append('u1', events[2:]), 3)
+        self.assertEqual(store.get_events('u1'), events)
+        self.assertEqual(store.get_events('unknown'), [])
+
+    def test_max_events_per_user(self):
+        """اختبار حذف الأحداث الأقدم عند تجاوز الحد"""
+        store = InMemoryEventStore(max_events_per_user=2)
+        store.append('u1', make_events())
+        self.assertEqual(store.count('u1'), 2)
+        self.assertEqual(store.get_events('u1'), make_events()[1:])
+
+    def test_events_returned_unchanged(self):
+        """اختبار إعادة الأحداث بكل حقولها كما أُضيفت (كمخزني Redis وSQLite)"""
+        store = InMemoryEventStore(max_events_per_user=10)
+        events = [
+            {
+                'event_type': 'search_query', 'article_id': '9', 'user_id': 'u1', 'session': i,
+                'event_data': {'query': 'الذكاء الاصطناعي', 'depth': 40, 'articleId': '7', 'extra': [i]},
+                'timestamp': '2024-01-15T13:00:00+03:00'
+            }
+            for i in range(100)
+        ]
+        for event in events:
+            store.append('u1', [event])
+        self.assertEqual(store.get_events('u1'), events[-10:])
+        self.assertEqual(store.stats()['events'], 10)
+
+    def test_article_names_bounded_by_live_events(self):
+        """اختبار عدم نمو مفردات المخزن بمعرفات الأحداث المحذوفة"""
+        store = InMemoryEventStore(max_events_per_user=10)
+        for i in range(1000):
+            store.append('u1', [{
+                'event_type': f'type-{i}',
+                'event_data': {'articleId': str(i), 'category': f'c-{i}', 'tags': [f't-{i}']}
+            }])
+
+        # تُضغط المفردات عند إعادة التخصيص، أي كل 64 حدثاً على الأكثر هنا
+        batch = store.get_batch('u1')
+        self.assertLessEqual(len(batch.article_names), 10 + 64)
+        self.assertLessEqual(len(batch.event_types), 10 + 64)
+        self.assertLessEqual(len(batch.terms), 2 * (10 + 64))
+        self.assertEqual(
+            list(UserInterestModel().compute_interest_score(batch))[:2], ['c-990', 'c-991']
+        )
+        self.assertEqual(batch.article_id_list(), [str(i) for i in range(990, 1000)])
+        self.assertEqual(batch.event_type_names(), [f'type-{i}' for i in range(990, 1000)])
+
+    def test_sqlite_backend(self):
+        """اختبار مخزن SQLite"""
+        with tempfile.TemporaryDirectory() as tmp:
+            store = create_event_store(f"sqlite:///{os.path.join(tmp, 'events.db')}", max_events_per_user=2)
+            self.assertIsInstance(store, SQLiteEventStore)
+            store.append('u1', make_events())
+            self.assertEqual(store.get_events('u1'), make_events()[1:])
+            store.clear('u1')
+            self.assertEqual(store.count('u1'), 0)
+
+    def test_incomplete_backend_fails_on_construction(self):
+        """اختبار رفض إنشاء مخزن لا ينفذ كل طرق الواجهة"""
+        class PartialStore(EventStore):
+            def append(self, user_id, events):
+                return len(events)
+
+        with self.assertRaises(TypeError):
+            PartialStore()
+
+    def test_columnar_batches(self):
+        """اختبار نوافذ EventBatch دون نسخ وبقاء اللقطات السابقة ثابتة"""
+        store = InMemoryEventStore(max_events_per_user=100)
+        events = TestInterestState().make_history(400)
+        model = UserInterestModel()
+        now = datetime.now(timezone.utc).timestamp()
+
+        snapshots = []
+        for start in range(0, len(events), 37):
+            store.append('u1', events[start:start + 37])
+            snapshots.append((store.get_batch('u1'), store.get_events('u1')))
+
+        batch = store.get_batch('u1')
+        self.assertTrue(np.shares_memory(batch.epochs, store.get_batch('u1').epochs))
+        for batch, user_events in snapshots:
+            self.assertEqual(len(batch), len(user_events))
+            self.assertEqual(
+                model.compute_interest_score(batch, now),
+                model.compute_interest_score(user_events, now)
+            )
+
+
+class TestInterestState(unittest.TestCase):
+    """اختبارات حالة الاهتمام التراكمية"""
+
+    def make_history(self, count=300):
+        rng = random.Random(7)
+        now = datetime.now(timezone.utc)
+        events = []
+        for _ in range(count):
+            timestamp = now - timedelta(days=rng.randint(0, 20), hours=rng.random())
+            events.append({
+                'event_type': rng.choice(['article_view', 'article_like', 'article_share', 'reading_time']),
+                'event_data': {
+                    'category': rng.choice(['تقنية', 'رياضة', 'اقتصاد', 'صحة']),
+                    'tags': rng.sample(['AI', 'كرة', 'أسهم', 'لقاح', 'هواتف'], 2),
+                    'duration': rng.randint(30, 600),
+                },
+                'timestamp': timestamp.isoformat(),
+            })
+        # ترتيب عشوائي لاختبار الأحداث المتأخرة الوصول
+        rng.shuffle(events)
+        return events
+
+    def test_matches_batch_computation(self):
+        """اختبار تطابق الحالة التراكمية مع الحساب الكامل"""
+        model = UserInterestModel()
+        events = self.make_history()
+        now = datetime.now(timezone.utc).timestamp()
+        store = InterestStateStore(model, path='')
+        for start in range(0, len(events), 17):
+            store.apply_events('u1', events[start:start + 17], now=now)
+
+        incremental = store.get_interest_scores('u1', now=now)
+        batch = model.compute_interest_score(events, now)
+
+        self.assertEqual(set(incremental), set(batch))
+        for key, score in batch.items():
+            self.assertAlmostEqual(incremental[key], score, delta=5.0)
+        self.assertEqual(
+            max(batch, key=batch.get),
+            max(incremental, key=incremental.get)
+        )
+
+    def test_profile_single_pass(self):
+        """اختبار حساب الملف ودرجات الاهتمام في مرور واحد بنفس النتائج"""
+        model = UserInterestModel()
+        events = self.make_history() + make_events()
+
+        passes = []
+        original = model._calculate_event_weight
+        model._calculate_event_weight = lambda *args: passes.append(1) or original(*args)
+        events[0]['article_id'] = 'a1'
+        profile = model.get_user_profile(iter(events), include_statistics=True)
+
+        self.assertEqual(len(passes), len(events))
+        self.assertEqual(profile['statistics'], {
+            'total_events': len(events),
+            'unique_articles': 1,
+            'event_types': list(dict.fromkeys(event['event_type'] for event in events)),
+        })
+        self.assertEqual(profile['interest_scores'], model.compute_interest_score(events))
+        self.assertEqual(profile['behavior_patterns'], model._analyze_behavior_patterns(events))
+        self.assertEqual(profile['engagement_level'], model._calculate_engagement_level(events))
+
+    def test_event_batch_matches_dicts(self):
+        """اختبار تطابق ملف المستخدم من EventBatch مع الحساب حدثاً حدثاً"""
+        model = UserInterestModel()
+        events = self.make_history() + make_events()
+        for event in events[::7]:
+            event['event_type'] = 'search_query'
+            event['event_data']['query'] = 'أخبار التقنية'
+        events[0]['article_id'] = 'a1'
+        now = datetime.now(timezone.utc).timestamp()
+
+        expected = model.get_user_profile(events, include_statistics=True, now=now)
+        profile = model.get_user_profile(EventBatch.from_events(events), include_statistics=True, now=now)
+        for key in ('interest_scores', 'top_interests', 'behavior_patterns', 'engagement_level', 'statistics'):
+            self.assertEqual(profile[key], expected[key])
+
+    def test_decay_kernel(self):
+        """اختبار تطابق جدول التراجع مع الحساب المباشر لكل حدث"""
+        import math
+
+        model = UserInterestModel()
+        now = datetime(2024, 6, 1, tzinfo=timezone.utc).timestamp()
+        days = [0, 0.5, 1, 6.9, 44, 45, 200, 400, -2]
+        epochs = np.array([now - d * 86400 for d in days] + [np.nan])
+
+        expected = [max(math.pow(0.95, math.floor(d)), 0.1) for d in days] + [1.0]
+        np.testing.assert_allclose(model.time_decay(epochs, now), expected)
+
+    def test_preparsed_timestamps(self):
+        """اختبار استخدام الطابع الزمني المحوّل عند الاستقبال بدل النص"""
+        model = UserInterestModel()
+        events = self.make_history(50)
+        preparsed = [
+            {**event, EVENT_EPOCH_KEY: parse_timestamp(event['timestamp']), 'timestamp': 'invalid'}
+            for event in events
+        ]
+        now = datetime.now(timezone.utc).timestamp()
+
+        self.assertEqual(
+            model.compute_interest_score(preparsed, now),
+            model.compute_interest_score(events, now)
+        )
+
+    def test_save_and_load(self):
+        """اختبار حفظ الحالة وتحميلها"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'state.json')
+            store = InterestStateStore(path=path)
+            store.apply_events('u1', make_events())
+            store.save()
+
+            restored = InterestStateStore(path=path)
+            self.assertTrue(restored.has_user('u1'))
+            now = datetime(2024, 6, 1, tzinfo=timezone.utc).timestamp()
+            self.assertEqual(restored.get_interest_scores('u1', now=now), store.get_interest_scores('u1', now=now))
+
+    def test_old_events_match_batch_computation(self):
+        """اختبار التطابق مع الحساب الكامل لأحداث أقدم من أفق التراجع (45 يوماً)"""
+        model = UserInterestModel()
+        now = datetime.now(timezone.utc)
+        events = [
+            {
+                'event_type': 'article_like',
+                'event_data': {'category': 'اقتصاد', 'tags': ['أسهم']},
+                'timestamp': (now - timedelta(days=60 + 3 * i)).isoformat(),
+            }
+            for i in range(50)
+        ] + [
+            {
+                'event_type': 'article_view',
+                'event_data': {'category': 'رياضة'},
+                'timestamp': (now - timedelta(days=i % 4)).isoformat(),
+            }
+            for i in range(5)
+        ]
+        random.Random(3).shuffle(events)
+
+        store = InterestStateStore(model, path='')
+        for start in range(0, len(events), 8):
+            store.apply_events('u1', events[start:start + 8], now=now.timestamp())
+
+        incremental = store.get_interest_scores('u1', now=now.timestamp())
+        batch = model.compute_interest_score(events, now.timestamp())
+        self.assertEqual(max(batch, key=batch.get), 'اقتصاد')
+        self.assertEqual(set(incremental), set(batch))
+        for key, score in batch.items():
+            self.assertAlmostEqual(incremental[key], score, delta=5.0)
+
+        # مرور الزمن بعد آخر تحديث يُبقي التطابق للأحداث التي تتجاوز الأفق لاحقاً
+        later = now.timestamp() + 60 * 86400
+        batch = model.compute_interest_score(events, later)
+        for key, score in store.get_interest_scores('u1', now=later).items():
+            self.assertAlmostEqual(score, batch[key], delta=5.0)
+
+    def test_events_without_timestamp_do_not_decay(self):
+        """اختبار معاملة الأحداث بلا طابع زمني كالحساب الكامل (لا تتراجع)"""
+        model = UserInterestModel()
+        now = datetime.now(timezone.utc).timestamp()
+        events = [
+            {'event_type': 'article_like', 'event_data': {'category': 'صحة'}},
+            {
+                'event_type': 'article_like', 'event_data': {'category': 'رياضة'},
+                'timestamp': datetime.now(timezone.utc).isoformat()
+            },
+        ]
+        store = InterestStateStore(model, path='')
+        store.apply_events('u1', events, now=now)
+
+        later = now + 30 * 86400
+        batch = model.compute_interest_score(events, later)
+        incremental = store.get_interest_scores('u1', now=later)
+        self.assertEqual(max(batch, key=batch.get), 'صحة')
+        for key, score in batch.items():
+            self.assertAlmostEqual(incremental[key], score, delta=5.0)
+
+    def test_rebuild_from_event_store(self):
+        """اختبار إعادة بناء الحالة من مخزن الأحداث عند غيابها أو تقادمها"""
+        events = self.make_history(60)
+        now = datetime.now(timezone.utc).timestamp()
+        event_store = InMemoryEventStore()
+        worker_a = InterestStateStore(path='', event_store=event_store)
+        worker_b = InterestStateStore(path='', event_store=event_store)
+
+        # كل عامل يستقبل نصف الأحداث فقط
+        for start in range(0, len(events), 10):
+            worker = worker_a if start % 20 == 0 else worker_b
+            batch = events[start:start + 10]
+            event_store.append('u1', batch)
+            worker.apply_events('u1', batch, now=now, version=event_store.version('u1'))
+
+        expected = worker_a.interest_model.compute_interest_score(events, now)
+        for worker in (worker_a, worker_b, InterestStateStore(path='', event_store=event_store)):
+            scores = worker.get_interest_scores('u1', now=now)
+            self.assertEqual(set(scores), set(expected))
+            for key, score in expected.items():
+                self.assertAlmostEqual(scores[key], score, delta=5.0)
+
+        event_store.clear('u1')
+        self.assertIsNone(worker_a.get_interest_scores('u1', now=now))
+
+
+def make_catalog(count=2000, seed=11):
+    """مجموعة كبيرة من المقالات والأحداث العشوائية"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    categories = ['تقنية', 'رياضة', 'اقتصاد', 'صحة', 'ثقافة', 'سياسة']
+    tags = ['AI', 'كرة', 'أسهم', 'لقاح', 'هواتف', 'نفط', 'شعر', 'انتخابات']
+
+    articles = []
+    for i in range(count):
+        published = now - timedelta(days=rng.randint(0, 60), hours=rng.random() * 24)
+        articles.append({
+            'id': str(i),
+            'title': f'مقال {i}',
+            'category': {'name': rng.choice(categories)},
+            'tags': rng.sample(tags, rng.randint(0, 3)),
+            'view_count': rng.randint(0, 5000),
+            'like_count': rng.randint(0, 300),
+            'comment_count': rng.randint(0, 50),
+            'published_at': published.isoformat() if rng.random() > 0.1 else None,
+            'author': {'name': rng.choice(['كاتب 1', 'كاتب 2', 'كاتب 3'])},
+        })
+
+    events = []
+    for _ in range(200):
+        events.append({
+            'event_type': rng.choice(['article_view', 'article_like', 'reading_time']),
+            'event_data': {
+                'category': rng.choice(categories),
+                'tags': rng.sample(tags, 2),
+                'articleId': str(rng.randint(0, count - 1)),
+                'duration': rng.randint(30, 600),
+            },
+            'timestamp': (now - timedelta(days=rng.randint(0, 30))).isoformat(),
+        })
+
+    return articles, events
+
+
+class TestVectorizedScoring(unittest.TestCase):
+    """اختبارات مسار الحساب المتجهي"""
+
+    def test_matches_scalar_path(self):
+        """اختبار تطابق الترتيب والدرجات مع الحساب لكل مقال"""
+        articles, events = make_catalog()
+        engine = RecommendationEngine()
+
+        for context in ['homepage', 'article_page']:
+            engine.use_vectorized_scoring = True
+            vectorized = engine.recommend_articles(events, articles, top_n=20, context=context)
+            engine.use_vectorized_scoring = False
+            scalar = engine.recommend_articles(events, articles, top_n=20, context=context)
+
+            self.assertEqual(vectorized, scalar)
+
+    def test_heap_selection_matches_full_sort(self):
+        """اختبار تطابق الاختيار بالكومة مع الترتيب الكامل ثم فلتر التنوع"""
+        articles, events = make_catalog(count=500, seed=3)
+        engine = RecommendationEngine()
+        engine.use_vectorized_scoring = False
+        interests = engine.interest_model.compute_interest_score(events)
+
+        scored = []
+        for article in articles:
+            score = engine._calculate_article_score(article, interests, events, 'homepage')
+            if score >= engine.min_score_threshold:
+                scored.append({**article, 'recommendation_score': score})
+        ranked = sorted(scored, key=lambda x: x['recommendation_score'], reverse=True)
+        expected = engine._apply_diversity_filter(ranked, interests)
+
+        for top_n in [1, 5, 20]:
+            result = engine.recommend_articles(events, articles, top_n=top_n)
+            self.assertEqual(
+                [r['id'] for r in result],
+                [r['id'] for r in expected[:top_n]]
+            )
+
+    def test_batch_matches_per_user(self):
+        """اختبار تطابق التوصيات المجمّعة مع التوصيات لكل مستخدم على حدة"""
+        articles, _ = make_catalog(count=400)
+        users = [make_catalog(count=400, seed=seed)[1][:50 * seed] for seed in range(1, 6)] + [[]]
+        engine = RecommendationEngine()
+        engine.batch_size = 4
+        engine.collaborative_model = ItemCooccurrenceModel()
+        for i, user_events in enumerate(users):
+            engine.collaborative_model.add_events(f'u{i}', user_events)
+
+        features = ArticleFeatures(articles)
+        batched = list(engine.recommend_batch(features, [(None, events) for events in users], top_n=10))
+
+        self.assertEqual(len(batched), len(users))
+        for user_events, result in zip(users, batched):
+            expected = engine.recommend_articles(user_events, articles, top_n=10)
+            self.assertEqual([r['id'] for r in result], [r['id'] for r in expected])
+            for actual, reference in zip(result, expected):
+                self.assertAlmostEqual(actual['recommendation_score'], reference['recommendation_score'], places=3)
+
+    def test_shared_vocabulary(self):
+        """اختبار تشارك المعرفات بين مجموعات المقالات وتطابق الاهتمامات المتفرقة مع القاموس"""
+        articles = make_articles()
+        first, second = ArticleFeatures(articles[:2]), ArticleFeatures(articles[1:])
+        self.assertEqual(first.category_ids[1], second.category_ids[0])
+
+        interests = {'تقنية': 80.0, 'AI': 40.0, 'غير معروف': 10.0}
+        sparse_interests = SparseInterests.from_dict(interests)
+        self.assertEqual(len(sparse_interests), 2)
+        self.assertEqual(sparse_interests.to_dict(), {'تقنية': 80.0, 'AI': 40.0})
+        np.testing.assert_array_equal(
+            second.interest_vector(sparse_interests), second.interest_vector(interests)
+        )
+
+
+class TestArticleCatalog(unittest.TestCase):
+    """اختبارات كتالوج المقالات"""
+
+    def test_upsert_delete_and_version(self):
+        """اختبار الإضافة والحذف وتغير الإصدار"""
+        catalog = ArticleCatalog()
+        catalog.upsert(make_articles())
+        self.assertEqual(len(catalog.features()), 3)
+        version = catalog.version
+
+        catalog.upsert([{**make_articles()[0], 'view_count': 9}])
+        self.assertEqual(len(catalog), 3)
+        self.assertGreater(catalog.version, version)
+        features = catalog.features()
+        self.assertEqual(features.view_counts[features.ids.index('1')], 9)
+
+        catalog.delete(['2', 'missing'])
+        self.assertEqual(sorted(catalog.features().ids), ['1', '3'])
+
+    def test_incremental_updates_match_rebuild(self):
+        """اختبار أن التحديثات التدريجية (إلحاق ومواقع محذوفة وضغط) تطابق البناء الكامل"""
+        articles, _ = make_catalog(count=400)
+        catalog = ArticleCatalog(compact_ratio=0.1, max_index_segments=4)
+        catalog.upsert(articles[:300])
+        catalog.features()
+
+        rng = random.Random(5)
+        for step in range(12):
+            catalog.upsert(articles[300 + 8 * step:300 + 8 * (step + 1)])
+            catalog.upsert([{**article, 'view_count': rng.randint(0, 9)} for article in rng.sample(articles[:300], 5)])
+            catalog.delete([article['id'] for article in rng.sample(articles, 3)])
+
+            rebuilt = ArticleCatalog()
+            rebuilt.upsert(catalog.get(article_id) for article_id in sorted(catalog._articles, key=int))
+
+            features = catalog.features()
+            expected = rebuilt.features()
+            order = np.argsort([int(article_id) for article_id in features.ids])
+            self.assertEqual([features.ids[i] for i in order], expected.ids)
+            np.testing.assert_array_equal(features.popularity[order], expected.popularity)
+            np.testing.assert_array_equal(features.tag_ids[order][:, :expected.tag_ids.shape[1]], expected.tag_ids)
+            self.assertEqual(
+                sorted(catalog.select(category='رياضة').ids, key=int),
+                rebuilt.select(category='رياضة').ids
+            )
+
+            all_features, live, _, index = catalog._snapshot()
+            rows = index.postings('رياضة')
+            if live is not None:
+                rows = rows[live[rows]]
+            self.assertEqual(
+                sorted((all_features.ids[row] for row in rows), key=int),
+                rebuilt.select(category='رياضة').ids
+            )
+
+        stats = catalog.stats()
+        self.assertLessEqual(stats['tombstones'], 0.1 * stats['feature_rows'])
+        self.assertLess(stats['index_segments'], 4)
+
+    def test_select_filters(self):
+        """اختبار اختيار المرشحين بالمعرفات والتصنيف وتاريخ النشر"""
+        catalog = ArticleCatalog()
+        catalog.upsert(make_articles())
+
+        self.assertEqual(catalog.select(article_ids=['3', '1', 'x']).ids, ['3', '1'])
+        self.assertEqual(catalog.select(category='رياضة').ids, ['2'])
+        self.assertEqual(catalog.select(published_since='2024-01-15T00:00:00Z').ids, ['2'])
+        self.assertEqual(catalog.select(article_ids=['1', '2'], category='اقتصاد').ids, [])
+
+    def test_catalog_recommendations_match_inline(self):
+        """اختبار تطابق التوصيات من الكتالوج مع القائمة المرسلة"""
+        articles, events = make_catalog(count=300)
+        catalog = ArticleCatalog()
+        catalog.upsert(articles)
+        engine = RecommendationEngine()
+        interests = engine.interest_model.compute_interest_score(events)
+
+        self.assertEqual(
+            engine.recommend_from_features(catalog.select(), interests, events, top_n=10),
+            engine.recommend_articles(events, articles, top_n=10)
+        )
+
+
+class TestCandidateGeneration(unittest.TestCase):
+    """اختبارات توليد المرشحين من الفهرس المعكوس"""
+
+    def test_postings(self):
+        """اختبار الفهرس المعكوس للتصنيفات والوسوم"""
+        catalog = ArticleCatalog()
+        catalog.upsert(make_articles())
+        index = catalog.inverted_index()
+
+        self.assertEqual(index.postings('تقنية').tolist(), [0])
+        self.assertEqual(index.postings('AI').tolist(), [0])
+        self.assertEqual(index.postings('رياضة').tolist(), [1])
+        self.assertEqual(index.postings('غير موجود').tolist(), [])
+
+    def test_budget_limits_candidates(self):
+        """اختبار احترام ميزانية المرشحين وتقديم الاهتمامات"""
+        articles, events = make_catalog(count=2000)
+        catalog = ArticleCatalog()
+        catalog.upsert(articles)
+        interests = {'رياضة': 100.0}
+
+        candidates = catalog.select(user_interests=interests, candidate_budget=100, backfill_ratio=0.2)
+        self.assertEqual(len(candidates), 100)
+        self.assertGreaterEqual(candidates.category_names.count('رياضة'), 80)
+        self.assertEqual(candidates.ids, sorted(candidates.ids, key=int))
+
+    def test_seeds_count_against_budget(self):
+        """اختبار أن البذور الكثيرة لا تتجاوز الميزانية وأن أولها بالترتيب يُؤخذ"""
+        articles, events = make_catalog(count=2000)
+        catalog = ArticleCatalog()
+        catalog.upsert(articles)
+        seeds = [str(i) for i in range(1999, -1, -1)]
+
+        candidates = catalog.select(
+            user_interests={'رياضة': 100.0}, candidate_budget=100, backfill_ratio=0.2,
+            seed_article_ids=seeds
+        )
+        self.assertEqual(len(candidates), 100)
+        self.assertTrue(set(seeds[:80]) <= set(candidates.ids))
+
+    def test_postings_ranked_by_prior(self):
+        """اختبار أخذ أعلى المقالات شعبية وحداثة من قائمة الاهتمام لا أقدمها إضافة"""
+        now = datetime(2024, 6, 1, tzinfo=timezone.utc)
+        articles = [
+            {
+                'id': str(i), 'title': f'مقال {i}', 'category': {'name': 'رياضة'}, 'tags': [],
+                'view_count': i, 'like_count': 0, 'comment_count': 0,
+                'published_at': (now - timedelta(days=90)).isoformat(),
+            }
+            for i in range(200)
+        ]
+        catalog = ArticleCatalog()
+        catalog.upsert(articles)
+
+        candidates = catalog.select(
+            user_interests={'رياضة': 100.0}, candidate_budget=20, backfill_ratio=0.0,
+            now=now.timestamp()
+        )
+        self.assertEqual(sorted(candidates.ids, key=int), [str(i) for i in range(180, 200)])
+
+        # الحداثة محسوبة عند وقت الطلب: مقال حديث قليل المشاهدات يدخل المرشحين
+        catalog.upsert([{**articles[0], 'view_count': 170, 'published_at': now.isoformat()}])
+        candidates = catalog.select(
+            user_interests={'رياضة': 100.0}, candidate_budget=20, backfill_ratio=0.0,
+            now=now.timestamp()
+        )
+        self.assertIn('0', candidates.ids)
+
+    def test_invalid_published_since(self):
+        """اختبار رفض تاريخ published_since غير الصالح بدل تجاهله"""
+        catalog = ArticleCatalog()
+        catalog.upsert(make_articles())
+        with self.assertRaises(ValueError):
+            catalog.select(published_since='yesterday')
+
+    def test_recommendations_close_to_full_scan(self):
+        """اختبار أن التوصيات من المرشحين تطابق تقييم الكتالوج كاملاً"""
+        articles, events = make_catalog(count=3000)
+        catalog = ArticleCatalog()
+        catalog.upsert(articles)
+        engine = RecommendationEngine()
+        interests = engine.interest_model.compute_interest_score(events)
+
+        engine.candidate_budget = None
+        full = engine.recommend_from_catalog(catalog, interests, events, top_n=10)
+        engine.candidate_budget = 1000
+        limited = engine.recommend_from_catalog(catalog, interests, events, top_n=10)
+
+        self.assertEqual([r['id'] for r in limited], [r['id'] for r in full])
+
+
+class TestCollaborativeModel(unittest.TestCase):
+    """اختبارات نموذج التصفية التعاونية"""
+
+    @staticmethod
+    def views(*article_ids):
+        return [{'event_type': 'article_view', 'event_data': {'articleId': a}} for a in article_ids]
+
+    def test_cooccurrence_scores(self):
+        """اختبار ترجيح المقالات التي يقرؤها المستخدمون المتشابهون"""
+        model = ItemCooccurrenceModel(top_k=10)
+        model.add_events('a', self.views('1', '2', '3'))
+        model.add_events('b', self.views('1', '2'))
+        model.add_events('c', self.views('4', '5'))
+
+        scores = model.score(self.views('1'), ['2', '3', '4', 'unknown'])
+        self.assertEqual(scores[0], 1.0)
+        self.assertGreater(scores[1], 0)
+        self.assertEqual(scores[2], 0)
+        self.assertEqual(scores[3], 0)
+
+    def test_incremental_updates(self):
+        """اختبار تحديث المصفوفة بعد أحداث جديدة"""
+        model = ItemCooccurrenceModel()
+        model.add_events('a', self.views('1', '2'))
+        self.assertEqual(model.similarity_matrix().nnz, 2)
+
+        model.add_events('b', self.views('1', '3'))
+        matrix = model.similarity_matrix()
+        self.assertEqual(matrix.shape, (3, 3))
+        self.assertEqual(model.score(self.views('3'), ['1', '2']).tolist(), [1.0, 0.0])
+
+    def test_patched_rows_match_full_build(self):
+        """اختبار تطابق المصفوفة المحدّثة صفاً صفاً مع بنائها دفعة واحدة"""
+        rng = random.Random(9)
+        history = [
+            (f'u{rng.randint(0, 40)}', self.views(*(str(rng.randint(0, 60)) for _ in range(rng.randint(1, 4)))))
+            for _ in range(150)
+        ]
+
+        # دون اقتطاع الجيران: الصفوف غير المعاد اختيارها تتطابق أيضاً لأن
+        # التشابه يُحسب من العدّادات بمقامات المقالات الحالية
+        model = ItemCooccurrenceModel(top_k=100, max_items_per_user=6)
+        for step, (user_id, events) in enumerate(history):
+            model.add_events(user_id, events)
+            if step % 10 == 0:
+                model.similarity_matrix()
+
+        rebuilt = ItemCooccurrenceModel(top_k=100, max_items_per_user=6)
+        for user_id, events in history:
+            rebuilt.add_events(user_id, events)
+
+        patched, expected = model.similarity_matrix(), rebuilt.similarity_matrix()
+        self.assertEqual(model.items, rebuilt.items)
+        self.assertAlmostEqual(abs(patched - expected).max(), 0.0, places=6)
+
+    def test_evicted_items_decrement_pairs(self):
+        """اختبار طرح أزواج المقال الخارج من نافذة المستخدم"""
+        model = ItemCooccurrenceModel(max_items_per_user=2)
+        model.add_events('a', self.views('1', '2', '3'))
+
+        self.assertEqual(model.stats()['pairs'], 1)
+        self.assertEqual(model.item_users, [0, 1, 1])
+        self.assertEqual(model.score(self.views('2'), ['1', '3']).tolist(), [0.0, 1.0])
+
+    def test_background_refresh(self):
+        """اختبار تحديث المصفوفة في الخيط الخلفي دون إعادة بنائها في الطلب"""
+        import time
+
+        model = ItemCooccurrenceModel(refresh_interval=0.01)
+        model.add_events('a', self.views('1', '2'))
+        first = model.similarity_matrix()
+        version = model.snapshot_version
+
+        model.add_events('b', self.views('1', '3'))
+        deadline = time.monotonic() + 5
+        while model.snapshot_version == version and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(first.shape, (2, 2))
+        self.assertEqual(model.similarity_matrix().shape, (3, 3))
+        self.assertEqual(model.stats()['pending_rows'], 0)
+
+    def test_load_event_store(self):
+        """اختبار بناء النموذج من مخزن الأحداث بعد إعادة التشغيل"""
+        store = InMemoryEventStore()
+        store.append('a', self.views('1', '2', '3'))
+        store.append('b', self.views('1', '2'))
+
+        model = ItemCooccurrenceModel()
+        self.assertEqual(model.load_event_store(store), 2)
+        self.assertEqual(model.score(self.views('1'), ['2', '3']).tolist()[0], 1.0)
+        self.assertEqual(model.stats()['pairs'], 3)
+
+    def test_engine_uses_model(self):
+        """اختبار استخدام محرك التوصيات للنموذج"""
+        articles = make_articles()
+        model = ItemCooccurrenceModel()
+        model.add_events('other', self.views('3', '2'))
+
+        engine = RecommendationEngine()
+        without_model = engine.recommend_articles(self.views('3'), articles, top_n=3)
+        engine.collaborative_model = model
+        with_model = engine.recommend_articles(self.views('3'), articles, top_n=3)
+
+        score = {r['id']: r['recommendation_score'] for r in without_model}
+        boosted = {r['id']: r['recommendation_score'] for r in with_model}
+        self.assertGreater(boosted['2'], score['2'])
+        self.assertEqual(boosted['1'], score['1'])
+
+
+class TestArticleEmbeddings(unittest.TestCase):
+    """اختبارات تضمينات المقالات والبحث التقريبي"""
+
+    def test_memmap_store_roundtrip(self):
+        """اختبار حفظ التضمينات وإعادة فتحها من القرص"""
+        vectors = np.random.default_rng(0).normal(size=(5, 8))
+        with tempfile.TemporaryDirectory() as path:
+            index = ArticleEmbeddingIndex(dim=8, path=path)
+            index.add(['a', 'b', 'c', 'd', 'e'], vectors)
+            index.add(['a'], vectors[4:5])
+
+            reopened = ArticleEmbeddingIndex(dim=8, path=path)
+            self.assertEqual(len(reopened), 5)
+            self.assertEqual(reopened.store.vectors.dtype, np.float16)
+            results = reopened.search(vectors[4], k=2)
+            self.assertEqual({article_id for article_id, _ in results}, {'a', 'e'})
+            self.assertGreater(results[0][1], 0.99)
+
+    def test_ivf_recall(self):
+        """اختبار تطابق نتائج IVF مع البحث الشامل"""
+        rng = np.random.default_rng(1)
+        centers = rng.normal(size=(16, 32))
+        vectors = centers[rng.integers(0, 16, 2000)] + rng.normal(scale=0.3, size=(2000, 32))
+        ids = [str(i) for i in range(2000)]
+
+        index = ArticleEmbeddingIndex(dim=32, nlist=16, nprobe=4)
+        index.add(ids, vectors)
+        self.assertTrue(index.index.is_trained)
+
+        exact = ArticleEmbeddingIndex(dim=32, nlist=16)
+        exact.min_train_size = float('inf')
+        exact.add(ids, vectors)
+
+        recalls = []
+        for query in rng.normal(size=(20, 32)):
+            approximate = {a for a, _ in index.search(query, k=10)}
+            expected = {a for a, _ in exact.search(query, k=10)}
+            recalls.append(len(approximate & expected) / 10)
+        self.assertGreaterEqual(np.mean(recalls), 0.9)
+
+    def test_readded_article_moves_between_lists(self):
+        """اختبار نقل المقال المحدّث من قائمته القديمة في IVF وعدم نسخ المصفوفة مع كل إضافة"""
+        rng = np.random.default_rng(2)
+        centers = rng.normal(size=(8, 16))
+        vectors = centers[rng.integers(0, 8, 400)] + rng.normal(scale=0.2, size=(400, 16))
+        ids = [str(i) for i in range(400)]
+
+        index = ArticleEmbeddingIndex(dim=16, nlist=8, nprobe=1)
+        index.min_train_size = 320
+        for start in range(0, 400, 40):
+            index.add(ids[start:start + 40], vectors[start:start + 40])
+        self.assertTrue(index.index.is_trained)
+        self.assertGreaterEqual(len(index.store._vectors), 400)
+        self.assertLess(len(index.store._vectors), 800)
+
+        # مقال بمتجه جديد قرب مركز آخر، ومقال مكرر في نفس الدفعة
+        old_list = index.index.assignments[0]
+        other = next(c for c in range(8) if c != old_list)
+        target = index.index.centroids[other]
+        index.add(['0', '1', '1'], np.vstack([target, vectors[1], target]))
+
+        for position in (0, 1):
+            lists = [c for c, members in enumerate(index.index.lists) if position in members]
+            self.assertEqual(lists, [other])
+        self.assertEqual(sum(len(members) for members in index.index.lists), 400)
+        self.assertEqual(index.search(target, k=1, exclude=['1'])[0][0], '0')
+        np.testing.assert_allclose(index.store.vectors[1], normalize_rows(target[None])[0], atol=1e-3)
+
+    def test_engine_semantic_boost(self):
+        """اختبار ترجيح المقالات القريبة دلالياً من آخر القراءات"""
+        articles = make_articles()
+        events = [{'event_type': 'article_view', 'event_data': {'articleId': '3'}}]
+
+        index = ArticleEmbeddingIndex(dim=3)
+        index.add(['1', '2', '3'], np.array([[1.0, 0, 0], [0, 1.0, 0.1], [0, 1.0, 0]]))
+
+        engine = RecommendationEngine()
+        baseline = {r['id']: r['recommendation_score']
+                    for r in engine.recommend_articles(events, articles, top_n=3)}
+        engine.embedding_index = index
+        boosted = {r['id']: r['recommendation_score']
+                   for r in engine.recommend_articles(events, articles, top_n=3)}
+
+        self.assertGreater(boosted['2'], baseline['2'])
+        self.assertEqual(boosted['1'], baseline['1'])
+
+
+class TestWorkloadExecutor(unittest.TestCase):
+    """اختبارات منفّذ الأعمال الحسابية"""
+
+    def test_runs_off_event_loop(self):
+        """اختبار تنفيذ العمل في خيط غير خيط حلقة الأحداث"""
+        import asyncio
+        import threading
+
+        executor = WorkloadExecutor()
+        loop_thread = threading.get_ident()
+        worker_thread = asyncio.run(executor.run('recommendations', threading.get_ident))
+        executor.shutdown()
+
+        self.assertNotEqual(worker_thread, loop_thread)
+        self.assertEqual(executor.stats()['endpoints']['recommendations']['in_flight'], 0)
+
+    def test_sheds_load_when_saturated(self):
+        """اختبار رفض الطلبات الزائدة عن حد التزامن والطابور"""
+        import asyncio
+        import threading
+
+        executor = WorkloadExecutor(limits={'recommendations': (1, 1)})
+        release = threading.Event()
+
+        async def scenario():
+            running = [
+                asyncio.ensure_future(executor.run('recommendations', release.wait))
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0)
+            with self.assertRaises(ExecutorSaturated):
+                await executor.run('recommendations', release.wait)
+            # نقاط النهاية الأخرى لا تتأثر
+            self.assertEqual(await executor.run('text-analysis', sum, [1, 2]), 3)
+            release.set()
+            await asyncio.gather(*running)
+
+        asyncio.run(scenario())
+        executor.shutdown()
+
+        stats = executor.stats()['endpoints']['recommendations']
+        self.assertEqual((stats['in_flight'], stats['completed'], stats['rejected']), (0, 2, 1))
+
+    def test_reservation_released_once_without_iteration(self):
+        """اختبار تحرير المكان المحجوز لرد لم يبدأ استهلاكه، ومرة واحدة فقط"""
+        executor = WorkloadExecutor(limits={'recommendations-batch': (1, 0)})
+        reservation = executor.reserve('recommendations-batch')
+        executor.iterate(reservation, iter([1, 2]))
+        with self.assertRaises(ExecutorSaturated):
+            executor.reserve('recommendations-batch')
+
+        reservation.release()
+        reservation.release()
+        stats = executor.stats()['endpoints']['recommendations-batch']
+        self.assertEqual((stats['in_flight'], stats['completed']), (0, 1))
+
+    def test_cancelled_iteration_waits_for_running_item(self):
+        """اختبار بقاء المكان محجوزاً حتى ينتهي next الجاري في المجمّع بعد الإلغاء"""
+        import asyncio
+        import threading
+
+        executor = WorkloadExecutor(limits={'recommendations-batch': (1, 0)})
+        started, release = threading.Event(), threading.Event()
+
+        def slow_items():
+            yield 1
+            started.set()
+            release.wait()
+            yield 2
+
+        async def scenario():
+            reservation = executor.reserve('recommendations-batch')
+
+            async def consume():
+                async for _ in executor.iterate(reservation, slow_items()):
+                    pass
+
+            task = asyncio.ensure_future(consume())
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(scenario())
+        self.assertEqual(executor.stats()['endpoints']['recommendations-batch']['in_flight'], 1)
+        release.set()
+        executor.limit_for('recommendations-batch').pool.shutdown(wait=True)
+        self.assertEqual(executor.stats()['endpoints']['recommendations-batch']['in_flight'], 0)
+
+    def test_parse_limits(self):
+        self.assertEqual(
+            parse_limits('recommendations=4:16, text-analysis=8,bad'),
+            {'recommendations': (4, 16), 'text-analysis': (8, 0)}
+        )
+
+
+class TestResponseCache(unittest.TestCase):
+    """اختبارات الذاكرة المؤقتة لنتائج التوصيات"""
+
+    def test_lru_eviction_and_ttl(self):
+        """اختبار إخراج الأقدم استخداماً وانتهاء الصلاحية"""
+        cache = InMemoryResponseCache(max_entries=2, ttl_seconds=60)
+        cache.set('a', {'v': 1})
+        cache.set('b', {'v': 2})
+        cache.get('a')
+        cache.set('c', {'v': 3})
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), {'v': 1})
+
+        expired = InMemoryResponseCache(ttl_seconds=-1)
+        expired.set('a', {'v': 1})
+        self.assertIsNone(expired.get('a'))
+
+    def test_versions_and_metrics(self):
+        """اختبار تغير المفتاح مع إصدار المستخدم وعدّادات الإصابة"""
+        cache = InMemoryResponseCache()
+        key = cache_key('u1', cache.user_version('u1'), 'homepage', 5)
+        cache.set(key, {'v': 1})
+        self.assertEqual(cache.get(key), {'v': 1})
+
+        cache.invalidate_user('u1')
+        self.assertNotEqual(cache_key('u1', cache.user_version('u1'), 'homepage', 5), key)
+        self.assertEqual(cache.user_version('u2'), 0)
+
+        cache.invalidate_all()
+        self.assertIsNone(cache.get(key))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['invalidations']), (1, 1, 2))
+
+    def test_counters_consistent_across_threads(self):
+        """اختبار عدم ضياع زيادات العدّادات عند القراءة من عدة خيوط"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        cache = InMemoryResponseCache()
+        cache.set('a', {'v': 1})
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda i: cache.get('a' if i % 2 else 'b'), range(2000)))
+        self.assertEqual((cache.hits, cache.misses), (1000, 1000))
+
+    def test_backend_must_implement_interface(self):
+        """اختبار رفض إنشاء ذاكرة لا تنفّذ كل الواجهة"""
+        from nlp.response_cache import ResponseCache
+
+        class Partial(ResponseCache):
+            def _get(self, key):
+                return None
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+
+class TestRecommendationAPI(unittest.TestCase):
+    """اختبارات واجهات التوصيات"""
+
+    def setUp(self):
+        from fastapi.testclient import TestClient
+        from nlp import app as app_module
+
+        app_module.event_store = InMemoryEventStore()
+        app_module.interest_state_store = InterestStateStore(
+            app_module.interest_model, path='', event_store=app_module.event_store
+        )
+        app_module.article_catalog = ArticleCatalog()
+        app_module.collaborative_model = ItemCooccurrenceModel()
+        app_module.recommendation_engine.collaborative_model = app_module.collaborative_model
+        app_module.response_cache = InMemoryResponseCache()
+        self.app_module = app_module
+        self.client = TestClient(app_module.app)
+
+    def test_recommendations_from_stored_events(self):
+        """اختبار التوصيات باستخدام user_id فقط"""
+        response = self.client.post('/events', json={'user_id': 'u1', 'events': make_events()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_events'], 3)
+
+        by_id = self.client.post('/recommendations', json={'user_id': 'u1', 'articles': make_articles()})
+        inline = self.client.post('/recommendations', json={'user_events': make_events(), 'articles': make_articles()})
+        self.assertEqual(by_id.status_code, 200)
+        self.assertEqual(
+            [r['id'] for r in by_id.json()['recommendations']],
+            [r['id'] for r in inline.json()['recommendations']]
+        )
+
+    def test_fast_path_matches_and_projects_fields(self):
+        """اختبار تطابق المسار السريع مع /recommendations وإرجاع الحقول المطلوبة فقط"""
+        body = {'user_events': make_events(), 'articles': make_articles(), 'top_n': 3}
+        standard = self.client.post('/recommendations', json=body).json()
+        fast = self.client.post('/recommendations/fast', json=body)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.json()['recommendations'], standard['recommendations'])
+        self.assertEqual(fast.json()['user_profile']['interest_scores'], standard['user_profile']['interest_scores'])
+
+        fields = ['id', 'recommendation_score', 'recommendation_reason']
+        compact = self.client.post('/recommendations/fast', json={**body, 'fields': fields}).json()
+        self.assertEqual(
+            compact['recommendations'],
+            [{field: r[field] for field in fields} for r in standard['recommendations']]
+        )
+
+        invalid = self.client.post('/recommendations/fast', json={**body, 'user_events': [{'event_type': 'x'}]})
+        self.assertEqual(invalid.status_code, 422)
+
+    def test_invalid_published_since_rejected(self):
+        """اختبار رد 422 لتاريخ published_since غير الصالح"""
+        self.client.post('/catalog/articles', json={'articles': make_articles()})
+        for path in ('/recommendations', '/recommendations/fast'):
+            response = self.client.post(path, json={'user_id': 'u1', 'published_since': 'yesterday'})
+            self.assertEqual(response.status_code, 422)
+        response = self.client.post('/recommendations/batch', json={'user_ids': ['u1'], 'published_since': 'yesterday'})
+        self.assertEqual(response.status_code, 422)
+
+    def test_invalid_event_fields_rejected(self):
+        """اختبار رد 422 لحقول أحداث بأنواع غير صالحة بدل خطأ داخلي"""
+        for event_data in ({'duration': 'long'}, {'depth': [1]}, {'category': {'name': 'x'}}, {'tags': 'AI'}):
+            event = {'event_type': 'reading_time', 'event_data': event_data, 'timestamp': '2024-01-15T10:00:00Z'}
+            response = self.client.post('/events', json={'user_id': 'u1', 'events': [event]})
+            self.assertEqual(response.status_code, 422)
+            for path in ('/recommendations', '/recommendations/fast'):
+                response = self.client.post(path, json={'user_events': [event], 'articles': make_articles()})
+                self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.app_module.event_store.count('u1'), 0)
+
+    def test_invalid_article_fields_rejected(self):
+        """اختبار رد 422 لحقول مقالات بأنواع غير صالحة في المسارين العادي والسريع"""
+        for invalid in ({'category': 'x'}, {'author': 'x'}, {'tags': 'AI'}, {'view_count': 'many'}, {'id': 1}):
+            articles = make_articles()
+            articles[0] = {**articles[0], **invalid}
+            for path in ('/recommendations', '/recommendations/fast'):
+                response = self.client.post(path, json={'user_events': make_events(), 'articles': articles})
+                self.assertEqual(response.status_code, 422, (path, invalid))
+
+    def test_event_terms_not_added_to_shared_vocabulary(self):
+        """اختبار عدم إضافة تصنيفات ووسوم أحداث العملاء إلى المفردات المشتركة"""
+        from nlp.vocabulary import VOCABULARY
+
+        before = len(VOCABULARY)
+        events = [{
+            'event_type': 'article_view', 'timestamp': '2024-01-15T10:00:00Z',
+            'event_data': {'category': f'عشوائي-{i}', 'topic': f'موضوع-{i}', 'tags': [f'وسم-{i}']}
+        } for i in range(50)]
+        self.client.post('/events', json={'user_id': 'u1', 'events': events})
+        response = self.client.post('/recommendations', json={'user_id': 'u1'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(VOCABULARY), before)
+
+    def test_recommendations_from_catalog(self):
+        """اختبار التوصيات من الكتالوج دون إرسال المقالات"""
+        self.client.post('/catalog/articles', json={'articles': make_articles()})
+        response = self.client.post('/recommendations', json={
+            'user_events': make_events(), 'category': 'تقنية'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['id'] for r in response.json()['recommendations']], ['1'])
+
+    def test_recommendations_cached_until_invalidated(self):
+        """اختبار إعادة النتيجة المخزنة وإبطالها عند وصول أحداث أو مقالات جديدة"""
+        cache = self.app_module.response_cache
+        self.client.post('/events', json={'user_id': 'u1', 'events': make_events()})
+        self.client.post('/catalog/articles', json={'articles': make_articles()})
+
+        first = self.client.post('/recommendations', json={'user_id': 'u1'})
+        second = self.client.post('/recommendations', json={'user_id': 'u1'})
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        self.client.post('/events', json={'user_id': 'u1', 'events': make_events()[:1]})
+        self.client.post('/recommendations', json={'user_id': 'u1'})
+        self.assertEqual(cache.misses, 2)
+
+        self.client.post('/catalog/articles/delete', json={'article_ids': ['3']})
+        self.client.post('/recommendations', json={'user_id': 'u1'})
+        self.assertEqual(cache.misses, 3)
+
+        # أحداث مستخدم آخر تغيّر نموذج التصفية التعاونية (بعد نشر مصفوفته)
+        self.client.post('/events', json={'user_id': 'u2', 'events': make_events()})
+        self.client.post('/recommendations', json={'user_id': 'u1'})
+        self.assertEqual(cache.misses, 4)
+
+        # أحداث استقبلها عامل آخر تظهر في إصدار مخزن الأحداث المشترك
+        self.app_module.event_store.append('u1', make_events()[:1])
+        self.client.post('/recommendations', json={'user_id': 'u1'})
+        self.assertEqual(cache.misses, 5)
+
+        # الأحداث أو المقالات المرسلة في الطلب لا تُخزن
+        self.client.post('/recommendations', json={'user_events': make_events()})
+        self.client.post('/recommendations', json={'user_id': 'u1', 'articles': make_articles()})
+        self.client.post('/recommendations', json={'user_id': 'u1', 'articles': make_articles()})
+        self.assertEqual((cache.hits, cache.misses), (1, 5))
+
+    def test_cache_key_ignores_unpublished_collaborative_updates(self):
+        """اختبار بقاء النتيجة المخزنة مع أحداث المستخدمين الآخرين حتى نشر المصفوفة"""
+        model = ItemCooccurrenceModel(refresh_interval=3600)
+        self.app_module.collaborative_model = model
+        self.app_module.recommendation_engine.collaborative_model = model
+        cache = self.app_module.response_cache
+        self.client.post('/catalog/articles', json={'articles': make_articles()})
+        self.client.post('/events', json={'user_id': 'u1', 'events': make_events()})
+        model.refresh()
+
+        self.client.post('/recommendations', json={'user_id': 'u1'})
+        self.client.post('/events', json={'user_id': 'u2', 'events': make_events()})
+        self.client.post('/recommendations', json={'user_id': 'u1'})
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        model.refresh()
+        self.client.post('/recommendations', json={'user_id': 'u1'})
+        self.assertEqual(cache.misses, 2)
+
+    def test_saturated_endpoint_returns_503(self):
+        """اختبار رد 503 عند امتلاء حد نقطة النهاية"""
+        original = self.app_module.workload_executor
+        self.app_module.workload_executor = WorkloadExecutor(limits={'recommendations': (1, 0)})
+        self.app_module.workload_executor.limit_for('recommendations').in_flight = 1
+        try:
+            response = self.client.post('/recommendations', json={
+                'user_events': make_events(), 'articles': make_articles()
+            })
+            health = self.client.get('/health')
+        finally:
+            self.app_module.workload_executor = original
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers.get('retry-after'), '1')
+        self.assertEqual(health.status_code, 200)
+
+    def test_batch_recommendations_stream_ndjson(self):
+        """اختبار التوصيات المجمّعة كسطور NDJSON بنفس ترتيب المستخدمين"""
+        import json
+
+        self.client.post('/events', json={'user_id': 'u1', 'events': make_events()})
+        self.client.post('/catalog/articles', json={'articles': make_articles()})
+
+        response = self.client.post('/recommendations/batch', json={'user_ids': ['u1', 'u2'], 'top_n': 2})
+        single = self.client.post('/recommendations', json={'user_id': 'u1', 'top_n': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['content-type'].startswith('application/x-ndjson'))
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([line['user_id'] for line in lines], ['u1', 'u2'])
+        self.assertEqual(
+            [r['id'] for r in lines[0]['recommendations']],
+            [r['id'] for r in single.json()['recommendations']]
+        )
+
+    def test_missing_user_returns_400(self):
+        """اختبار رفض الطلب بدون user_id أو user_events"""
+        response = self.client.post('/interest-analysis', json={})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,469 @@
+"""
+اختبارات تحليل النصوص والاستدلال
+الغرض: اختبار تجميع الاستدلال وتحليل النصوص العربية
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest.mock import patch
+
+import numpy as np
+
+# إضافة مسار المشروع
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nlp.batch_analysis import BatchTextAnalyzer, OversizedLine, aiter_lines
+from nlp.batched_inference import SentimentBatcher
+from nlp.document_frequency import DocumentFrequency
+from nlp.entity_extraction import EntityExtractor
+from nlp.lexicon import LexiconMatcher
+from nlp.nlp_service import NLPService
+from nlp.performance_predictor import ArabicTextAnalyzer, ArticleMetrics, PerformancePredictor
+from nlp.text_api import TextAnalyzer
+from nlp.text_normalization import FEATURE_NORMALIZER, TEXT_NORMALIZER
+from nlp.text_pipeline import ANALYSIS_STAGES, TextAnalysisPipeline
+
+
+class FakeSentimentPipeline:
+    """بديل لـ sentiment-analysis يسجل أحجام الدفعات"""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, texts, batch_size=None, truncation=False):
+        with self.lock:
+            self.calls.append(list(texts))
+        return [
+            [{'label': 'POSITIVE', 'score': min(len(text) / 100, 1.0)},
+             {'label': 'NEGATIVE', 'score': 1 - min(len(text) / 100, 1.0)}]
+            for text in texts
+        ]
+
+
+class TestSentimentBatcher(unittest.TestCase):
+    """اختبارات تجميع تحليل المشاعر"""
+
+    def test_score_many_buckets_by_length(self):
+        """اختبار الدفعات المرتبة حسب الطول مع الحفاظ على ترتيب النتائج"""
+        pipeline = FakeSentimentPipeline()
+        batcher = SentimentBatcher(pipeline, batch_size=2)
+
+        texts = ['a' * 50, '', 'a' * 10, 'a' * 30, 'a' * 1000]
+        scores = batcher.score_many(texts)
+
+        self.assertEqual(scores, [0.5, 0.5, 0.1, 0.3, 1.0])
+        self.assertEqual([len(call) for call in pipeline.calls], [2, 2])
+        self.assertEqual([len(text) for text in pipeline.calls[0]], [10, 30])
+        # النصوص تُقتطع إلى max_chars كما في الاستدعاء الفردي
+        self.assertEqual(len(pipeline.calls[1][1]), 512)
+
+    def test_concurrent_requests_share_batches(self):
+        """اختبار تجميع الطلبات المتزامنة في دفعات"""
+        pipeline = FakeSentimentPipeline()
+        batcher = SentimentBatcher(pipeline, batch_size=8, max_wait_ms=50)
+
+        results = {}
+
+        def worker(i):
+            results[i] = batcher.score('a' * (i + 1))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {i: (i + 1) / 100 for i in range(16)})
+        self.assertLess(len(pipeline.calls), 16)
+
+    def test_skips_cancelled_and_completed_requests(self):
+        """اختبار تجاوز الطلبات الملغاة أو المكتملة دون إيقاف خيط التجميع"""
+        pipeline = FakeSentimentPipeline()
+        batcher = SentimentBatcher(pipeline, batch_size=8, max_wait_ms=1)
+
+        cancelled, completed = batcher.submit('a' * 10), batcher.submit('a' * 20)
+        cancelled.cancel()
+        completed.set_result(0.0)
+        self.assertEqual(batcher.score('a' * 30), 0.3)
+
+        self.assertTrue(cancelled.cancelled())
+        self.assertEqual(completed.result(), 0.0)
+        self.assertTrue(batcher._worker.is_alive())
+        self.assertEqual(batcher.score('a' * 40), 0.4)
+
+    def test_without_pipeline_returns_neutral(self):
+        """اختبار القيمة المحايدة عند غياب النموذج"""
+        batcher = SentimentBatcher(None)
+        self.assertEqual(batcher.score('نص'), 0.5)
+        self.assertEqual(batcher.score_many(['نص', '']), [0.5, 0.5])
+
+
+class TestLazyModelLoading(unittest.TestCase):
+    """اختبارات التحميل المؤجل لنماذج توقع الأداء"""
+
+    def make_article(self):
+        return ArticleMetrics(
+            title='عنوان', content='محتوى', category='رياضة', tags=[],
+            author_followers=100, publish_time=datetime(2024, 1, 15, 10),
+            content_length=400, reading_time=2, image_count=0, video_count=0,
+            internal_links=0, external_links=0, author_reputation=0.5,
+            topic_trending_score=0.5, seasonal_factor=1.0
+        )
+
+    def test_basic_prediction_without_models(self):
+        """اختبار التنبؤ الأساسي دون تحميل أي نموذج"""
+        with tempfile.TemporaryDirectory() as path, \
+                patch.object(ArabicTextAnalyzer, '_initialize_models') as initialize:
+            predictor = PerformancePredictor(path)
+            prediction = asyncio.run(predictor.predict_performance(self.make_article()))
+
+            self.assertFalse(predictor.is_trained)
+            self.assertEqual(prediction.predicted_views, 1600)
+            initialize.assert_not_called()
+            self.assertFalse(predictor.text_analyzer.is_ready)
+
+    def test_import_has_no_filesystem_side_effects(self):
+        """اختبار أن استيراد الوحدة لا يُنشئ ملف سجل ولا يضيف معالجات تسجيل"""
+        import subprocess
+
+        project = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.TemporaryDirectory() as cwd:
+            result = subprocess.run(
+                [sys.executable, '-c',
+                 'import logging, nlp.performance_predictor; print(len(logging.getLogger().handlers))'],
+                cwd=cwd, env={**os.environ, 'PYTHONPATH': project},
+                capture_output=True, text=True, check=True
+            )
+            self.assertEqual(os.listdir(cwd), [])
+        self.assertEqual(result.stdout.strip(), '0')
+
+    def test_training_data_skips_only_failing_samples(self):
+        """اختبار تجاهل العينة التي تفشل مميزاتها وحدها لا الدفعة كلها"""
+        sample = {
+            'title': 'عنوان', 'content': 'محتوى المقال', 'category': 'رياضة', 'tags': ['كرة'],
+            'publish_time': '2024-01-15T10:00:00', 'actual_views': 100,
+        }
+        data = [sample, {**sample, 'tags': None, 'actual_views': 1}, {**sample, 'publish_time': 'x'},
+                {**sample, 'actual_views': 300}]
+
+        with tempfile.TemporaryDirectory() as path, \
+                patch.object(ArabicTextAnalyzer, '_initialize_models'):
+            predictor = PerformancePredictor(path)
+            X, targets = predictor._prepare_training_data(data)
+
+        self.assertEqual(X.shape[0], 2)
+        self.assertEqual(targets['views'].tolist(), [100, 300])
+
+    def test_warm_up_loads_once(self):
+        """اختبار التحميل في الخلفية مرة واحدة"""
+        analyzer = ArabicTextAnalyzer()
+        pipeline = FakeSentimentPipeline()
+
+        def initialize():
+            analyzer.sentiment_pipeline = pipeline
+
+        with patch.object(analyzer, '_initialize_models', side_effect=initialize) as initialize_models:
+            analyzer.warm_up(background=True).join()
+            analyzer.warm_up()
+
+            self.assertTrue(analyzer.is_ready)
+            self.assertEqual(initialize_models.call_count, 1)
+            self.assertIs(analyzer.sentiment_batcher.sentiment_pipeline, pipeline)
+
+
+
+class TestLexiconMatching(unittest.TestCase):
+    """اختبارات مطابقة قوائم الكلمات"""
+
+    def test_words_count_for_every_lexicon(self):
+        """اختبار احتساب الكلمة لكل القوائم التي تنتمي إليها في مرور واحد"""
+        matcher = LexiconMatcher({'positive': ['مقبول', 'جيد'], 'neutral': ['مقبول', 'عادي']})
+
+        matches = matcher.match_tokens('جيد مقبول مقبول جيدا'.split())
+        self.assertEqual(matches.counts, {'positive': 3, 'neutral': 2})
+        self.assertEqual(matches.matched_words('positive'), ['جيد', 'مقبول'])
+        self.assertEqual(matches.total_tokens, 4)
+
+        # مطابقة أجزاء النص تحسب الكلمة مرة واحدة مهما تكررت
+        self.assertEqual(matcher.match_substrings('جيدا جيد').counts, {'positive': 1})
+
+    def test_content_analysis_shares_one_match(self):
+        """اختبار تطابق التحليل المجمّع مع استدعاء كل تحليل منفرداً"""
+        analyzer = TextAnalyzer()
+        text = 'مباراة رائع للفريق، لاعب ممتاز ولاعب مميز في الدوري لكن الأداء ضعيف'
+
+        # النص يُطبّع ويُقطّع مرة واحدة لكل التحليلات
+        misses = analyzer.normalizer.cache_info().misses
+        content = analyzer.analyze_content(text)
+        self.assertEqual(analyzer.normalizer.cache_info().misses, misses + 1)
+
+        self.assertEqual(content['sentiment'], analyzer.analyze_sentiment(text))
+        self.assertEqual(content['classification'], analyzer.classify_text(text))
+        self.assertEqual(content['classification']['primary_category'], 'رياضة')
+        self.assertEqual(content['suggested_tags'][0], 'لاعب')
+
+
+class TestEntityExtraction(unittest.TestCase):
+    """اختبارات استخراج الكيانات بمرور واحد"""
+
+    def test_combined_pattern_keeps_types_and_groups(self):
+        """اختبار تحديد نوع الكيان وقيمة مجموعة الالتقاط من المسح الواحد"""
+        extractor = EntityExtractor({'number': r'\d+', 'title': [r'(?:السيد)\s+([أ-ي]+)']})
+
+        entities = extractor.extract('السيد خالد 12 و 7 و 12 السيد خالد')
+        self.assertEqual(entities, {'number': ['12', '7'], 'title': ['خالد']})
+
+    def test_entity_names_are_bounded(self):
+        """اختبار توقف اسم الكيان بعد ثلاث كلمات بدل ابتلاع بقية النص"""
+        analyzer = TextAnalyzer()
+        text = ('وأعلنت شركة أرامكو السعودية للطاقة عن نتائج قوية ' + 'والعمل مستمر ' * 2000
+                + 'وأكد ذلك والدكتور خالد العمري، في الرياض. راجع https://example.com أو 0551234567')
+
+        entities = analyzer.extract_entities(text)
+        self.assertEqual(entities['organization'], ['أرامكو السعودية للطاقة'])
+        self.assertEqual(entities['person'], ['خالد العمري'])
+        self.assertEqual(entities['location'], ['الرياض'])
+        self.assertEqual(entities['url'], ['https://example.com'])
+        self.assertEqual(entities['phone'], ['0551234567'])
+
+
+class TestTextNormalization(unittest.TestCase):
+    """اختبارات التطبيع والتقطيع المشترك"""
+
+    def test_document_tokens_and_sentences(self):
+        """اختبار إزالة التشكيل وتوحيد الحروف وحدود الجمل بعلاماتها"""
+        document = TEXT_NORMALIZER.analyze('أَهلاً بِكُم في  المدرسة.  هل أنتم مستعدون؟ Yes!')
+
+        self.assertEqual(document.tokens, ('اهلا', 'بكم', 'في', 'المدرسه.', 'هل', 'انتم', 'مستعدون؟', 'yes!'))
+        self.assertEqual(document.sentences, ['اهلا بكم في المدرسه.', 'هل انتم مستعدون؟', 'yes!'])
+        self.assertEqual(document.words[-1], 'yes')
+        self.assertIs(TEXT_NORMALIZER.analyze(document), document)
+
+    def test_feature_normalizer_converts_digits(self):
+        """اختبار تحويل الأرقام إلى عربية وحذف الرموز غير العربية في مميزات الأداء"""
+        document = FEATURE_NORMALIZER.analyze(TEXT_NORMALIZER.analyze('عامُ 2024 - Test ؟'))
+
+        self.assertEqual(document.text, 'عام ٢٠٢٤ ؟')
+        self.assertEqual(document.source, 'عامُ 2024 - Test ؟')
+
+
+class TestTextAnalysisPipeline(unittest.TestCase):
+    """اختبارات تحليل النص بالمراحل"""
+
+    @classmethod
+    def setUpClass(cls):
+        with patch('nltk.download'):
+            cls.pipeline = TextAnalysisPipeline()
+
+    def test_stages_share_one_document(self):
+        """اختبار تشغيل كل المراحل على مستند ومطابقة واحدة مع زمن كل مرحلة"""
+        text = 'أعلنت وزارة الصحة عن أداء رائع هذا العام. وقال الدكتور خالد العمري، إن العلاج فعال. والمستشفى جاهز.'
+        misses = TEXT_NORMALIZER.cache_info().misses
+
+        with patch.object(self.pipeline.text_analyzer, 'match_lexicons',
+                          wraps=self.pipeline.text_analyzer.match_lexicons) as match_lexicons:
+            result = self.pipeline.run(text)
+
+        self.assertEqual(TEXT_NORMALIZER.cache_info().misses, misses + 1)
+        match_lexicons.assert_called_once()
+        self.assertEqual(result['stages'], list(ANALYSIS_STAGES))
+        self.assertEqual(set(result['analysis']), set(ANALYSIS_STAGES))
+        self.assertEqual(result['analysis']['sentiment']['sentiment'], 'إيجابي')
+        self.assertEqual(result['analysis']['entities']['person'], ['خالد العمري'])
+        self.assertTrue(set(ANALYSIS_STAGES) | {'normalize', 'lexicons', 'total'} <= set(result['timings_ms']))
+
+    def test_requested_stages_only(self):
+        """اختبار تشغيل المراحل المطلوبة فقط وتخطي المطابقة عند عدم الحاجة إليها"""
+        result = self.pipeline.run('نص قصير للتجربة', ['summary', 'keywords', 'summary'])
+
+        self.assertEqual(result['stages'], ['summary', 'keywords'])
+        self.assertEqual(list(result['analysis']), ['summary', 'keywords'])
+        self.assertNotIn('lexicons', result['timings_ms'])
+        with self.assertRaises(ValueError):
+            self.pipeline.run('نص', ['unknown'])
+
+    def test_v2_endpoint(self):
+        """اختبار نقطة النهاية /text-analysis/v2"""
+        from fastapi.testclient import TestClient
+        from nlp import app as app_module
+
+        app_module.text_pipeline = self.pipeline
+        client = TestClient(app_module.app)
+
+        response = client.post('/text-analysis/v2', json={'text': 'فريق رائع فاز بالمباراة', 'stages': ['classification']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['analysis']['classification']['primary_category'], 'رياضة')
+        self.assertIn('classification', response.json()['timings_ms'])
+
+        invalid = client.post('/text-analysis/v2', json={'text': 'نص', 'stages': ['unknown']})
+        self.assertEqual(invalid.status_code, 422)
+
+
+class TestBatchTextAnalysis(unittest.TestCase):
+    """اختبارات تحليل النصوص بالجملة"""
+
+    LINES = [
+        '{"id": "a", "text": "فريق رائع فاز بالمباراة"}',
+        '',
+        'not json',
+        '{"id": "b", "text": "أداء سيء للشركة في السوق"}',
+        '{"text": "نص دون معرف"}',
+    ]
+
+    def test_process_pool_keeps_input_order(self):
+        """اختبار ترتيب النتائج كالمدخلات مع توزيع الدفعات على عمليات"""
+        analyzer = BatchTextAnalyzer(workers=2, chunk_size=2, max_pending=2)
+        try:
+            output = b''.join(analyzer.iter_results(self.LINES)).decode('utf-8')
+        finally:
+            analyzer.shutdown()
+
+        results = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual([r.get('id', r.get('line')) for r in results], ['a', 3, 'b', 5])
+        self.assertIn('error', results[1])
+        self.assertEqual(results[0]['analysis']['classification']['primary_category'], 'رياضة')
+        self.assertEqual(results[2]['analysis']['sentiment']['sentiment'], 'سلبي')
+
+    def test_input_is_read_as_results_are_consumed(self):
+        """اختبار عدم قراءة المدخلات أبعد من الدفعات قيد التنفيذ"""
+        consumed = []
+
+        def lines():
+            for number in range(100):
+                consumed.append(number)
+                yield f'{{"id": {number}, "text": "نص رقم {number}"}}'
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            analyzer = BatchTextAnalyzer(chunk_size=1, max_pending=2, executor=executor)
+            results = analyzer.iter_results(lines())
+            self.assertEqual(json.loads(next(results))['id'], 0)
+            self.assertEqual(len(consumed), 3)
+            results.close()
+
+    def test_batch_endpoint_streams_ndjson(self):
+        """اختبار نقطة النهاية /text-analysis/batch"""
+        from fastapi.testclient import TestClient
+        from nlp import app as app_module
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            app_module.batch_text_analyzer = BatchTextAnalyzer(chunk_size=2, executor=executor)
+            client = TestClient(app_module.app)
+            response = client.post('/text-analysis/batch', content='\n'.join(self.LINES).encode('utf-8'))
+
+        self.assertEqual(response.status_code, 200)
+        results = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([r.get('id', r.get('line')) for r in results], ['a', 3, 'b', 5])
+
+    def test_oversized_lines_are_not_buffered(self):
+        """اختبار إسقاط السطر المتجاوز للحد دون تجميعه وإعادته خطأً في مكانه"""
+        async def blocks():
+            yield b'{"id": "a", "text": "a"}\n'
+            for _ in range(100):
+                yield b'x' * 64
+            yield b'\n{"id": "b", "text": "b"}'
+
+        async def collect():
+            return [line async for line in aiter_lines(blocks(), max_line_bytes=100)]
+
+        lines = asyncio.run(collect())
+        self.assertEqual(len(lines), 3)
+        self.assertIsInstance(lines[1], OversizedLine)
+        self.assertEqual(lines[1].size, 6400)
+        self.assertEqual(json.loads(lines[2])['id'], 'b')
+
+    def test_batch_endpoint_rejects_oversized_records(self):
+        """اختبار رد 413 في مكان السطر أو النص المتجاوز للحد"""
+        from fastapi.testclient import TestClient
+        from nlp import app as app_module
+
+        lines = [self.LINES[0], 'x' * 1500, json.dumps({'id': 'long', 'text': 'ن' * 200}, ensure_ascii=False), self.LINES[3]]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            app_module.batch_text_analyzer = BatchTextAnalyzer(
+                chunk_size=2, executor=executor, max_line_bytes=1000, max_text_length=100
+            )
+            client = TestClient(app_module.app)
+            response = client.post('/text-analysis/batch', content='\n'.join(lines).encode('utf-8'))
+
+        results = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([r.get('id', r.get('line')) for r in results], ['a', 2, 'long', 'b'])
+        self.assertEqual([r.get('status') for r in results], [None, 413, 413, None])
+
+class TestDocumentFrequency(unittest.TestCase):
+    """اختبارات جدول تكرار المصطلحات في المدونة"""
+
+    def test_persistent_table_is_incremental(self):
+        """اختبار حفظ الجدول وإعادة تحميله وتجاوز المقالات المعروفة"""
+        with tempfile.TemporaryDirectory() as path:
+            table = DocumentFrequency(path)
+            self.assertEqual(table.add_texts(['الخبر الأول عاجل', 'الخبر الثاني', 'عاجل عاجل'], ['1', '2', '3']), 3)
+
+            reloaded = DocumentFrequency(path)
+            self.assertEqual(reloaded.document_count, 3)
+            self.assertEqual((reloaded.frequency('الخبر'), reloaded.frequency('عاجل')), (2, 2))
+            self.assertEqual(reloaded.add_texts(['الخبر مكرر', 'خبر جديد عاجل'], ['2', '4']), 1)
+
+            reloaded = DocumentFrequency(path)
+            self.assertEqual((reloaded.document_count, reloaded.frequency('عاجل')), (4, 3))
+            self.assertEqual(reloaded.frequency('مكرر'), 0)
+            self.assertAlmostEqual(reloaded.idf('جديد'), np.log(5 / 2) + 1)
+            self.assertAlmostEqual(reloaded.idf('غير_موجود'), np.log(5) + 1)
+
+    def test_reader_sees_documents_added_by_writer(self):
+        """اختبار ملاحظة نسخة أخرى على نفس المسار (كعامل في مجمّع) للوثائق الجديدة"""
+        with tempfile.TemporaryDirectory() as path:
+            writer = DocumentFrequency(path)
+            writer.add_texts(['الخبر الأول عاجل'], ['1'])
+            reader = DocumentFrequency(path)
+            self.assertEqual(reader.frequency('عاجل'), 1)
+
+            writer.add_texts(['خبر جديد عاجل', 'جديد'], ['2', '3'])
+            self.assertAlmostEqual(reader.idf('جديد'), np.log(4 / 3) + 1)
+            self.assertEqual((reader.document_count, reader.frequency('عاجل')), (3, 2))
+            self.assertEqual(len(reader), len(writer))
+            self.assertEqual(sorted(os.listdir(path)), [
+                'articles.txt', 'document_frequency.u32', 'meta.json', 'terms.txt'
+            ])
+
+    def test_keywords_rank_by_corpus_idf(self):
+        """اختبار ترتيب الكلمات المفتاحية بـ TF-IDF على المدونة لا بالتكرار وحده"""
+        table = DocumentFrequency()
+        table.add_texts([f'الحكومة تعلن خطة رقم {i}' for i in range(20)] + ['المريخ'])
+        text = 'الحكومة الحكومة الحكومة تطلق مركبة المريخ المريخ'
+
+        keywords = TextAnalyzer(document_frequency=table).extract_keywords(text)
+        self.assertEqual([k['word'] for k in keywords[:2]], ['المريخ', 'تطلق'])
+        self.assertGreater(keywords[0]['idf_score'], keywords[-1]['idf_score'])
+
+        with patch('nltk.download'):
+            service = NLPService(document_frequency=table)
+        self.assertEqual(service.extract_keywords(text)[:2], ['المريخ', 'تطلق'])
+        self.assertIn('المريخ', service.generate_tags(text))
+
+    def test_corpus_documents_endpoint(self):
+        """اختبار إضافة المقالات المنشورة عبر /corpus/documents"""
+        from fastapi.testclient import TestClient
+        from nlp import app as app_module
+
+        table = DocumentFrequency()
+        client = TestClient(app_module.app)
+        body = {'documents': [{'id': '1', 'text': 'خبر عاجل'}, {'id': '2', 'text': 'خبر'}]}
+        with patch.object(app_module, 'CORPUS_DOCUMENT_FREQUENCY', table):
+            first = client.post('/corpus/documents', json=body)
+            second = client.post('/corpus/documents', json=body)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual((first.json()['added'], second.json()['added']), (2, 0))
+        self.assertEqual(second.json()['corpus']['documents'], 2)
+        self.assertEqual(table.frequency('خبر'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)